@@ -0,0 +1,208 @@
+"""
+Running perft or a fixed depth search over many positions, on every core.
+
+FENs are read from a file or standard input, one per line, and handed out in chunks to a pool of worker
+processes. Each worker keeps one board and reads each FEN of its chunk into it with Board.read_fen(), so there
+is no per position set up beyond parsing. Results are written as JSON lines as soon as each chunk finishes, so
+they come out of order; each one carries the line number of its FEN.
+
+Writing to an output file that already has results resumes the run: the line numbers already done are skipped,
+so an interrupted run can be started again with the same arguments and carries on where it stopped.
+
+Usage:
+    python analyse.py positions.fen --perft 4 --output perft.jsonl
+    python analyse.py positions.fen --depth 5 --workers 8 --output analysis.jsonl
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import evaluate
+import perft
+from search import Searcher
+
+# The board and searcher of a worker process, set up once by _init_worker().
+_board = None
+_searcher = None
+
+
+def _init_worker(backend: str, search: bool, hash_mb: float) -> None:
+    """Sets up the board of a worker process, and its searcher if it is searching."""
+    global _board, _searcher
+    _board = (evaluate.BACKENDS if search else perft.BACKENDS)[backend]()
+    _searcher = Searcher(hash_mb) if search else None
+
+
+def analyse_position(board, fen: str, perft_depth: int = None, search_depth: int = None,
+                     searcher: Searcher = None) -> dict:
+    """
+    Reads a FEN into a board, then runs perft or a search on it.
+
+    Args:
+        board (Board): The board to read the FEN into.
+        fen (str): The position.
+        perft_depth (int): The depth to run perft to, or None (default: None).
+        search_depth (int): The depth to search to, or None (default: None).
+        searcher (Searcher): The searcher to search with, if searching (default: None).
+
+    Returns:
+        (dict): The results, ready to be written as JSON.
+    """
+    board.read_fen(fen)
+    result = {"fen": fen}
+    start = time.perf_counter()
+    if perft_depth is not None:
+        result["perft"] = perft.perft(board, perft_depth)
+    if search_depth is not None:
+        # Each position is searched from an empty table, so its result doesn't depend on the ones before it
+        searcher.table.clear()
+        found = searcher.search(board, search_depth)
+        result.update({
+            "depth": found.depth,
+            "score": found.score,
+            "bestmove": found.move.uci() if found.move is not None else None,
+            "pv": [move.uci() for move in found.pv],
+            "nodes": found.nodes,
+        })
+    result["seconds"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def _analyse_chunk(job: tuple) -> list:
+    """Analyses a chunk of (line number, FEN) pairs in a worker, returning a JSON line for each."""
+    chunk, perft_depth, search_depth = job
+    lines = []
+    for number, fen in chunk:
+        try:
+            result = {"line": number, **analyse_position(_board, fen, perft_depth, search_depth, _searcher)}
+        except Exception as error:
+            # A bad FEN shouldn't stop the run, the error is recorded in its place
+            result = {"line": number, "fen": fen, "error": f"{type(error).__name__}: {error}"}
+        lines.append(json.dumps(result) + "\n")
+    return lines
+
+
+def read_done(path: str) -> set:
+    """
+    Reads the line numbers already done from an earlier run's output, so they can be skipped. Results are written
+    out of order, so a line that doesn't parse is skipped rather than ending the read, and its FEN is analysed
+    again. Only a last line without a newline, cut off part way through by the run being killed while writing it,
+    is cut from the file.
+
+    Args:
+        path (str): The output file.
+
+    Returns:
+        (set): The line numbers of the FENs already analysed.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    complete = 0
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            complete += len(line)
+            try:
+                done.add(json.loads(line)["line"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    os.truncate(path, complete)
+    return done
+
+
+def iter_chunks(lines, done: set, size: int):
+    """
+    Groups the FENs of an input into chunks, numbering them by line and skipping blank lines, comments and the
+    lines already done.
+
+    Args:
+        lines: An iterable of input lines.
+        done (set): Line numbers to skip.
+        size (int): The number of positions in a chunk.
+
+    Yields:
+        (list): A chunk of (line number, FEN) pairs.
+    """
+    chunk = []
+    for number, line in enumerate(lines, 1):
+        fen = line.strip()
+        if not fen or fen.startswith("#") or number in done:
+            continue
+        chunk.append((number, fen))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(lines, output, perft_depth: int = None, search_depth: int = None, workers: int = None,
+        chunk_size: int = 16, backend: str = "mailbox", hash_mb: float = 16, done: set = frozenset()) -> int:
+    """
+    Analyses every FEN of an input on a pool of worker processes, writing a JSON line for each as it finishes.
+
+    Args:
+        lines: An iterable of input lines, one FEN each.
+        output: A text file to write the JSON lines to.
+        perft_depth (int): The depth to run perft to, or None (default: None).
+        search_depth (int): The depth to search to, or None (default: None).
+        workers (int): The number of worker processes (default: None, one per core).
+        chunk_size (int): The number of positions sent to a worker at once (default: 16).
+        backend (str): The name of the board backend (default: "mailbox").
+        hash_mb (float): The transposition table size of each worker in megabytes (default: 16).
+        done (set): Line numbers to skip, from an earlier run (default: none).
+
+    Returns:
+        (int): The number of positions analysed.
+    """
+    jobs = ((chunk, perft_depth, search_depth) for chunk in iter_chunks(lines, done, chunk_size))
+    count = 0
+    with multiprocessing.Pool(workers, _init_worker, (backend, search_depth is not None, hash_mb)) as pool:
+        for results in pool.imap_unordered(_analyse_chunk, jobs):
+            output.writelines(results)
+            # Flushed after every chunk, so an interrupted run loses at most the chunks still being worked on
+            output.flush()
+            count += len(results)
+    return count
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run perft or a search over a file of FENs on every core.")
+    parser.add_argument("file", nargs="?", help="the file of FENs, one per line (default: standard input)")
+    parser.add_argument("--perft", type=int, help="run perft to this depth")
+    parser.add_argument("--depth", type=int, help="search to this depth")
+    parser.add_argument("--output", help="the JSON lines file to write, resuming it if it exists "
+                                         "(default: standard output)")
+    parser.add_argument("--workers", type=int, help="the number of worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=16,
+                        help="the number of positions sent to a worker at once (default: 16)")
+    parser.add_argument("--backend", choices=perft.BACKENDS, default="mailbox",
+                        help="the board representation to use")
+    parser.add_argument("--hash", type=float, default=16,
+                        help="the transposition table size of each worker in MB (default: 16)")
+    args = parser.parse_args(argv)
+    if args.perft is None and args.depth is None:
+        parser.error("one of --perft or --depth is needed")
+
+    done = read_done(args.output) if args.output else set()
+    start = time.perf_counter()
+    # The standard streams are used without closing them
+    with (open(args.file) if args.file else contextlib.nullcontext(sys.stdin)) as lines, \
+            (open(args.output, "a") if args.output else contextlib.nullcontext(sys.stdout)) as output:
+        count = run(lines, output, args.perft, args.depth, args.workers, args.chunk_size, args.backend, args.hash,
+                    done)
+    seconds = time.perf_counter() - start
+    skipped = f", {len(done)} already done" if done else ""
+    print(f"Analysed {count} positions in {seconds:.3f}s ({count / max(seconds, 1e-9):.1f}/s){skipped}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
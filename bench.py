@@ -0,0 +1,413 @@
+"""
+The benchmark suite.
+
+Runs perft on the standard test positions with each board backend, checks the node counts against the
+published values and reports the speed of each run. The attacks benchmark times attack queries on every square
+of the standard positions, so that running it with both backends compares their attack code. The fen benchmark
+checks that FENs read and written back come out the same, and times the bulk FEN parser. The pgn benchmark
+times reading games from a PGN file, with and without resolving their SAN moves on a board. The smp benchmark
+times a parallel search to a fixed depth with more and more worker processes, and reports the speedup over
+one. The instrument benchmark times a search with the instrumentation never enabled, enabled, and after it was
+disabled again, to show that it costs nothing while it is off. The results can be written to a JSON file, and
+compared with the results of an earlier run so that a build fails if anything became slower than allowed.
+
+Usage:
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json --tolerance 0.1
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import evaluate
+from core import BLACK, MAILBOX64, WHITE, iter_fens
+from instrument import Instrumentation
+from parallel import ParallelSearcher
+from perft import BACKENDS, perft
+from pgn import game_to_pgn, read_games
+from search import Searcher
+
+# The standard perft test positions: (name, FEN, depth, expected node count).
+# https://www.chessprogramming.org/Perft_Results
+POSITIONS = (
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 4, 197281),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3, 97862),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 5, 674624),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 4, 422333),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3, 62379),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3, 89890),
+)
+
+
+def bench_perft(backend: str) -> dict:
+    """
+    Runs perft on each of the standard positions.
+
+    Args:
+        backend (str): The name of the board backend, a key of perft.BACKENDS.
+
+    Returns:
+        (dict): A result for each position, keyed by "perft/<backend>/<position name>".
+    """
+    results = {}
+    for name, fen, depth, expected in POSITIONS:
+        board = BACKENDS[backend](fen)
+        start = time.perf_counter()
+        nodes = perft(board, depth)
+        seconds = time.perf_counter() - start
+        results[f"perft/{backend}/{name}"] = {
+            "depth": depth,
+            "count": nodes,
+            "expected": expected,
+            "seconds": seconds,
+            "rate": nodes / seconds,
+            "unit": "nodes/s",
+        }
+    return results
+
+
+# How many times the attacks benchmark queries every square of each position.
+ATTACK_REPEATS = 50
+
+
+def count_attacked(board) -> int:
+    """Returns how many squares of a position each side attacks, added together, plus 1 if it is in check."""
+    attacked = board.is_square_attacked
+    return sum(attacked(index, WHITE) + attacked(index, BLACK) for index in MAILBOX64) + board.in_check()
+
+
+def bench_attacks(backend: str) -> dict:
+    """
+    Times attack queries, Board.is_square_attacked() for both colours on every square of each of the standard
+    positions and Board.in_check(). The counts are checked against the mailbox board's, so a backend with its
+    own attack code has to find the same attacks.
+
+    Args:
+        backend (str): The name of the board backend, a key of perft.BACKENDS.
+
+    Returns:
+        (dict): The result, keyed by "attacks/<backend>", in queries per second.
+    """
+    boards = [BACKENDS[backend](fen) for name, fen, depth, expected in POSITIONS]
+    expected = sum(count_attacked(BACKENDS["mailbox"](fen)) for name, fen, depth, _ in POSITIONS) * ATTACK_REPEATS
+    start = time.perf_counter()
+    count = 0
+    for _ in range(ATTACK_REPEATS):
+        for board in boards:
+            count += count_attacked(board)
+    seconds = time.perf_counter() - start
+    queries = ATTACK_REPEATS * len(boards) * (2 * len(MAILBOX64) + 1)
+    return {f"attacks/{backend}": {
+        "count": count,
+        "expected": expected,
+        "seconds": seconds,
+        "rate": queries / seconds,
+        "unit": "queries/s",
+    }}
+
+
+# The number of random games written to a PGN file for the pgn benchmark, and how many plies each is played for.
+PGN_GAMES = 100
+PGN_PLIES = 120
+
+
+def bench_pgn(backend: str) -> dict:
+    """
+    Writes random games to a PGN file, then times reading them back: once only splitting out the moves, and
+    once also resolving every SAN move on a board.
+
+    Args:
+        backend (str): The name of the board backend, a key of perft.BACKENDS.
+
+    Returns:
+        (dict): The results, keyed by "pgn/<backend>/read" and "pgn/<backend>/replay", in games per second.
+    """
+    rng = random.Random(2024)
+    plies = 0
+    with tempfile.NamedTemporaryFile("w", suffix=".pgn", delete=False) as file:
+        for round_number in range(PGN_GAMES):
+            board = BACKENDS[backend]()
+            for _ in range(PGN_PLIES):
+                moves = list(board.iter_moves())
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+            plies += len(board.history)
+            file.write(game_to_pgn(board, {"Event": "bench", "Round": str(round_number + 1)}))
+    try:
+        results = {}
+        for name, replay in (("read", False), ("replay", True)):
+            start = time.perf_counter()
+            games = 0
+            count = 0
+            for game in read_games(file.name, use_mmap=True):
+                games += 1
+                count += sum(1 for _ in game.replay(game.board(BACKENDS[backend]))) if replay else len(game.moves)
+            seconds = time.perf_counter() - start
+            results[f"pgn/{backend}/{name}"] = {
+                "count": count,
+                "expected": plies,
+                "seconds": seconds,
+                "rate": games / seconds,
+                "unit": "games/s",
+            }
+    finally:
+        os.remove(file.name)
+    return results
+
+
+# The depth searched to for the smp benchmark, and the worker counts tried, up to the number of cores.
+SMP_DEPTH = 5
+SMP_WORKERS = (1, 2, 4, 8, 16)
+
+
+def bench_smp(backend: str) -> dict:
+    """
+    Times a Lazy SMP search to SMP_DEPTH of each of the standard positions, with each number of workers.
+
+    Args:
+        backend (str): The name of the board backend, a key of perft.BACKENDS.
+
+    Returns:
+        (dict): A result for each number of workers, keyed by "smp/<backend>/<workers>", with the speedup in
+            time to depth over one worker as the rate.
+    """
+    results = {}
+    single = None
+    for workers in SMP_WORKERS:
+        if workers > multiprocessing.cpu_count():
+            break
+        nodes = 0
+        seconds = 0.0
+        with ParallelSearcher(workers) as searcher:
+            for name, fen, depth, expected in POSITIONS:
+                # Each position starts with an empty table, so that it is timed from scratch
+                searcher.table.clear()
+                result = searcher.search(evaluate.BACKENDS[backend](fen), SMP_DEPTH)
+                nodes += result.nodes
+                seconds += result.seconds
+        single = seconds if single is None else single
+        results[f"smp/{backend}/{workers}"] = {
+            "depth": SMP_DEPTH,
+            "count": nodes,
+            "seconds": seconds,
+            "rate": single / seconds,
+            "unit": "x speedup",
+        }
+    return results
+
+
+# The depth searched to for the instrument benchmark, how many times each run is repeated, keeping the fastest,
+# and the fraction the rate after the instrumentation was disabled may fall below the rate before it was enabled.
+INSTRUMENT_DEPTH = 3
+INSTRUMENT_REPEATS = 3
+INSTRUMENT_TOLERANCE = 0.05
+
+
+def search_positions(backend: str) -> tuple:
+    """Searches each of the standard positions to INSTRUMENT_DEPTH, returning the total (nodes, seconds)."""
+    nodes = 0
+    seconds = 0.0
+    for name, fen, depth, expected in POSITIONS:
+        result = Searcher().search(evaluate.BACKENDS[backend](fen), INSTRUMENT_DEPTH)
+        nodes += result.nodes
+        seconds += result.seconds
+    return nodes, seconds
+
+
+def bench_instrument(backend: str) -> dict:
+    """
+    Times a search of each of the standard positions with the instrumentation off, on, then off again. The
+    instrumentation mustn't change the search, so every run is expected to search as many nodes as the first, and
+    once disabled it mustn't cost anything, so the last run has a minimum rate of INSTRUMENT_TOLERANCE below the
+    first. Each run is the fastest of INSTRUMENT_REPEATS, and the repeats take turns, so noise and drift in the
+    machine's speed hit every run alike rather than failing the last.
+
+    Args:
+        backend (str): The name of the board backend, a key of perft.BACKENDS.
+
+    Returns:
+        (dict): A result for each run, keyed by "instrument/<backend>/<off, on or disabled>".
+    """
+    modes = ("off", "on", "disabled")
+    runs = {mode: [] for mode in modes}
+    for _ in range(INSTRUMENT_REPEATS):
+        for mode in modes:
+            if mode == "on":
+                with Instrumentation():
+                    runs[mode].append(search_positions(backend))
+            else:
+                runs[mode].append(search_positions(backend))
+    results = {}
+    expected = None
+    for mode in modes:
+        nodes, seconds = min(runs[mode], key=lambda run: run[1])
+        expected = nodes if expected is None else expected
+        result = results[f"instrument/{backend}/{mode}"] = {
+            "depth": INSTRUMENT_DEPTH,
+            "count": nodes,
+            "expected": expected,
+            "seconds": seconds,
+            "rate": nodes / seconds,
+            "unit": "nodes/s",
+        }
+        if mode == "disabled":
+            result["minimum"] = results[f"instrument/{backend}/off"]["rate"] * (1 - INSTRUMENT_TOLERANCE)
+    return results
+
+
+# The number of random games played out from each position to make FENs for the fen benchmark, how many plies
+# each is played for, and how many times the parser reads the lot.
+FEN_GAMES = 50
+FEN_PLIES = 40
+FEN_REPEATS = 10
+
+
+def fen_corpus(backend: str) -> list:
+    """Plays random games from each of the standard positions, returning the FEN after every move."""
+    rng = random.Random(2024)
+    fens = []
+    for name, fen, depth, expected in POSITIONS:
+        board = BACKENDS[backend](fen)
+        for _ in range(FEN_GAMES):
+            board.read_fen(fen)
+            for _ in range(FEN_PLIES):
+                moves = list(board.iter_moves())
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+                fens.append(board.generate_fen())
+    return fens
+
+
+def bench_fen(backend: str) -> dict:
+    """
+    Checks that FENs round trip through a board unchanged, and times the bulk FEN parser.
+
+    Args:
+        backend (str): The name of the board backend, a key of perft.BACKENDS.
+
+    Returns:
+        (dict): The round trip result, keyed by "fen/<backend>/roundtrip", and the parser result, keyed by
+            "fen/<backend>/parse".
+    """
+    fens = fen_corpus(backend)
+    board = BACKENDS[backend]()
+    start = time.perf_counter()
+    same = 0
+    for fen in fens:
+        board.read_fen(fen)
+        same += board.generate_fen() == fen
+    seconds = time.perf_counter() - start
+    results = {f"fen/{backend}/roundtrip": {
+        "count": same,
+        "expected": len(fens),
+        "seconds": seconds,
+        "rate": len(fens) / seconds,
+        "unit": "FENs/s",
+    }}
+
+    lines = [fen + "\n" for fen in fens] * FEN_REPEATS
+    start = time.perf_counter()
+    parsed = sum(1 for _ in iter_fens(lines))
+    seconds = time.perf_counter() - start
+    results[f"fen/{backend}/parse"] = {
+        "count": parsed,
+        "expected": len(lines),
+        "seconds": seconds,
+        "rate": parsed / seconds,
+        "unit": "FENs/s",
+    }
+    return results
+
+
+# Each benchmark takes a backend name and returns a dict of results, each with at least a count, the time it
+# took and the resulting rate. Results with an expected count are also checked for correctness.
+BENCHMARKS = {"perft": bench_perft, "attacks": bench_attacks, "fen": bench_fen, "pgn": bench_pgn, "smp": bench_smp,
+              "instrument": bench_instrument}
+
+
+def run(benchmarks, backends) -> dict:
+    """Runs the chosen benchmarks with the chosen backends, printing each result as it finishes."""
+    results = {}
+    for benchmark in benchmarks:
+        for backend in backends:
+            for key, result in BENCHMARKS[benchmark](backend).items():
+                print(f"{key:40} {result['count']:>10} {result['seconds']:8.3f}s "
+                      f"{result['rate']:>12.0f} {result['unit']}")
+                results[key] = result
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cores": multiprocessing.cpu_count(),
+        "results": results,
+    }
+
+
+def check(report: dict, baseline: dict = None, tolerance: float = 0.1) -> list:
+    """
+    Checks a benchmark report for wrong counts, for rates below their own minimum, and for rates that dropped
+    below a baseline report.
+
+    Args:
+        report (dict): The report from run().
+        baseline (dict): An earlier report to compare with (default: None).
+        tolerance (float): The fraction a rate may drop below its baseline rate before it fails (default: 0.1).
+
+    Returns:
+        (list): A message for each failure; empty if everything passed.
+    """
+    failures = []
+    for key, result in report["results"].items():
+        if "expected" in result and result["count"] != result["expected"]:
+            failures.append(f"{key}: counted {result['count']}, expected {result['expected']}")
+        if "minimum" in result and result["rate"] < result["minimum"]:
+            failures.append(f"{key}: {result['rate']:.0f} {result['unit']} is below the minimum of "
+                            f"{result['minimum']:.0f}")
+        if baseline is not None and key in baseline["results"]:
+            old_rate = baseline["results"][key]["rate"]
+            if result["rate"] < old_rate * (1 - tolerance):
+                failures.append(f"{key}: {result['rate']:.0f} {result['unit']} is more than {tolerance:.0%} "
+                                f"below the baseline of {old_rate:.0f}")
+    return failures
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--benchmark", action="append", choices=BENCHMARKS,
+                        help="a benchmark to run, may be repeated (default: all)")
+    parser.add_argument("--backend", action="append", choices=BACKENDS,
+                        help="a board backend to run with, may be repeated (default: all)")
+    parser.add_argument("--output", help="a JSON file to write the results to")
+    parser.add_argument("--baseline", help="a JSON file of earlier results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="the fraction a rate may drop below the baseline before failing (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    report = run(args.benchmark or list(BENCHMARKS), args.backend or list(BACKENDS))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    failures = check(report, baseline, args.tolerance)
+    for failure in failures:
+        print("FAIL", failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
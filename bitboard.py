@@ -0,0 +1,369 @@
+"""
+A bitboard backend for the chess engine.
+
+BitBoard is a drop in replacement for core.Board. It keeps the mailbox, so FEN reading/writing, Move objects
+and packed moves work exactly as before, and alongside it a 64-bit integer for each piece code and each colour.
+Attack queries are then a few table lookups and bitwise operations instead of walking the mailbox: the sliding
+pieces that could reach a square on an empty board are found with one mask, and each of those, usually none,
+is checked with one more mask of the squares between it and the square.
+
+Squares are numbered 0-63 in reading order, like core.MAILBOX64: bit 0 is a8 and bit 63 is h1. The knight,
+king and pawn attack tables, and the ray tables used for sliding attacks, are built once when the module is
+imported; this takes a few milliseconds, so there is no table file to cache them in.
+https://www.chessprogramming.org/Classical_Approach
+"""
+
+from core import (BISHOP, BLACK_PIECE, EMPTY, FEN, KING, KNIGHT, MAILBOX64, PACKED_CAPTURE, PACKED_DOUBLE_PUSH,
+                  PACKED_EN_PASSANT, PAWN, PROMOTION_FLAGS, QUEEN, ROOK, SQUARE64, WHITE, Board)
+
+FULL = (1 << 64) - 1
+
+# Rows that pawns land on after their first single push, used for double pushes, and the promotion rows.
+ROW_2 = 0xFF << 16
+ROW_5 = 0xFF << 40
+PROMOTION_ROWS = 0xFF | 0xFF << 56
+# Every square but those of the a-file, and of the h-file, so pawn captures don't wrap round the board's edge.
+NOT_FILE_A = FULL ^ 0x0101010101010101
+NOT_FILE_H = FULL ^ 0x8080808080808080
+
+# Ray directions as (col, row) steps. Positive rays run towards higher square numbers, so their nearest
+# blocker is the lowest set bit; negative rays run towards lower numbers.
+POSITIVE_RAYS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+NEGATIVE_RAYS = ((-1, 0), (1, -1), (0, -1), (-1, -1))
+
+
+def _step_table(steps) -> tuple:
+    """Builds a table of the squares reachable from each square with a single one of the given steps."""
+    table = []
+    for square in range(64):
+        col, row = square % 8, square // 8
+        attacks = 0
+        for col_step, row_step in steps:
+            if 0 <= col + col_step < 8 and 0 <= row + row_step < 8:
+                attacks |= 1 << ((row + row_step) * 8 + col + col_step)
+        table.append(attacks)
+    return tuple(table)
+
+
+def _ray_table(col_step: int, row_step: int) -> tuple:
+    """Builds a table of the squares along a ray from each square, up to the edge of the board."""
+    table = []
+    for square in range(64):
+        col, row = square % 8 + col_step, square // 8 + row_step
+        ray = 0
+        while 0 <= col < 8 and 0 <= row < 8:
+            ray |= 1 << (row * 8 + col)
+            col, row = col + col_step, row + row_step
+        table.append(ray)
+    return tuple(table)
+
+
+KNIGHT_ATTACKS = _step_table(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+KING_ATTACKS = _step_table(POSITIVE_RAYS + NEGATIVE_RAYS)
+
+# Squares attacked by a pawn on each square, indexed by 0 for white and 1 for black.
+PAWN_ATTACKS = (_step_table(((-1, -1), (1, -1))), _step_table(((-1, 1), (1, 1))))
+
+# RAYS[i][square] is the ray from the square in direction i. Even directions are positive and odd ones negative.
+RAYS = tuple(_ray_table(*step) for pair in zip(POSITIVE_RAYS, NEGATIVE_RAYS) for step in pair)
+BISHOP_RAYS = (2, 3, 6, 7)
+ROOK_RAYS = (0, 1, 4, 5)
+SLIDING_RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: BISHOP_RAYS + ROOK_RAYS}
+# The ray tables of each sliding piece kind, with whether each ray is positive, for move generation.
+SLIDING_TABLES = {kind: tuple((RAYS[direction], direction % 2 == 0) for direction in directions)
+                  for kind, directions in SLIDING_RAYS.items()}
+
+# The squares a bishop or rook on each square would attack on an empty board.
+BISHOP_LINES = tuple(RAYS[2][square] | RAYS[3][square] | RAYS[6][square] | RAYS[7][square] for square in range(64))
+ROOK_LINES = tuple(RAYS[0][square] | RAYS[1][square] | RAYS[4][square] | RAYS[5][square] for square in range(64))
+
+
+def _between_table() -> tuple:
+    """
+    Builds the squares strictly between each pair of squares on a line, indexed by first square << 6 | second
+    square; 0 for squares that aren't on a line, or are next to each other.
+    """
+    table = [0] * 4096
+    for square in range(64):
+        for rays in RAYS:
+            ray = rays[square]
+            for other in squares_of(ray):
+                table[square << 6 | other] = ray ^ rays[other] ^ 1 << other
+    return tuple(table)
+
+
+def sliding_attacks(square: int, occupied: int, directions) -> int:
+    """
+    Returns the squares a sliding piece attacks along the given ray directions, stopping at (and including) the
+    first occupied square on each ray.
+
+    Args:
+        square (int): The 0-63 square of the sliding piece.
+        occupied (int): Bitboard of all occupied squares.
+        directions: Indices into RAYS.
+
+    Returns:
+        (int): Bitboard of attacked squares.
+    """
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            if direction % 2 == 0:
+                # Positive direction, the nearest blocker is the lowest bit
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    """Returns the bitboard of squares a bishop on the square attacks."""
+    return sliding_attacks(square, occupied, BISHOP_RAYS)
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    """Returns the bitboard of squares a rook on the square attacks."""
+    return sliding_attacks(square, occupied, ROOK_RAYS)
+
+
+def squares_of(bitboard: int):
+    """Yields the 0-63 square of each set bit of a bitboard, lowest first."""
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+BETWEEN = _between_table()
+
+
+class BitBoard(Board):
+    """
+    A Board that also keeps bitboards of its pieces.
+
+    Attributes:
+        pieces (list): A bitboard for each piece code, indexed by the code.
+        colours (list): Bitboards of the white and black pieces, indexed by 0 for white and 1 for black.
+    """
+
+    def __init__(self, fen: str = FEN):
+        """ Initialises the BitBoard class. """
+        self.pieces = [0] * 16
+        self.colours = [0, 0]
+        super().__init__(fen)
+
+    def set_piece(self, index: int, code: int) -> None:
+        """Puts a piece code (or EMPTY) on a square, updating the bitboards as well as the mailbox."""
+        bit = 1 << SQUARE64[index]
+        old = self.mailbox[index]
+        if old != EMPTY:
+            self.pieces[old] &= ~bit
+            self.colours[old >> 3] &= ~bit
+        if code != EMPTY:
+            self.pieces[code] |= bit
+            self.colours[code >> 3] |= bit
+        super().set_piece(index, code)
+
+    def reset_pieces(self):
+        super().reset_pieces()
+        self.pieces = [0] * 16
+        self.colours = [0, 0]
+
+    @property
+    def occupied(self) -> int:
+        """Bitboard of every occupied square."""
+        return self.colours[0] | self.colours[1]
+
+    def attackers(self, square: int, colour: int) -> int:
+        """
+        Returns the pieces of a colour that attack a square.
+
+        Args:
+            square (int): The 0-63 square being attacked.
+            colour (int): The colour of the attackers, WHITE or BLACK.
+
+        Returns:
+            (int): Bitboard of the attacking pieces.
+        """
+        pieces = self.pieces
+        side = 0 if colour == WHITE else BLACK_PIECE
+        queens = pieces[side | QUEEN]
+        # A pawn attacks the square if a pawn of the other colour on the square would attack it back.
+        attackers = ((PAWN_ATTACKS[1 if colour == WHITE else 0][square] & pieces[side | PAWN])
+                     | (KNIGHT_ATTACKS[square] & pieces[side | KNIGHT])
+                     | (KING_ATTACKS[square] & pieces[side | KING]))
+        # A sliding piece on a line with the square attacks it if nothing stands between them
+        sliders = (((pieces[side | BISHOP] | queens) & BISHOP_LINES[square])
+                   | ((pieces[side | ROOK] | queens) & ROOK_LINES[square]))
+        if sliders:
+            occupied = self.colours[0] | self.colours[1]
+            square <<= 6
+            while sliders:
+                lowest = sliders & -sliders
+                sliders ^= lowest
+                if not BETWEEN[square | lowest.bit_length() - 1] & occupied:
+                    attackers |= lowest
+        return attackers
+
+    def _is_attacked(self, square: int, colour: int) -> bool:
+        """Returns True if a piece of a colour attacks a 0-63 square; attackers() that stops at the first one."""
+        pieces = self.pieces
+        side = 0 if colour == WHITE else BLACK_PIECE
+        if ((PAWN_ATTACKS[1 if colour == WHITE else 0][square] & pieces[side | PAWN])
+                or KNIGHT_ATTACKS[square] & pieces[side | KNIGHT] or KING_ATTACKS[square] & pieces[side | KING]):
+            return True
+        queens = pieces[side | QUEEN]
+        sliders = (((pieces[side | BISHOP] | queens) & BISHOP_LINES[square])
+                   | ((pieces[side | ROOK] | queens) & ROOK_LINES[square]))
+        if sliders:
+            occupied = self.colours[0] | self.colours[1]
+            square <<= 6
+            while sliders:
+                lowest = sliders & -sliders
+                sliders ^= lowest
+                if not BETWEEN[square | lowest.bit_length() - 1] & occupied:
+                    return True
+        return False
+
+    def is_square_attacked(self, index: int, colour: int) -> bool:
+        """Returns True if a piece of the given colour attacks the square at the mailbox index."""
+        return self._is_attacked(SQUARE64[index], colour)
+
+    def in_check(self) -> bool:
+        """Returns True if the king of the side to move is attacked."""
+        king = self.pieces[KING if self.turn == WHITE else BLACK_PIECE | KING]
+        return king != 0 and self._is_attacked(king.bit_length() - 1, - self.turn)
+
+    def checks_and_pins(self, king: int) -> tuple:
+        """
+        Finds the pieces checking a king and the pieces pinned to it, as Board.checks_and_pins() does, from the
+        sliding pieces on a line with the king: with no piece between, one gives check; with only one of the
+        king's own pieces between, it pins that piece.
+        """
+        square = SQUARE64[king]
+        own = self.mailbox[king] & BLACK_PIECE
+        enemy = own ^ BLACK_PIECE
+        pieces = self.pieces
+        own_pieces = self.colours[own >> 3]
+        occupied = self.colours[0] | self.colours[1]
+        checkers = []
+        blocks = set()
+        pins = {}
+
+        queens = pieces[enemy | QUEEN]
+        sliders = (((pieces[enemy | BISHOP] | queens) & BISHOP_LINES[square])
+                   | ((pieces[enemy | ROOK] | queens) & ROOK_LINES[square]))
+        while sliders:
+            lowest = sliders & -sliders
+            sliders ^= lowest
+            slider = lowest.bit_length() - 1
+            between = BETWEEN[square << 6 | slider]
+            blockers = between & occupied
+            if not blockers:
+                checkers.append(MAILBOX64[slider])
+                blocks.update(MAILBOX64[ray_square] for ray_square in squares_of(between | lowest))
+            elif not blockers & (blockers - 1) and blockers & own_pieces:
+                pins[MAILBOX64[blockers.bit_length() - 1]] = {MAILBOX64[ray_square]
+                                                              for ray_square in squares_of(between | lowest)}
+
+        close = ((PAWN_ATTACKS[own >> 3][square] & pieces[enemy | PAWN])
+                 | (KNIGHT_ATTACKS[square] & pieces[enemy | KNIGHT]))
+        for attacker in squares_of(close):
+            checkers.append(MAILBOX64[attacker])
+            blocks.add(MAILBOX64[attacker])
+        return checkers, blocks, pins
+
+    def iter_pseudo_legal_packed(self):
+        """
+        Lazily generates the pseudo-legal moves of the side to move from the bitboards, as packed ints. The squares
+        of the bitboards are the squares of packed moves, so no square needs converting.
+
+        Yields:
+            (int): Each packed move in turn, with the same squares and flags as Board.iter_pseudo_legal_packed().
+        """
+        pieces = self.pieces
+        colour = self.turn
+        side = 0 if colour == WHITE else BLACK_PIECE
+        own = self.colours[side >> 3]
+        enemy = self.colours[1 - (side >> 3)]
+        occupied = own | enemy
+        empty = ~occupied & FULL
+        targets = ~own & FULL
+
+        # Pawn moves are generated for all pawns at once by shifting the pawn bitboard: a row for pushes, and a
+        # row and a column for captures, each with how far back the pawn came from
+        pawns = pieces[side | PAWN]
+        if colour == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((single & ROW_5) >> 8) & empty
+            back = 8
+            captures = (((pawns & NOT_FILE_A) >> 9, 9), ((pawns & NOT_FILE_H) >> 7, 7))
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & ROW_2) << 8) & empty
+            back = -8
+            captures = (((pawns & NOT_FILE_A) << 7 & FULL, -7), ((pawns & NOT_FILE_H) << 9 & FULL, -9))
+        while single:
+            lowest = single & -single
+            single ^= lowest
+            to_square = lowest.bit_length() - 1
+            packed = to_square + back | to_square << 6
+            if lowest & PROMOTION_ROWS:
+                for flags in PROMOTION_FLAGS:
+                    yield packed | flags
+            else:
+                yield packed
+        while double:
+            lowest = double & -double
+            double ^= lowest
+            to_square = lowest.bit_length() - 1
+            yield to_square + back * 2 | to_square << 6 | PACKED_DOUBLE_PUSH
+
+        en_passant = 0 if self.en_passant_square is None else 1 << SQUARE64[self.en_passant_square]
+        capturable = enemy | en_passant
+        for attacks, back in captures:
+            attacks &= capturable
+            while attacks:
+                lowest = attacks & -attacks
+                attacks ^= lowest
+                to_square = lowest.bit_length() - 1
+                packed = to_square + back | to_square << 6
+                if lowest == en_passant:
+                    yield packed | PACKED_EN_PASSANT
+                elif lowest & PROMOTION_ROWS:
+                    for flags in PROMOTION_FLAGS:
+                        yield packed | PACKED_CAPTURE | flags
+                else:
+                    yield packed | PACKED_CAPTURE
+
+        # Every other piece moves to the squares it attacks that don't hold a piece of its own colour.
+        for kind in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            from_bitboard = pieces[side | kind]
+            while from_bitboard:
+                lowest = from_bitboard & -from_bitboard
+                from_bitboard ^= lowest
+                from_square = lowest.bit_length() - 1
+                if kind == KNIGHT:
+                    attacks = KNIGHT_ATTACKS[from_square]
+                elif kind == KING:
+                    attacks = KING_ATTACKS[from_square]
+                else:
+                    attacks = 0
+                    for rays, positive in SLIDING_TABLES[kind]:
+                        ray = rays[from_square]
+                        blockers = ray & occupied
+                        if blockers:
+                            # The nearest blocker is the lowest bit on a positive ray, the highest on a negative one
+                            ray ^= rays[(blockers & -blockers).bit_length() - 1 if positive
+                                        else blockers.bit_length() - 1]
+                        attacks |= ray
+                attacks &= targets
+                while attacks:
+                    lowest = attacks & -attacks
+                    attacks ^= lowest
+                    to_square = lowest.bit_length() - 1
+                    yield from_square | to_square << 6 | (PACKED_CAPTURE if lowest & enemy else 0)
@@ -0,0 +1,1088 @@
+"""
+The headless core of the chess engine.
+
+This module holds the board state, move legality checking, move generation and FEN reading/writing.
+It has no tkinter dependency and no module level board, so any number of Board objects can be created
+and analysed in the same process. The GUI in pychess.py is a view over a Board from this module.
+
+The board is stored as a 10x12 mailbox: a bytearray of 120 integer piece codes where the 8x8 board sits in
+the middle, surrounded by OFFBOARD sentinels. Stepping off the edge of the board with an offset lands on a
+sentinel instead of wrapping around, so offset arithmetic needs no bounds checks.
+https://www.chessprogramming.org/10x12_Board
+"""
+
+import random
+from array import array
+
+# Global variables
+FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+BLACK = -1
+WHITE = 1
+
+# Piece codes stored in the mailbox. Black pieces have the BLACK_PIECE bit set, so code & 7 is the piece kind.
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+BLACK_PIECE = 8
+OFFBOARD = 0xFF
+
+# The FEN character of each piece code, and the reverse lookup.
+PIECE_CHARS = ".PNBRQK..pnbrqk"
+PIECE_CODES = {char: code for code, char in enumerate(PIECE_CHARS) if char != "."}
+
+# Mailbox index of each of the 64 squares, in reading order (a8 first, h1 last).
+MAILBOX64 = tuple(21 + row * 10 + col for row in range(8) for col in range(8))
+
+# The 0-63 square number of each mailbox index, or -1 for border cells.
+SQUARE64 = tuple(MAILBOX64.index(i) if i in MAILBOX64 else -1 for i in range(120))
+
+# An empty board: every square EMPTY, every border cell OFFBOARD.
+EMPTY_MAILBOX = bytes(EMPTY if i in MAILBOX64 else OFFBOARD for i in range(120))
+
+# Offsets for one step in each direction; rows are 10 apart and row 0 is the top (black's back rank).
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+BISHOP_OFFSETS = (-11, -9, 9, 11)
+ROOK_OFFSETS = (-10, -1, 1, 10)
+KING_OFFSETS = BISHOP_OFFSETS + ROOK_OFFSETS
+
+# The ray directions of each sliding piece kind.
+SLIDING_OFFSETS = {BISHOP: BISHOP_OFFSETS, ROOK: ROOK_OFFSETS, QUEEN: KING_OFFSETS}
+
+# Castling rights bits, in the FEN castling order KQkq (white king side is the highest bit).
+CASTLE_WHITE_KING = 8
+CASTLE_WHITE_QUEEN = 4
+CASTLE_BLACK_KING = 2
+CASTLE_BLACK_QUEEN = 1
+CASTLING_CHARS = {"K": CASTLE_WHITE_KING, "Q": CASTLE_WHITE_QUEEN, "k": CASTLE_BLACK_KING, "q": CASTLE_BLACK_QUEEN}
+
+# Each castling move as (right, king from, king to, rook from, rook to, squares that must be empty,
+# squares the king passes over that must not be attacked).
+CASTLING_MOVES = {
+    WHITE: ((CASTLE_WHITE_KING, 95, 97, 98, 96, (96, 97), (96, 97)),
+            (CASTLE_WHITE_QUEEN, 95, 93, 91, 94, (94, 93, 92), (94, 93))),
+    BLACK: ((CASTLE_BLACK_KING, 25, 27, 28, 26, (26, 27), (26, 27)),
+            (CASTLE_BLACK_QUEEN, 25, 23, 21, 24, (24, 23, 22), (24, 23))),
+}
+
+# The rook's from and to squares for each square a castling king lands on.
+CASTLING_ROOKS = {king_to: (rook_from, rook_to)
+                  for moves in CASTLING_MOVES.values() for _, _, king_to, rook_from, rook_to, _, _ in moves}
+
+# The castling rights that survive a move from or to each mailbox index; moving a king or rook, or capturing
+# a rook, loses the matching rights.
+CASTLING_MASKS = bytearray([15] * 120)
+CASTLING_MASKS[95] = CASTLE_BLACK_KING | CASTLE_BLACK_QUEEN
+CASTLING_MASKS[98] = 15 ^ CASTLE_WHITE_KING
+CASTLING_MASKS[91] = 15 ^ CASTLE_WHITE_QUEEN
+CASTLING_MASKS[25] = CASTLE_WHITE_KING | CASTLE_WHITE_QUEEN
+CASTLING_MASKS[28] = 15 ^ CASTLE_BLACK_KING
+CASTLING_MASKS[21] = 15 ^ CASTLE_BLACK_QUEEN
+
+# Moves can also be packed into 16 bit ints: the 0-63 from square (6 bits), the 0-63 to square (6 bits) and four
+# flag bits. The search generates them into reused arrays of these, without building a Move for each candidate.
+# https://www.chessprogramming.org/Encoding_Moves
+PACKED_DOUBLE_PUSH = 0x1000
+PACKED_KING_CASTLE = 0x2000
+PACKED_QUEEN_CASTLE = 0x3000
+PACKED_CAPTURE = 0x4000
+PACKED_EN_PASSANT = 0x5000
+# A promotion adds its piece kind less KNIGHT in the two lowest flag bits, and PACKED_CAPTURE if it captures.
+# Every packed capture or promotion is at least PACKED_CAPTURE.
+PACKED_PROMOTION = 0x8000
+PROMOTION_FLAGS = tuple(PACKED_PROMOTION | (kind - KNIGHT) << 12 for kind in (QUEEN, ROOK, BISHOP, KNIGHT))
+
+# The most legal moves any position has is 218, so a move buffer of this size never overflows.
+MAX_MOVES = 256
+
+# Zobrist keys: a random 64-bit number for each piece code on each mailbox index, for black to move, for each
+# set of castling rights and for the column of the en passant square. A position's key is the XOR of the keys
+# of everything in it, so it can be updated a move at a time. The fixed seed keeps keys the same between runs.
+# https://www.chessprogramming.org/Zobrist_Hashing
+_zobrist_random = random.Random(20240101)
+ZOBRIST_PIECES = [[0] * 120] + [[_zobrist_random.getrandbits(64) for _ in range(120)] for _ in range(15)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [0] + [_zobrist_random.getrandbits(64) for _ in range(15)]
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+
+def square_index(col: int, row: int) -> int:
+    """Returns the mailbox index of the square at the given column and row."""
+    return 21 + row * 10 + col
+
+
+def square_col(index: int) -> int:
+    """Returns the column of a mailbox index."""
+    return index % 10 - 1
+
+
+def square_row(index: int) -> int:
+    """Returns the row of a mailbox index."""
+    return index // 10 - 2
+
+
+def square_name(index: int) -> str:
+    """Returns the algebraic name of a mailbox index, such as "e4"."""
+    return "abcdefgh"[square_col(index)] + str(8 - square_row(index))
+
+
+def parse_square(name: str) -> int:
+    """Returns the mailbox index of a square given its algebraic name, such as "e4"."""
+    return square_index(ord(name[0]) - ord("a"), 8 - int(name[1]))
+
+
+def piece_colour(code: int) -> int:
+    """Returns the colour (WHITE or BLACK) of a non empty piece code."""
+    return BLACK if code & BLACK_PIECE else WHITE
+
+
+def move_buffer() -> array:
+    """Returns a buffer for Board.generate_packed(), an array of MAX_MOVES unsigned 16 bit ints."""
+    return array("H", bytes(2 * MAX_MOVES))
+
+
+def packed_uci(packed: int) -> str:
+    """Returns a packed move in UCI long algebraic notation, such as "e2e4" or "e7e8q"."""
+    text = square_name(MAILBOX64[packed & 63]) + square_name(MAILBOX64[packed >> 6 & 63])
+    return text + "nbrq"[packed >> 12 & 3] if packed & PACKED_PROMOTION else text
+
+
+# Expands the digits of a FEN piece placement to that many dots, so each row is 8 characters, and doubles the
+# slashes, so each row is 10 apart like in the mailbox.
+_FEN_EXPAND = str.maketrans({**{str(n): "." * n for n in range(1, 9)}, "/": "//"})
+# Turns the characters of an expanded placement into piece codes, with the slashes as the OFFBOARD border
+# between the rows. The other table deletes every valid character, to find invalid ones.
+_FEN_CODES = bytes.maketrans("".join(PIECE_CODES).encode() + b"./",
+                             bytes(PIECE_CODES.values()) + bytes([EMPTY, OFFBOARD]))
+_FEN_VALID = str.maketrans("", "", PIECE_CHARS + "/")
+# The border before the first row and after the last.
+_FEN_BORDER = bytes([OFFBOARD]) * 21
+# The castling rights of each castling field written in the usual KQkq order, to skip reading it a character at
+# a time.
+_FEN_CASTLING = {"".join(char for char, right in CASTLING_CHARS.items() if rights & right) or "-": rights
+                 for rights in range(16)}
+
+
+def parse_fen(fen: str) -> tuple:
+    """
+    Parses a FEN string into the board's compact representation, without building any objects per square or
+    looping over the squares: the piece placement is expanded and translated straight into the middle of the
+    mailbox with str.translate and bytes.translate. EPD lines, with operations in place of the move counters,
+    are read too.
+
+    Args:
+        fen (str): The FEN string. The castling, en passant and move counter fields may be left off.
+
+    Returns:
+        (tuple): (mailbox, turn, castling rights, en passant square, halfmove clock, fullmove number), with the
+            mailbox as a bytearray of 120 piece codes and the en passant square as a mailbox index or None.
+
+    Raises:
+        ValueError: If the FEN string is malformed.
+    """
+    fields = fen.split()
+    if len(fields) < 2 or fields[1] not in ("w", "b"):
+        raise ValueError(f"Bad FEN, it needs a piece placement and a side to move: {fen!r}")
+    placement = fields[0].translate(_FEN_EXPAND)
+    # 8 rows of 8 squares, with two slashes after each row but the last
+    if (len(placement) != 78 or placement[8::10] != "///////" or placement[9::10] != "///////"
+            or placement.translate(_FEN_VALID)):
+        raise ValueError(f"Bad FEN piece placement: {fields[0]!r}")
+    mailbox = bytearray(_FEN_BORDER + placement.encode().translate(_FEN_CODES) + _FEN_BORDER)
+
+    castling = 0 if len(fields) < 3 else _FEN_CASTLING.get(fields[2])
+    if castling is None:
+        castling = 0
+        for char in fields[2]:
+            if char not in CASTLING_CHARS:
+                raise ValueError(f"Bad FEN castling rights: {fields[2]!r}")
+            castling |= CASTLING_CHARS[char]
+
+    en_passant_square = None
+    if len(fields) > 3 and fields[3] != "-":
+        if len(fields[3]) != 2 or fields[3][0] not in "abcdefgh" or fields[3][1] not in "36":
+            raise ValueError(f"Bad FEN en passant square: {fields[3]!r}")
+        en_passant_square = parse_square(fields[3])
+
+    # The move counters may be left off, or replaced by EPD operations
+    halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    return mailbox, WHITE if fields[1] == "w" else BLACK, castling, en_passant_square, halfmove_clock, fullmove_number
+
+
+def iter_fens(lines):
+    """
+    Parses FENs lazily, one per line, for loading large FEN and EPD files a line at a time.
+
+    Args:
+        lines: An iterable of lines, such as an open file. Blank lines and lines starting with # are skipped.
+
+    Yields:
+        (tuple): The result of parse_fen() for each FEN.
+
+    Raises:
+        ValueError: If a line is not a valid FEN.
+    """
+    for line in lines:
+        if line.strip() and not line.startswith("#"):
+            yield parse_fen(line)
+
+
+class Piece:
+    """
+    Object for pieces. The board itself only stores piece codes; Piece objects are built on demand.
+
+    Attributes:
+        colour (int): The colour of the piece, WHITE = 1, BLACK = -1
+        piece_type (str): The piece type character. Uppercase represents white, lowercase black.
+    """
+    __slots__ = ("colour", "piece_type")
+
+    def __init__(self, colour: int = None, piece_type: str = None):
+        self.colour = colour
+        self.piece_type = piece_type
+
+    @property
+    def code(self) -> int:
+        """The mailbox code of the piece."""
+        return PIECE_CODES[self.piece_type]
+
+    @classmethod
+    def from_code(cls, code: int):
+        """Returns a Piece for a mailbox code, or None for an empty square."""
+        if code == EMPTY or code == OFFBOARD:
+            return None
+        return cls(piece_colour(code), PIECE_CHARS[code])
+
+
+class Square:
+    """
+    A view of one square of a Board.
+
+    Attributes:
+        board (Board): The Board the square belongs to.
+        index (int): The mailbox index of the square.
+    """
+    __slots__ = ("board", "index")
+
+    def __init__(self, board, index: int):
+        self.board = board
+        self.index = index
+
+    @property
+    def col(self) -> int:
+        """Integer value for the column."""
+        return square_col(self.index)
+
+    @property
+    def row(self) -> int:
+        """Integer value for the row."""
+        return square_row(self.index)
+
+    @property
+    def piece(self) -> Piece:
+        """The piece that occupies this square, or None."""
+        return Piece.from_code(self.board.mailbox[self.index])
+
+    @piece.setter
+    def piece(self, piece: Piece) -> None:
+        self.board.set_piece(self.index, EMPTY if piece is None else piece.code)
+
+    def __eq__(self, other):
+        return isinstance(other, Square) and self.board is other.board and self.index == other.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+
+class Move:
+    """
+    A class that represents a move between two squares.
+
+    Attributes:
+        board (Board): The Board the move is played on.
+        from_index (int): The mailbox index of the square the Move originates from.
+        to_index (int): The mailbox index of the destination of the Move.
+        promotion (str): The piece character a pawn promotes to, or None to leave it as is (default: None).
+    """
+    __slots__ = ("board", "from_index", "to_index", "promotion")
+
+    def __init__(self, board, from_index: int, to_index: int, promotion: str = None):
+        """Initialises Move class."""
+        self.board = board
+        self.from_index = from_index
+        self.to_index = to_index
+        self.promotion = promotion
+
+    @classmethod
+    def from_uci(cls, board, text: str):
+        """
+        Creates a Move from UCI long algebraic notation, such as "e2e4" or "e7e8q".
+
+        Args:
+            board (Board): The Board the move is played on.
+            text (str): The move in UCI notation.
+
+        Returns:
+            (Move): The move. It isn't checked for legality.
+        """
+        promotion = None
+        if len(text) > 4:
+            # UCI promotions are lowercase, the piece character takes the colour of the moving pawn
+            promotion = text[4].upper() if board.turn == WHITE else text[4].lower()
+        return cls(board, parse_square(text[0:2]), parse_square(text[2:4]), promotion)
+
+    def uci(self) -> str:
+        """Returns the move in UCI long algebraic notation, such as "e2e4" or "e7e8q"."""
+        text = square_name(self.from_index) + square_name(self.to_index)
+        return text if self.promotion is None else text + self.promotion.lower()
+
+    @property
+    def square_from(self) -> Square:
+        """A Square which the Move originates from."""
+        return Square(self.board, self.from_index)
+
+    @property
+    def square_to(self) -> Square:
+        """A Square which is the destination of the Move."""
+        return Square(self.board, self.to_index)
+
+    def is_legal(self) -> bool:
+        """
+        Method to check if a Move object is legal: a piece of the side to move must be moving, the move must
+        follow the movement rules in check_legality, and it must be one of the board's legal moves, so it
+        doesn't leave its own king in check. A move without a promotion piece matches any promotion.
+        """
+        board = self.board
+        code = board.mailbox[self.from_index]
+        if code == EMPTY or piece_colour(code) != board.turn:
+            return False
+        if not check_legality(self):
+            return False
+        for move in board.iter_moves():
+            if move.from_index == self.from_index and move.to_index == self.to_index:
+                if self.promotion is None or self.promotion == move.promotion:
+                    return True
+        return False
+
+    def is_promotion(self) -> bool:
+        """Returns True if this move takes a pawn to the last rank."""
+        if self.board.mailbox[self.from_index] & 7 != PAWN:
+            return False
+        return square_row(self.to_index) in (0, 7)
+
+    def is_castling(self) -> bool:
+        """Returns True if this move is a king moving two squares, castling."""
+        return self.board.mailbox[self.from_index] & 7 == KING and abs(self.to_index - self.from_index) == 2
+
+    def make_move(self) -> bool:
+        """
+        Method for executing a move with a given Move object on the board, given a legal Move.
+
+        Returns:
+            (bool): True if the move was legal and has been made, False otherwise.
+        """
+        if not self.is_legal():
+            return False
+
+        self.board.push(self)
+        self.board.generate_moves()  # Re-calculates legal moves after one is made.
+        return True
+
+
+class Board:
+    """
+    Board class.
+
+    Attributes:
+        mailbox (bytearray): The 10x12 mailbox of piece codes.
+        moves (list): The legal moves in the current position, filled in by Board.generate_moves().
+        turn (int): Which colour's turn it is; WHITE = 1, BLACK = -1 (default: 1).
+        en_passant_square (int):
+            The mailbox index of a square that can be moved to if an en passant capture is possible
+            (default: None).
+        check (list): Mailbox indices of kings that are in check.
+        castling (int): The castling rights, a combination of the CASTLE_ bits (default: 15, all rights).
+        halfmove_clock (int): Moves since the last capture or pawn move, for the fifty move rule (default: 0).
+        fullmove_number (int): The number of the current full move, starting at 1 (default: 1).
+        key (int): The Zobrist key of the position, kept up to date as pieces and state change.
+        history (list):
+            An undo record for each move made with Board.push(), holding what Board.pop() needs to take it
+            back: (move, from index, to index, promotion piece code, captured piece code, castling rights,
+            en passant square, halfmove clock, key).
+    """
+
+    def __init__(self, fen: str = FEN):
+        """ Initialises the Board class. """
+        self.mailbox = bytearray(EMPTY_MAILBOX)
+        self.moves = []
+        self.turn = WHITE
+        self.en_passant_square = None
+        self.check = []
+
+        # The castling rights as a bitmask of the CASTLE_ flags, 15 = every right, 0 = no castling. The bits go in
+        # the FEN castling order KQkq from the highest (CASTLE_WHITE_KING, 8) to the lowest (CASTLE_BLACK_QUEEN, 1).
+        self.castling = 15
+
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.history = []
+
+        self.read_fen(fen)
+
+    @property
+    def squares(self) -> list:
+        """A list of all 64 squares on the board, in reading order."""
+        return [Square(self, index) for index in MAILBOX64]
+
+    def generate_moves(self):
+        """Generates a list of all legal moves with the current board position, and updates Board.check. """
+        self.moves[:] = self.iter_moves()
+        self.check = [self.king_square(self.turn)] if self.in_check() else []
+
+    def push(self, move: Move) -> None:
+        """
+        Makes a move on the board, updating only the squares and state it changes, and records how to undo it.
+        The move isn't checked, so it must come from Board.iter_moves() (or be checked with Move.is_legal()).
+        Board.moves and Board.check are left as they are; call Board.generate_moves() to update them.
+
+        Args:
+            move (Move): The move to make.
+        """
+        promotion = EMPTY if move.promotion is None else PIECE_CODES[move.promotion]
+        self._make(move, move.from_index, move.to_index, promotion)
+
+    def push_packed(self, packed: int) -> None:
+        """
+        Makes a packed move from Board.generate_packed() or Board.iter_packed_moves(), like Board.push(). Board.pop()
+        returns it as the packed int.
+
+        Args:
+            packed (int): The packed move to make.
+        """
+        promotion = EMPTY
+        if packed & PACKED_PROMOTION:
+            promotion = (packed >> 12 & 3) + KNIGHT | (0 if self.turn == WHITE else BLACK_PIECE)
+        self._make(packed, MAILBOX64[packed & 63], MAILBOX64[packed >> 6 & 63], promotion)
+
+    def _make(self, move, from_index: int, to_index: int, promotion: int) -> None:
+        """Makes a move given its squares and the code of the piece it promotes to (or EMPTY), for push()."""
+        mailbox = self.mailbox
+        code = mailbox[from_index]
+        captured = mailbox[to_index]
+        kind = code & 7
+        self.history.append((move, from_index, to_index, promotion, captured, self.castling, self.en_passant_square,
+                             self.halfmove_clock, self.key))
+
+        if kind == PAWN or captured != EMPTY:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if kind == PAWN:
+            if to_index == self.en_passant_square:
+                # The captured pawn is behind the en passant square.
+                self.set_piece(to_index + self.turn * 10, EMPTY)
+            if promotion != EMPTY:
+                code = promotion
+        elif kind == KING and abs(to_index - from_index) == 2:
+            # Castling, the rook jumps over the king
+            rook_from, rook_to = CASTLING_ROOKS[to_index]
+            self.set_piece(rook_to, mailbox[rook_from])
+            self.set_piece(rook_from, EMPTY)
+
+        self.set_piece(to_index, code)
+        self.set_piece(from_index, EMPTY)
+
+        key = self.key ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLING[self.castling]
+        self.castling &= CASTLING_MASKS[from_index] & CASTLING_MASKS[to_index]
+        key ^= ZOBRIST_CASTLING[self.castling]
+
+        if self.en_passant_square is not None:
+            key ^= ZOBRIST_EN_PASSANT[square_col(self.en_passant_square)]
+        # If a pawn moves two squares, sets the en passant square to be the one it skipped over.
+        if kind == PAWN and abs(to_index - from_index) == 20:
+            self.en_passant_square = (from_index + to_index) // 2
+            key ^= ZOBRIST_EN_PASSANT[square_col(self.en_passant_square)]
+        else:
+            self.en_passant_square = None
+        self.key = key
+
+        if self.turn == BLACK:
+            self.fullmove_number += 1
+        self.turn = - self.turn
+
+    def pop(self):
+        """
+        Takes back the last move made with Board.push() or Board.push_packed(), restoring the board from its undo
+        record.
+
+        Returns:
+            (Move): The move that was taken back; a packed int if it was made with Board.push_packed().
+        """
+        (move, from_index, to_index, promotion, captured, castling, en_passant_square, halfmove_clock,
+         key) = self.history.pop()
+        mailbox = self.mailbox
+
+        self.turn = - self.turn
+        if self.turn == BLACK:
+            self.fullmove_number -= 1
+        self.castling = castling
+        self.en_passant_square = en_passant_square
+        self.halfmove_clock = halfmove_clock
+
+        code = mailbox[to_index]
+        if promotion != EMPTY:
+            code = PAWN | (code & BLACK_PIECE)
+        self.set_piece(from_index, code)
+        self.set_piece(to_index, captured)
+
+        kind = code & 7
+        if kind == PAWN and to_index == en_passant_square:
+            self.set_piece(to_index + self.turn * 10, code ^ BLACK_PIECE)
+        elif kind == KING and abs(to_index - from_index) == 2:
+            rook_from, rook_to = CASTLING_ROOKS[to_index]
+            self.set_piece(rook_from, mailbox[rook_to])
+            self.set_piece(rook_to, EMPTY)
+        self.key = key
+        return move
+
+    def encode_move(self, move: Move) -> int:
+        """
+        Packs a move of this position into a 16 bit int, with its flags worked out from the board.
+
+        Args:
+            move (Move): The move, which must be pseudo-legal here.
+
+        Returns:
+            (int): The packed move.
+        """
+        from_index, to_index = move.from_index, move.to_index
+        kind = self.mailbox[from_index] & 7
+        packed = SQUARE64[from_index] | SQUARE64[to_index] << 6
+        if self.mailbox[to_index] != EMPTY:
+            packed |= PACKED_CAPTURE
+        if kind == PAWN:
+            if to_index == self.en_passant_square:
+                packed |= PACKED_EN_PASSANT
+            elif abs(to_index - from_index) == 20:
+                packed |= PACKED_DOUBLE_PUSH
+            if move.promotion is not None:
+                packed |= PACKED_PROMOTION | ((PIECE_CODES[move.promotion] & 7) - KNIGHT) << 12
+        elif kind == KING and abs(to_index - from_index) == 2:
+            packed |= PACKED_KING_CASTLE if to_index > from_index else PACKED_QUEEN_CASTLE
+        return packed
+
+    def decode_move(self, packed: int) -> Move:
+        """
+        Unpacks a packed move into a Move on this board. The promotion piece takes the colour of the side to move,
+        so the move must be one of this position's.
+
+        Args:
+            packed (int): The packed move.
+
+        Returns:
+            (Move): The move. It isn't checked for legality.
+        """
+        promotion = None
+        if packed & PACKED_PROMOTION:
+            promotion = "NBRQ"[packed >> 12 & 3] if self.turn == WHITE else "nbrq"[packed >> 12 & 3]
+        return Move(self, MAILBOX64[packed & 63], MAILBOX64[packed >> 6 & 63], promotion)
+
+    def compute_key(self) -> int:
+        """Works out the Zobrist key of the position from scratch."""
+        key = 0
+        for index in MAILBOX64:
+            key ^= ZOBRIST_PIECES[self.mailbox[index]][index]
+        if self.turn == BLACK:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castling]
+        if self.en_passant_square is not None:
+            key ^= ZOBRIST_EN_PASSANT[square_col(self.en_passant_square)]
+        return key
+
+    def is_repetition(self) -> bool:
+        """
+        Returns True if the position has already occurred since the last capture or pawn move. Only positions
+        with the same side to move can repeat, so every other undo record is checked, back as far as the
+        halfmove clock goes.
+        """
+        history = self.history
+        key = self.key
+        oldest = max(len(history) - self.halfmove_clock, 0)
+        for i in range(len(history) - 2, oldest - 1, -2):
+            if history[i][8] == key:
+                return True
+        return False
+
+    def iter_moves(self):
+        """
+        Lazily generates the legal moves of the side to move as Moves, from Board.iter_packed_moves().
+
+        Yields:
+            (Move): Each legal move in turn.
+        """
+        decode = self.decode_move
+        for packed in self.iter_packed_moves():
+            yield decode(packed)
+
+    def generate_packed(self, buffer) -> int:
+        """
+        Generates the legal moves of the side to move into a buffer as packed ints, overwriting it from the start.
+
+        Args:
+            buffer (array): The buffer, such as one from move_buffer(), with room for MAX_MOVES moves.
+
+        Returns:
+            (int): The number of moves; the rest of the buffer is left as it was.
+        """
+        count = -1
+        for count, packed in enumerate(self.iter_packed_moves()):
+            buffer[count] = packed
+        return count + 1
+
+    def iter_packed_moves(self):
+        """
+        Lazily generates the legal moves of the side to move, as packed ints.
+
+        The checking pieces and the pinned pieces are worked out once, by walking out from the king, and each
+        pseudo-legal move is then kept or dropped with a few set lookups:
+            * In double check only king moves are legal.
+            * In single check other moves must capture the checker or block the check.
+            * A pinned piece may only move along the line between its king and the pinning piece.
+            * A king may not move to an attacked square.
+        Only en passant captures, which can uncover an attack along the row, are tried out on the board.
+        Castling moves come last.
+
+        Yields:
+            (int): Each legal packed move in turn.
+        """
+        colour = self.turn
+        king = self.king_square(colour)
+        if king is None:
+            # Without a king nothing can be left in check
+            yield from self.iter_pseudo_legal_packed()
+            return
+
+        king_code = self.mailbox[king]
+        king_square = SQUARE64[king]
+        checkers, blocks, pins = self.checks_and_pins(king)
+
+        for packed in self.iter_pseudo_legal_packed():
+            to_index = MAILBOX64[packed >> 6 & 63]
+            if packed & 63 == king_square:
+                # Takes the king off the board so it can't hide behind itself from a sliding piece
+                self.set_piece(king, EMPTY)
+                attacked = self.is_square_attacked(to_index, - colour)
+                self.set_piece(king, king_code)
+                if attacked:
+                    continue
+            elif len(checkers) > 1:
+                continue
+            else:
+                from_index = MAILBOX64[packed & 63]
+                if from_index in pins and to_index not in pins[from_index]:
+                    continue
+                if packed >> 12 == PACKED_EN_PASSANT >> 12:
+                    if not self._en_passant_is_safe(from_index, to_index, king):
+                        continue
+                elif checkers and to_index not in blocks:
+                    continue
+            yield packed
+
+        if not checkers:
+            yield from self._iter_castling_packed()
+
+    def iter_pseudo_legal_moves(self):
+        """
+        Lazily generates the pseudo-legal moves of the side to move as Moves, from Board.iter_pseudo_legal_packed().
+
+        Yields:
+            (Move): Each move in turn.
+        """
+        decode = self.decode_move
+        for packed in self.iter_pseudo_legal_packed():
+            yield decode(packed)
+
+    def iter_pseudo_legal_packed(self):
+        """
+        Lazily generates the pseudo-legal moves of the side to move as packed ints, which may leave their own king
+        in check.
+
+        Only squares holding a piece of the side to move are looked at, and each piece's moves come straight
+        from the offset tables, so no move is made for a square the piece can't reach. Pawns reaching the last
+        rank generate one move for each promotion piece. As this is a generator, a caller can stop as soon as
+        it has found what it needs.
+
+        Yields:
+            (int): Each packed move in turn.
+        """
+        mailbox = self.mailbox
+        colour = self.turn
+        own = 0 if colour == WHITE else BLACK_PIECE
+        forward = - colour * 10
+        start_row = 6 if colour == WHITE else 1
+        promotion_row = 0 if colour == WHITE else 7
+        en_passant = self.en_passant_square
+
+        for from_index in MAILBOX64:
+            code = mailbox[from_index]
+            if code == EMPTY or code & BLACK_PIECE != own:
+                continue
+            kind = code & 7
+            from_square = SQUARE64[from_index]
+
+            if kind == PAWN:
+                targets = []
+                to_index = from_index + forward
+                if mailbox[to_index] == EMPTY:
+                    targets.append(from_square | SQUARE64[to_index] << 6)
+                    if square_row(from_index) == start_row and mailbox[to_index + forward] == EMPTY:
+                        yield from_square | SQUARE64[to_index + forward] << 6 | PACKED_DOUBLE_PUSH
+                for to_index in (from_index + forward - 1, from_index + forward + 1):
+                    target = mailbox[to_index]
+                    if target == EMPTY:
+                        if to_index == en_passant:
+                            targets.append(from_square | SQUARE64[to_index] << 6 | PACKED_EN_PASSANT)
+                    elif target != OFFBOARD and target & BLACK_PIECE != own:
+                        targets.append(from_square | SQUARE64[to_index] << 6 | PACKED_CAPTURE)
+                if square_row(from_index + forward) == promotion_row:
+                    for packed in targets:
+                        for flags in PROMOTION_FLAGS:
+                            yield packed | flags
+                else:
+                    yield from targets
+
+            elif kind == KNIGHT or kind == KING:
+                for offset in KNIGHT_OFFSETS if kind == KNIGHT else KING_OFFSETS:
+                    to_index = from_index + offset
+                    target = mailbox[to_index]
+                    if target == EMPTY:
+                        yield from_square | SQUARE64[to_index] << 6
+                    elif target != OFFBOARD and target & BLACK_PIECE != own:
+                        yield from_square | SQUARE64[to_index] << 6 | PACKED_CAPTURE
+
+            else:
+                for direction in SLIDING_OFFSETS[kind]:
+                    to_index = from_index + direction
+                    target = mailbox[to_index]
+                    while target == EMPTY:
+                        yield from_square | SQUARE64[to_index] << 6
+                        to_index += direction
+                        target = mailbox[to_index]
+                    if target != OFFBOARD and target & BLACK_PIECE != own:
+                        yield from_square | SQUARE64[to_index] << 6 | PACKED_CAPTURE
+
+    def _en_passant_is_safe(self, from_index: int, to_index: int, king: int) -> bool:
+        """
+        Tries an en passant capture on the board and returns True if it doesn't leave the king in check. Both
+        pawns leave the row, which can uncover an attack that the pin check doesn't see.
+        """
+        colour = self.turn
+        captured = square_offset(to_index, 0, colour)
+        code = self.mailbox[from_index]
+        self.set_piece(from_index, EMPTY)
+        self.set_piece(captured, EMPTY)
+        self.set_piece(to_index, code)
+        safe = not self.is_square_attacked(king, - colour)
+        self.set_piece(to_index, EMPTY)
+        self.set_piece(captured, code ^ BLACK_PIECE)
+        self.set_piece(from_index, code)
+        return safe
+
+    def _iter_castling_packed(self):
+        """Yields the castling moves of the side to move as packed ints; it must not be in check."""
+        mailbox = self.mailbox
+        colour = self.turn
+        side = 0 if colour == WHITE else BLACK_PIECE
+        for right, king_from, king_to, rook_from, _, empty, safe in CASTLING_MOVES[colour]:
+            if not self.castling & right:
+                continue
+            if mailbox[king_from] != side | KING or mailbox[rook_from] != side | ROOK:
+                continue
+            if any(mailbox[index] != EMPTY for index in empty):
+                continue
+            if any(self.is_square_attacked(index, - colour) for index in safe):
+                continue
+            yield (SQUARE64[king_from] | SQUARE64[king_to] << 6
+                   | (PACKED_KING_CASTLE if king_to > king_from else PACKED_QUEEN_CASTLE))
+
+    def king_square(self, colour: int) -> int:
+        """Returns the mailbox index of the king of the given colour, or None if it has no king."""
+        index = self.mailbox.find(KING if colour == WHITE else KING | BLACK_PIECE)
+        return None if index == -1 else index
+
+    def in_check(self) -> bool:
+        """Returns True if the king of the side to move is attacked."""
+        king = self.king_square(self.turn)
+        return king is not None and self.is_square_attacked(king, - self.turn)
+
+    def is_square_attacked(self, index: int, colour: int) -> bool:
+        """
+        Returns True if a piece of the given colour attacks a square, by looking outwards from the square for
+        each kind of piece that could be attacking it.
+
+        Args:
+            index (int): The mailbox index of the square.
+            colour (int): The colour of the attacking pieces, WHITE or BLACK.
+        """
+        mailbox = self.mailbox
+        side = 0 if colour == WHITE else BLACK_PIECE
+
+        # Pawns attack forwards, so an attacking pawn is a row behind the square from its own point of view
+        pawn = side | PAWN
+        if mailbox[index + colour * 10 - 1] == pawn or mailbox[index + colour * 10 + 1] == pawn:
+            return True
+        for offsets, code in ((KNIGHT_OFFSETS, side | KNIGHT), (KING_OFFSETS, side | KING)):
+            for offset in offsets:
+                if mailbox[index + offset] == code:
+                    return True
+        for offsets, code in ((BISHOP_OFFSETS, side | BISHOP), (ROOK_OFFSETS, side | ROOK)):
+            for direction in offsets:
+                target = index + direction
+                while mailbox[target] == EMPTY:
+                    target += direction
+                if mailbox[target] == code or mailbox[target] == side | QUEEN:
+                    return True
+        return False
+
+    def checks_and_pins(self, king: int) -> tuple:
+        """
+        Finds the pieces checking a king and the pieces pinned to it.
+
+        Args:
+            king (int): The mailbox index of the king.
+
+        Returns:
+            (tuple): A tuple of:
+                * checkers (list): Mailbox indices of the enemy pieces giving check.
+                * blocks (set): Squares where a piece would capture the checker or block its check.
+                * pins (dict): For each pinned piece's index, the set of squares it can move to without leaving
+                  the line of the pin (the pinning piece included).
+        """
+        mailbox = self.mailbox
+        own = mailbox[king] & BLACK_PIECE
+        enemy = own ^ BLACK_PIECE
+        colour = WHITE if own == 0 else BLACK
+        checkers = []
+        blocks = set()
+        pins = {}
+
+        for direction in KING_OFFSETS:
+            slider = enemy | (BISHOP if direction in BISHOP_OFFSETS else ROOK)
+            ray = []
+            pinned = None
+            index = king + direction
+            while True:
+                code = mailbox[index]
+                if code == OFFBOARD:
+                    break
+                ray.append(index)
+                if code != EMPTY:
+                    if code & BLACK_PIECE == own:
+                        if pinned is not None:
+                            # Two of our own pieces, neither is pinned
+                            break
+                        pinned = index
+                    else:
+                        if code == slider or code == enemy | QUEEN:
+                            if pinned is None:
+                                checkers.append(index)
+                                blocks.update(ray)
+                            else:
+                                pins[pinned] = set(ray)
+                        break
+                index += direction
+
+        for offset in KNIGHT_OFFSETS:
+            if mailbox[king + offset] == enemy | KNIGHT:
+                checkers.append(king + offset)
+                blocks.add(king + offset)
+        for offset in (- colour * 10 - 1, - colour * 10 + 1):
+            if mailbox[king + offset] == enemy | PAWN:
+                checkers.append(king + offset)
+                blocks.add(king + offset)
+
+        return checkers, blocks, pins
+
+    def get_square(self, col: int, row: int) -> Square:
+        """
+        Returns the Square of the board at the given coordinates.
+
+        Args:
+            col (int): The column of the desired square.
+            row (int): The row of the desired square.
+
+        Returns:
+            (Square): The board's Square, if it exists.
+            None: if the coordinates are off the board.
+        """
+        if 0 <= col < 8 and 0 <= row < 8:
+            return Square(self, square_index(col, row))
+        return None
+
+    def set_piece(self, index: int, code: int) -> None:
+        """
+        Puts a piece code (or EMPTY) on a square. All changes to the pieces on the board go through here, so
+        subclasses with extra piece bookkeeping can keep it up to date.
+
+        Args:
+            index (int): The mailbox index of the square.
+            code (int): The piece code to put there.
+        """
+        self.key ^= ZOBRIST_PIECES[self.mailbox[index]][index] ^ ZOBRIST_PIECES[code][index]
+        self.mailbox[index] = code
+
+    def piece_at(self, col: int, row: int) -> str:
+        """Returns the FEN character of the piece at the given coordinates, or None for an empty square."""
+        code = self.mailbox[square_index(col, row)]
+        return None if code == EMPTY else PIECE_CHARS[code]
+
+    def generate_fen(self) -> str:
+        """Returns the position as a FEN string, with all six fields."""
+        rows = []
+        for row in range(8):
+            fen = ""
+            skip = 0
+            for col in range(8):
+                code = self.mailbox[square_index(col, row)]
+                if code == EMPTY:
+                    skip += 1
+                    continue
+                if skip != 0:
+                    # Inserts the number of empty squares before this piece
+                    fen += str(skip)
+                    skip = 0
+                fen += PIECE_CHARS[code]
+            if skip != 0:
+                fen += str(skip)
+            rows.append(fen)
+        castling = "".join(char for char, right in CASTLING_CHARS.items() if self.castling & right) or "-"
+        en_passant = "-" if self.en_passant_square is None else square_name(self.en_passant_square)
+        return (f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {castling} {en_passant} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def reset_pieces(self):
+        """Empties every square of the board, leaving the off-board border as it is."""
+        self.mailbox[:] = EMPTY_MAILBOX
+
+    def read_fen(self, fen_string: str) -> None:
+        """
+        Reads a string in FEN format, and assigns relevant variables based off of what it reads.
+        https://en.wikipedia.org/wiki/Forsyth%E2%80%93Edwards_Notation
+
+        Args:
+            fen_string (str): A string that should be in FEN format with information on the board's status.
+
+        Raises:
+            ValueError: If the FEN string is malformed; the board is left as it was.
+        """
+        mailbox, turn, castling, en_passant_square, halfmove_clock, fullmove_number = parse_fen(fen_string)
+        self.reset_pieces()
+        self.history = []
+        # The pieces go through set_piece() so that subclasses can keep their own piece bookkeeping
+        for index in MAILBOX64:
+            if mailbox[index] != EMPTY:
+                self.set_piece(index, mailbox[index])
+        self.turn = turn
+        self.castling = castling
+        self.en_passant_square = en_passant_square
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.key = self.compute_key()
+
+
+def square_offset(index: int, col: int, row: int) -> int:
+    """
+    A function that returns the mailbox index offset from another by the specified column and row values.
+    The result may be a border cell, in which case the mailbox holds OFFBOARD there.
+    """
+    return index + col + row * 10
+
+
+def check_legality(move: Move) -> bool:
+    """
+    A function that takes in a Move object and returns if it is legal.
+
+    Args:
+        move (Move): A Move object between two squares which is checked to see if it is a valid move.
+
+    Returns:
+        (Bool): True if the move is legal, False otherwise.
+    """
+    board = move.board
+    mailbox = board.mailbox
+    from_index, to_index = move.from_index, move.to_index
+    code = mailbox[from_index]
+    target = mailbox[to_index]
+
+    if code == EMPTY or code == OFFBOARD or target == OFFBOARD:
+        # If you're trying to move an empty square, or off the board, it fails
+        return False
+    colour = piece_colour(code)
+    if target != EMPTY and piece_colour(target) == colour:
+        # If you're trying to capture a piece of the same colour, it fails
+        return False
+
+    # If it gets here we know a piece is moving and isn't trying to capture its own piece - do more checks here
+    kind = code & 7
+    offset = to_index - from_index
+    if kind == PAWN:
+        forward = - colour * 10
+        # Moving forward if the square is empty
+        if offset == forward:
+            return target == EMPTY
+        # Moving two squares if on the 2nd or 7th rank
+        if offset == forward * 2:
+            return (target == EMPTY and mailbox[from_index + forward] == EMPTY
+                    and square_row(from_index) == (6 if colour == WHITE else 1))
+        # Capturing, including en passant
+        if offset == forward - 1 or offset == forward + 1:
+            return target != EMPTY or to_index == board.en_passant_square
+        return False
+
+    if kind == KNIGHT:
+        return offset in KNIGHT_OFFSETS
+
+    if kind == KING:
+        # Castling is the king moving two squares from its starting square; the rest is up to Board.iter_moves
+        castling = any(move[1:3] == (from_index, to_index) for move in CASTLING_MOVES[colour])
+        return offset in KING_OFFSETS or castling
+
+    # Movement for sliding pieces
+    for direction in SLIDING_OFFSETS[kind]:
+        if to_index in sliding_move(board, from_index, direction):
+            return True
+
+    return False
+
+
+def sliding_move(board: Board, index: int, direction: int) -> list:
+    """
+    A function to calculate a list of squares a sliding piece can move to in a line with a given offset direction,
+    for both straight and diagonal moving pieces. The last square is included if it holds a piece which can be
+    captured.
+
+    Args:
+        board (Board): The board to slide on.
+        index (int): The mailbox index of the moving piece.
+        direction (int): The mailbox offset of one step in the direction of travel.
+
+    Returns:
+        (list): The mailbox indices the piece can reach.
+    """
+    mailbox = board.mailbox
+    colour = piece_colour(mailbox[index])
+    squares = []
+    index += direction
+    while mailbox[index] == EMPTY:
+        squares.append(index)
+        index += direction
+    target = mailbox[index]
+    if target != OFFBOARD and piece_colour(target) != colour:
+        squares.append(index)
+    return squares
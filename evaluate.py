@@ -0,0 +1,245 @@
+"""
+Static evaluation of positions: material plus piece-square tables, tapered between the middlegame and the
+endgame.
+
+Scores are in centipawns. The tables are the ones from Tomasz Michniewski's Simplified Evaluation Function,
+written from white's point of view in reading order (a8 first, h1 last), the same order as core.MAILBOX64, so a
+black piece on square n reads the table at n ^ 56, the square mirrored top to bottom. The position is scored
+with both the middlegame and the endgame tables, and the two scores are blended by the game phase, worked out
+from the minor and major pieces left on the board.
+https://www.chessprogramming.org/Simplified_Evaluation_Function
+https://www.chessprogramming.org/Tapered_Eval
+
+Scoring all 64 squares at every node of a search is wasteful, since a move only changes two or three of them.
+EvaluatedBoard and EvaluatedBitBoard keep running middlegame, endgame and phase scores, updated in set_piece()
+as Board.push() and Board.pop() move pieces, so evaluate() is a few arithmetic operations on them.
+"""
+
+from bitboard import BitBoard
+from core import BISHOP, BLACK_PIECE, FEN, KING, KNIGHT, MAILBOX64, PAWN, QUEEN, ROOK, Board
+
+# Scores for checkmate. A mate found n plies from the root scores MATE - n, so shorter mates score higher, and
+# any score beyond MATE_THRESHOLD is a mate.
+MATE = 100000
+MATE_THRESHOLD = MATE - 1000
+
+# Material value of each piece kind, indexed by kind. The king is never captured, so it isn't counted.
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0)
+
+PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+
+# The middlegame king table: the king stays behind its pawns.
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+
+# The endgame king table: with few pieces left the king is safe in the centre, and useful there.
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+PIECE_SQUARE_TABLES = {
+    PAWN: PAWN_TABLE,
+    KNIGHT: KNIGHT_TABLE,
+    BISHOP: BISHOP_TABLE,
+    ROOK: ROOK_TABLE,
+    QUEEN: QUEEN_TABLE,
+    KING: KING_TABLE,
+}
+
+# Only the king plays differently in the endgame.
+ENDGAME_TABLES = {**PIECE_SQUARE_TABLES, KING: KING_ENDGAME_TABLE}
+
+# How much each piece kind counts towards the game phase. The starting position has a phase of TOTAL_PHASE and
+# is scored entirely with the middlegame tables; a position with only kings and pawns has a phase of 0 and is
+# scored entirely with the endgame tables.
+PHASE_VALUES = (0, 0, 1, 1, 2, 4, 0)
+TOTAL_PHASE = 24
+
+
+def square_scores(values=PIECE_VALUES, tables=None) -> list:
+    """
+    Combines material values and piece-square tables into one lookup table.
+
+    Args:
+        values (tuple): The material value of each piece kind (default: PIECE_VALUES).
+        tables (dict): A piece-square table for each piece kind (default: PIECE_SQUARE_TABLES).
+
+    Returns:
+        (list):
+            For each piece code, a list of 120 scores, one per mailbox index, of that piece standing on that
+            square. White pieces score positively and black pieces negatively; other codes score 0.
+    """
+    tables = PIECE_SQUARE_TABLES if tables is None else tables
+    scores = [[0] * 120 for _ in range(16)]
+    for kind, table in tables.items():
+        for square, index in enumerate(MAILBOX64):
+            scores[kind][index] = values[kind] + table[square]
+            scores[kind | BLACK_PIECE][index] = - (values[kind] + table[square ^ 56])
+    return scores
+
+
+MIDDLEGAME_SCORES = square_scores()
+ENDGAME_SCORES = square_scores(tables=ENDGAME_TABLES)
+# The phase value of each piece code, for either colour.
+PHASE_SCORES = [PHASE_VALUES[code & 7] if code & 7 <= KING else 0 for code in range(16)]
+
+
+def score_position(board: Board) -> tuple:
+    """
+    Works out the middlegame score, endgame score and phase of a position from scratch.
+
+    Args:
+        board (Board): The position to score.
+
+    Returns:
+        (tuple): (middlegame score, endgame score, phase), with the scores from white's point of view.
+    """
+    mailbox = board.mailbox
+    middlegame = endgame = phase = 0
+    for index in MAILBOX64:
+        code = mailbox[index]
+        middlegame += MIDDLEGAME_SCORES[code][index]
+        endgame += ENDGAME_SCORES[code][index]
+        phase += PHASE_SCORES[code]
+    return middlegame, endgame, phase
+
+
+class IncrementalEvaluation:
+    """
+    Keeps running evaluation scores for a board class, updated as pieces are put on and taken off squares. It
+    is mixed in before the board class, as in EvaluatedBoard, so that its set_piece() runs first.
+
+    Attributes:
+        middlegame_score (int): The middlegame score, from white's point of view.
+        endgame_score (int): The endgame score, from white's point of view.
+        phase (int): The game phase, the sum of PHASE_VALUES of the pieces on the board.
+        debug (bool):
+            If True, evaluate() checks the running scores against score_position() and raises an
+            AssertionError if they differ. This is slow, so it is off by default.
+    """
+
+    def __init__(self, fen: str = FEN):
+        """ Initialises the running scores, which reading the FEN then fills in. """
+        self.middlegame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+        self.debug = False
+        super().__init__(fen)
+
+    def set_piece(self, index: int, code: int) -> None:
+        """Puts a piece code (or EMPTY) on a square, updating the running scores by the difference."""
+        old = self.mailbox[index]
+        self.middlegame_score += MIDDLEGAME_SCORES[code][index] - MIDDLEGAME_SCORES[old][index]
+        self.endgame_score += ENDGAME_SCORES[code][index] - ENDGAME_SCORES[old][index]
+        self.phase += PHASE_SCORES[code] - PHASE_SCORES[old]
+        super().set_piece(index, code)
+
+    def reset_pieces(self):
+        super().reset_pieces()
+        self.middlegame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+
+
+class EvaluatedBoard(IncrementalEvaluation, Board):
+    """A Board with running evaluation scores."""
+
+
+class EvaluatedBitBoard(IncrementalEvaluation, BitBoard):
+    """A BitBoard with running evaluation scores."""
+
+
+# The board backends for searching, like perft.BACKENDS but with running evaluation scores.
+BACKENDS = {"mailbox": EvaluatedBoard, "bitboard": EvaluatedBitBoard}
+
+
+def evaluate(board: Board) -> int:
+    """
+    Evaluates a position, blending the middlegame and endgame scores by the game phase. Boards with running
+    scores (see IncrementalEvaluation) are evaluated from those; any other board is scored from scratch.
+
+    Args:
+        board (Board): The position to evaluate.
+
+    Returns:
+        (int): The score in centipawns, from the point of view of the side to move.
+    """
+    if isinstance(board, IncrementalEvaluation):
+        middlegame, endgame, phase = board.middlegame_score, board.endgame_score, board.phase
+        if board.debug:
+            assert (middlegame, endgame, phase) == score_position(board), (
+                f"Running scores {(middlegame, endgame, phase)} differ from {score_position(board)} "
+                f"in {board.generate_fen()}")
+    else:
+        middlegame, endgame, phase = score_position(board)
+    # Promotions can take the phase past its starting value.
+    phase = min(phase, TOTAL_PHASE)
+    return (middlegame * phase + endgame * (TOTAL_PHASE - phase)) * board.turn // TOTAL_PHASE
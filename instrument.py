@@ -0,0 +1,328 @@
+"""
+Counting and timing the hot paths of the engine, to see where the time of a search goes.
+
+Instrumentation is opt-in and costs nothing while it is off: nothing in core, bitboard, evaluate, search or
+transposition checks for it. Instead Instrumentation.enable() wraps the measured methods in place, on the classes
+(and the module) that define them, and disable() puts the originals back, so a search run without it calls
+exactly the same functions as before. Times are inclusive, so the time of a legality check made during move
+generation counts towards both.
+
+The measured paths are:
+    * movegen: generating the legal moves, into a buffer (Board.generate_packed) or as Moves (Board.iter_moves,
+      timed only while the generator is running).
+    * legality: finding checks and pins, and attack checks (Board.checks_and_pins, is_square_attacked, and
+      BitBoard.in_check, which tests the king's attackers directly; BitBoard overrides the other two as well).
+    * make and unmake: Board.push or Board.push_packed, and Board.pop.
+    * evaluate: the static evaluation called by the search.
+    * tt_probe and tt_store: transposition table lookups, with the number that hit, and stores.
+
+profile_search() runs a single search under cProfile and writes a pstats file, which snakeviz, gprof2dot or
+flameprof can show as a call graph or flame graph, or traces it into collapsed stacks, one "caller;callee time"
+line per call stack, which flamegraph.pl and speedscope read directly.
+
+Usage:
+    python instrument.py --depth 5
+    python instrument.py --depth 5 --profile search.prof
+    python instrument.py --movetime 5 --folded search.folded
+"""
+
+import argparse
+import cProfile
+import os
+import sys
+import time
+
+import search
+from bitboard import BitBoard
+from core import FEN, Board
+from evaluate import BACKENDS
+from transposition import TranspositionTable
+
+# The methods measured, as (stat name, class or module, attribute). Only attributes the owner defines itself are
+# wrapped, so a subclass that overrides one is listed as well.
+TARGETS = (
+    ("movegen", Board, "generate_packed"),
+    ("movegen", Board, "iter_moves"),
+    ("legality", Board, "checks_and_pins"),
+    ("legality", Board, "is_square_attacked"),
+    ("legality", BitBoard, "checks_and_pins"),
+    ("legality", BitBoard, "is_square_attacked"),
+    ("legality", BitBoard, "in_check"),
+    ("make", Board, "_make"),
+    ("unmake", Board, "pop"),
+    ("evaluate", search, "evaluate"),
+    ("tt_probe", TranspositionTable, "probe"),
+    ("tt_store", TranspositionTable, "store"),
+)
+
+# The stat names in the order they are reported.
+STAT_NAMES = ("movegen", "legality", "make", "unmake", "evaluate", "tt_probe", "tt_store")
+
+
+class Stats:
+    """
+    Call counts and times of the measured paths.
+
+    Attributes:
+        calls (dict): The number of calls of each stat name.
+        seconds (dict): The time spent in each stat name, in seconds.
+        tt_hits (int): The number of transposition table probes that found their position.
+    """
+
+    def __init__(self):
+        self.calls = dict.fromkeys(STAT_NAMES, 0)
+        self.seconds = dict.fromkeys(STAT_NAMES, 0.0)
+        self.tt_hits = 0
+
+    def reset(self) -> None:
+        """Sets every count and time back to zero."""
+        self.calls = dict.fromkeys(STAT_NAMES, 0)
+        self.seconds = dict.fromkeys(STAT_NAMES, 0.0)
+        self.tt_hits = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        """Records one call of a stat name and the time it took."""
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+
+    def as_dict(self) -> dict:
+        """Returns the stats as a dict of {name: {"calls", "seconds"}}, plus the transposition table hits."""
+        stats = {name: {"calls": self.calls[name], "seconds": self.seconds[name]} for name in STAT_NAMES}
+        stats["tt_hits"] = self.tt_hits
+        return stats
+
+    def info(self) -> str:
+        """Returns the stats as a UCI info string line, with the calls and milliseconds of each stat name."""
+        parts = [f"{name} {self.calls[name]} {int(self.seconds[name] * 1000)}ms" for name in STAT_NAMES]
+        probes = self.calls["tt_probe"]
+        parts.append(f"tthits {self.tt_hits * 100 // probes if probes else 0}%")
+        return "info string " + " ".join(parts)
+
+
+class Instrumentation:
+    """
+    Wraps the measured methods while enabled, recording into a Stats. Only one can be enabled at a time, and it
+    measures every board and table in the process, on every thread. Can be used as a context manager, which
+    enables it on entry and disables it on exit.
+
+    Attributes:
+        stats (Stats): The counts and times recorded so far.
+        enabled (bool): True while the methods are wrapped.
+    """
+
+    # The instrumentation currently enabled, if any.
+    active = None
+
+    def __init__(self, stats: Stats = None):
+        self.stats = Stats() if stats is None else stats
+        self.enabled = False
+        self._originals = []
+
+    def enable(self) -> None:
+        """
+        Wraps the measured methods.
+
+        Raises:
+            RuntimeError: If another Instrumentation is already enabled.
+        """
+        if self.enabled:
+            return
+        if Instrumentation.active is not None:
+            raise RuntimeError("Another Instrumentation is already enabled")
+        for name, owner, attribute in TARGETS:
+            if attribute not in vars(owner):
+                continue
+            original = vars(owner)[attribute]
+            if attribute == "iter_moves":
+                wrapper = _timed_generator(self.stats, name, original)
+            elif attribute == "probe":
+                wrapper = _timed_probe(self.stats, name, original)
+            else:
+                wrapper = _timed(self.stats, name, original)
+            self._originals.append((owner, attribute, original))
+            setattr(owner, attribute, wrapper)
+        self.enabled = True
+        Instrumentation.active = self
+
+    def disable(self) -> None:
+        """Puts the original methods back."""
+        for owner, attribute, original in reversed(self._originals):
+            setattr(owner, attribute, original)
+        self._originals = []
+        self.enabled = False
+        if Instrumentation.active is self:
+            Instrumentation.active = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.disable()
+
+
+def _timed(stats: Stats, name: str, function):
+    """Wraps a function to record each call and its time under a stat name."""
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.add(name, clock() - start)
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _timed_probe(stats: Stats, name: str, function):
+    """Wraps TranspositionTable.probe to record each call and its time, and count the hits."""
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        entry = function(*args, **kwargs)
+        stats.add(name, clock() - start)
+        if entry is not None:
+            stats.tt_hits += 1
+        return entry
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _timed_generator(stats: Stats, name: str, function):
+    """
+    Wraps a generator function to record each call under a stat name, timing only the steps of the generator
+    itself and not the caller's work between them.
+    """
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        iterator = function(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += clock() - start
+                    return
+                elapsed += clock() - start
+                yield item
+        finally:
+            # Also reached when the caller stops early and the generator is closed
+            stats.add(name, elapsed)
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def trace_folded(function, *args, **kwargs) -> tuple:
+    """
+    Calls a function while tracing every Python call it makes, adding up the time spent in each call stack.
+
+    Args:
+        function (callable): The function to call, with any further arguments.
+
+    Returns:
+        (tuple): (the function's return value, dict of {call stack: seconds}). Each call stack is its
+            "file:function" frames from the outermost, joined with ";", and its time excludes the calls it made.
+    """
+    totals = {}
+    names = []
+    # Each frame on the stack as [call stack, start time, time spent in calls it made]
+    frames = []
+    clock = time.perf_counter
+
+    def profiler(frame, event, arg):
+        if event == "call":
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frames.append([";".join(names), clock(), 0.0])
+        elif event == "return" and frames:
+            stack, start, children = frames.pop()
+            names.pop()
+            elapsed = clock() - start
+            totals[stack] = totals.get(stack, 0.0) + elapsed - children
+            if frames:
+                frames[-1][2] += elapsed
+
+    sys.setprofile(profiler)
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        sys.setprofile(None)
+    return result, totals
+
+
+def write_folded(totals: dict, path: str) -> None:
+    """Writes call stack times from trace_folded() as collapsed stacks, in whole microseconds."""
+    with open(path, "w") as file:
+        for stack, seconds in sorted(totals.items()):
+            microseconds = int(seconds * 1_000_000)
+            if microseconds > 0:
+                file.write(f"{stack} {microseconds}\n")
+
+
+def profile_search(searcher, board: Board, path: str, folded: bool = False, depth: int = None,
+                   movetime: float = None, nodes: int = None, info=None):
+    """
+    Runs one search under a profiler and writes the profile to a file.
+
+    Args:
+        searcher (Searcher): The searcher.
+        board (Board): The position to search.
+        path (str): The file to write.
+        folded (bool): Write collapsed stacks for a flame graph rather than a pstats file (default: False).
+        depth (int): The depth to search to, in plies (default: None, no limit).
+        movetime (float): The time to search for, in seconds (default: None, no limit).
+        nodes (int): The number of nodes to search (default: None, no limit).
+        info (callable): Called with the SearchResult after each finished depth (default: None).
+
+    Returns:
+        (SearchResult): The result of the search.
+    """
+    if folded:
+        result, totals = trace_folded(searcher.search, board, depth, movetime, nodes, info)
+        write_folded(totals, path)
+    else:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(searcher.search, board, depth, movetime, nodes, info)
+        profiler.dump_stats(path)
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Search a position, reporting where the time goes.")
+    parser.add_argument("--fen", default=FEN, help="the position to search (default: the start position)")
+    parser.add_argument("--depth", type=int, help="the depth to search to, in plies")
+    parser.add_argument("--movetime", type=float, help="the time to search for, in seconds")
+    parser.add_argument("--nodes", type=int, help="the number of nodes to search")
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox", help="the board representation to use")
+    parser.add_argument("--hash", type=float, default=16, help="the transposition table size in MB (default: 16)")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--profile", help="write a cProfile pstats file of the search")
+    output.add_argument("--folded", help="write the search as collapsed stacks, for a flame graph")
+    args = parser.parse_args(argv)
+
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.depth = 4
+    board = BACKENDS[args.backend](args.fen)
+    searcher = search.Searcher(args.hash)
+    limits = (args.depth, args.movetime, args.nodes)
+    if args.profile or args.folded:
+        # Profiling adds its own overhead, so the counters are left off
+        result = profile_search(searcher, board, args.profile or args.folded, args.folded is not None, *limits,
+                                info=lambda result: print(result.info()))
+    else:
+        with Instrumentation() as instrumentation:
+            result = searcher.search(board, *limits, info=lambda result: print(f"{result.info()}\n"
+                                                                               f"{instrumentation.stats.info()}"))
+    print("bestmove", result.move.uci() if result.move is not None else "0000")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+Self-play matches between two engine settings, to tell whether a change makes the engine stronger.
+
+Each engine setting is a board backend and search limits, such as {"name": "bitboard", "backend": "bitboard",
+"movetime": 0.1}. The games start from a set of opening positions, and each opening is played twice with the
+colours swapped, so neither side gains from a lopsided opening. Games are played in parallel on a pool of worker
+processes, each game with its own boards and a searcher per side.
+
+A game ends with checkmate or stalemate, the fifty move rule, threefold repetition or insufficient material, or
+is adjudicated:
+    * as a win once both engines agree, for WIN_PLIES plies in a row, that one side is winning by WIN_SCORE, or
+      once one side is ahead in material by MATERIAL_WIN for as long;
+    * as a draw once both engines have scored the game within DRAW_SCORE of level for DRAW_PLIES plies in a row,
+      after DRAW_START plies, or when it reaches MAX_PLIES.
+
+The result is the score of the first engine against the second, the Elo difference it implies with a 95%
+confidence interval, and the speed of each engine in nodes per second. With a fixed movetime for both, that
+tells whether a change made the engine better per unit of time, not just faster.
+https://www.chessprogramming.org/Match_Statistics
+
+Usage:
+    python match.py --engine name=depth4,depth=4 --engine name=depth3,depth=3 --games 20
+    python match.py --engine name=mailbox,movetime=0.1 --engine name=bitboard,backend=bitboard,movetime=0.1 \\
+        --openings openings.fen --workers 4 --pgn games.pgn
+"""
+
+import argparse
+import math
+import multiprocessing
+import sys
+
+from core import BISHOP, BLACK_PIECE, EMPTY, KING, KNIGHT, MAILBOX64, OFFBOARD, WHITE, square_col, square_row
+from evaluate import BACKENDS, MATE_THRESHOLD, PIECE_VALUES
+from pgn import game_to_pgn
+from search import Searcher
+
+# Positions a few moves into common openings, used when no openings file is given.
+OPENINGS = (
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2",
+    "rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3",
+    "rnbqkbnr/pppp1ppp/4p3/8/3PP3/8/PPP2PPP/RNBQKBNR b KQkq - 0 2",
+    "rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3",
+    "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+)
+
+# Games that reach this many plies are drawn.
+MAX_PLIES = 400
+
+# Win adjudication: both engines' scores, or the material, must favour the same side by this much, in centipawns,
+# for this many plies in a row.
+WIN_SCORE = 1000
+MATERIAL_WIN = 900
+WIN_PLIES = 8
+
+# Draw adjudication: both engines' scores within this many centipawns of level for this many plies in a row,
+# once the game is this many plies long.
+DRAW_SCORE = 10
+DRAW_PLIES = 20
+DRAW_START = 80
+
+# The z score of a 95% confidence interval.
+Z_95 = 1.959964
+
+
+class EngineConfig:
+    """
+    The settings of one side of a match.
+
+    Attributes:
+        name (str): The name the engine is reported under.
+        backend (str): The name of the board backend it searches with, a key of evaluate.BACKENDS.
+        depth (int): The depth to search each move to, or None.
+        movetime (float): The time to search each move for, in seconds, or None.
+        nodes (int): The number of nodes to search each move, or None.
+        hash_mb (float): The transposition table size in megabytes.
+    """
+
+    def __init__(self, name: str, backend: str = "mailbox", depth: int = None, movetime: float = None,
+                 nodes: int = None, hash_mb: float = 16):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}")
+        self.name = name
+        self.backend = backend
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.hash_mb = hash_mb
+        if depth is None and movetime is None and nodes is None:
+            self.depth = 4
+
+    @classmethod
+    def parse(cls, text: str):
+        """
+        Reads a setting from comma separated key=value pairs, such as "name=new,backend=bitboard,movetime=0.1".
+
+        Raises:
+            ValueError: If a key is unknown or a value isn't a number where one is needed.
+        """
+        fields = dict(item.split("=", 1) for item in text.split(",") if "=" in item)
+        kinds = {"name": str, "backend": str, "depth": int, "movetime": float, "nodes": int, "hash": float}
+        unknown = set(fields) - set(kinds)
+        if unknown:
+            raise ValueError(f"Unknown engine settings: {', '.join(sorted(unknown))}")
+        values = {key: kinds[key](value) for key, value in fields.items()}
+        if "hash" in values:
+            values["hash_mb"] = values.pop("hash")
+        return cls(values.pop("name", text), **values)
+
+    def __repr__(self) -> str:
+        limits = ", ".join(f"{name} {value}" for name, value in (("depth", self.depth), ("movetime", self.movetime),
+                                                                   ("nodes", self.nodes)) if value is not None)
+        return f"{self.name} ({self.backend}, {limits})"
+
+
+def repetitions(board) -> int:
+    """Returns how many times the position occurred before, since the last capture or pawn move."""
+    history = board.history
+    oldest = max(len(history) - board.halfmove_clock, 0)
+    return sum(1 for i in range(len(history) - 2, oldest - 1, -2) if history[i][8] == board.key)
+
+
+def material(board) -> tuple:
+    """
+    Returns the material of a position.
+
+    Returns:
+        (tuple): (white's material less black's in centipawns, sorted list of the piece kinds other than kings).
+    """
+    balance = 0
+    kinds = []
+    for code in board.mailbox:
+        if code == EMPTY or code == OFFBOARD or code & 7 == KING:
+            continue
+        balance += - PIECE_VALUES[code & 7] if code & BLACK_PIECE else PIECE_VALUES[code & 7]
+        kinds.append(code & 7)
+    return balance, sorted(kinds)
+
+
+def is_insufficient_material(board) -> bool:
+    """
+    Returns True if neither side can mate: bare kings, a single knight left, or only bishops, all on squares of
+    one colour.
+    """
+    kinds = material(board)[1]
+    if not kinds or kinds == [KNIGHT]:
+        return True
+    if any(kind != BISHOP for kind in kinds):
+        return False
+    mailbox = board.mailbox
+    colours = {(square_row(index) + square_col(index)) & 1 for index in MAILBOX64 if mailbox[index] & 7 == BISHOP}
+    return len(colours) == 1
+
+
+# The searchers of a worker process, one per engine name, kept between games.
+_searchers = {}
+
+
+def play_game(white: EngineConfig, black: EngineConfig, fen: str) -> dict:
+    """
+    Plays one game between two engines.
+
+    Args:
+        white (EngineConfig): The engine playing white.
+        black (EngineConfig): The engine playing black.
+        fen (str): The starting position.
+
+    Returns:
+        (dict): The "result" ("1-0", "0-1" or "1/2-1/2"), the "reason" it ended, the number of "plies", the
+            "nodes" and "seconds" each side searched for (white first), and the game as "pgn".
+    """
+    engines = (white, black)
+    # Each side searches on a board of its own backend; both are played forward with every move
+    boards = [BACKENDS[engine.backend](fen) for engine in engines]
+    searchers = []
+    for engine in engines:
+        searcher = _searchers.get(engine.name)
+        if searcher is None:
+            searcher = _searchers[engine.name] = Searcher(engine.hash_mb)
+        # Each game starts with an empty table, so games don't depend on the ones before them
+        searcher.table.clear()
+        searchers.append(searcher)
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    scores = []
+    win_plies = material_plies = draw_plies = 0
+    result = reason = None
+
+    while result is None:
+        board = boards[0]
+        if not any(True for _ in board.iter_moves()):
+            if board.in_check():
+                result, reason = ("0-1" if board.turn == WHITE else "1-0"), "checkmate"
+            else:
+                result, reason = "1/2-1/2", "stalemate"
+            break
+        if board.halfmove_clock >= 100:
+            result, reason = "1/2-1/2", "fifty move rule"
+            break
+        if repetitions(board) >= 2:
+            result, reason = "1/2-1/2", "threefold repetition"
+            break
+        if is_insufficient_material(board):
+            result, reason = "1/2-1/2", "insufficient material"
+            break
+        if len(board.history) >= MAX_PLIES:
+            result, reason = "1/2-1/2", "adjudication: game too long"
+            break
+
+        side = 0 if board.turn == WHITE else 1
+        engine = engines[side]
+        found = searchers[side].search(boards[side], engine.depth, engine.movetime, engine.nodes)
+        nodes[side] += found.nodes
+        seconds[side] += found.seconds
+        packed = boards[side].encode_move(found.move)
+        for other in boards:
+            other.push_packed(packed)
+
+        # Scores from white's point of view; mate scores count as winning scores
+        scores.append(found.score if side == 0 else - found.score)
+        last = scores[-2:]
+        if len(last) == 2 and (min(last) >= WIN_SCORE or max(last) <= - WIN_SCORE):
+            win_plies += 1
+        else:
+            win_plies = 0
+        balance = material(boards[0])[0]
+        material_plies = material_plies + 1 if abs(balance) >= MATERIAL_WIN else 0
+        if len(last) == 2 and max(abs(score) for score in last) <= DRAW_SCORE and len(scores) >= DRAW_START:
+            draw_plies += 1
+        else:
+            draw_plies = 0
+
+        if win_plies >= WIN_PLIES:
+            winning = scores[-1] > 0
+            reason = "adjudication: mate found" if abs(scores[-1]) >= MATE_THRESHOLD else "adjudication: score"
+            result = "1-0" if winning else "0-1"
+        elif material_plies >= WIN_PLIES:
+            result, reason = ("1-0" if balance > 0 else "0-1"), "adjudication: material"
+        elif draw_plies >= DRAW_PLIES:
+            result, reason = "1/2-1/2", "adjudication: draw score"
+
+    headers = {"Event": "Self-play match", "White": white.name, "Black": black.name, "Termination": reason}
+    return {
+        "result": result,
+        "reason": reason,
+        "plies": len(boards[0].history),
+        "nodes": nodes,
+        "seconds": seconds,
+        "pgn": game_to_pgn(boards[0], headers, result),
+    }
+
+
+def _play(job: tuple) -> dict:
+    """Plays a game in a worker: job is (game number, FEN, first engine, second engine, first plays white)."""
+    number, fen, first, second, first_white = job
+    game = play_game(first, second, fen) if first_white else play_game(second, first, fen)
+    game.update(number=number, first_white=first_white)
+    return game
+
+
+def elo_difference(wins: int, draws: int, losses: int) -> tuple:
+    """
+    Works out the Elo difference a match score implies, with the bounds of its 95% confidence interval. The
+    interval isn't symmetric in Elo, and a bound past a score of 0 or 1 is infinite, so the bounds are given
+    separately; the other bound is still finite.
+
+    Args:
+        wins (int): The first engine's wins.
+        draws (int): The draws.
+        losses (int): The first engine's losses.
+
+    Returns:
+        (tuple): (Elo difference, lower bound, upper bound).
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, - math.inf, math.inf
+    score = (wins + draws / 2) / games
+
+    def elo(fraction):
+        if fraction <= 0:
+            return - math.inf
+        if fraction >= 1:
+            return math.inf
+        return 400 * math.log10(fraction / (1 - fraction))
+
+    if score >= 1:
+        # With every point won there is no spread to measure, so the lower bound is the score at which winning
+        # every game has a 2.5% chance
+        return math.inf, elo(0.025 ** (1 / games)), math.inf
+    if score <= 0:
+        return - math.inf, - math.inf, elo(1 - 0.025 ** (1 / games))
+    # The spread of a single game's score about the mean, over wins, draws and losses
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    error = math.sqrt(variance / games)
+    return elo(score), elo(score - Z_95 * error), elo(score + Z_95 * error)
+
+
+def run_match(first: EngineConfig, second: EngineConfig, openings=OPENINGS, games: int = None,
+              workers: int = None, on_game=None) -> dict:
+    """
+    Plays a match between two engines, each opening twice with the colours swapped.
+
+    Args:
+        first (EngineConfig): The first engine, whose score is reported.
+        second (EngineConfig): The second engine.
+        openings: The starting FENs (default: OPENINGS).
+        games (int): The number of games, going round the openings in pairs (default: None, two per opening).
+        workers (int): The number of worker processes (default: None, one per core).
+        on_game (callable): Called with each game's dict as it finishes (default: None).
+
+    Returns:
+        (dict): The first engine's "wins", "draws" and "losses", the "elo" difference with the "elo_low" and
+            "elo_high" bounds of its 95% confidence interval, and the "nps" of each engine, keyed by name.
+    """
+    openings = list(openings)
+    games = 2 * len(openings) if games is None else games
+    jobs = [(number, openings[number // 2 % len(openings)], first, second, number % 2 == 0)
+            for number in range(games)]
+    wins = draws = losses = 0
+    nodes = {first.name: 0, second.name: 0}
+    seconds = {first.name: 0.0, second.name: 0.0}
+    with multiprocessing.Pool(workers) as pool:
+        for game in pool.imap_unordered(_play, jobs):
+            white, black = (first, second) if game["first_white"] else (second, first)
+            for engine, side in ((white, 0), (black, 1)):
+                nodes[engine.name] += game["nodes"][side]
+                seconds[engine.name] += game["seconds"][side]
+            if game["result"] == "1/2-1/2":
+                draws += 1
+            elif (game["result"] == "1-0") == game["first_white"]:
+                wins += 1
+            else:
+                losses += 1
+            if on_game is not None:
+                on_game(game)
+    elo, elo_low, elo_high = elo_difference(wins, draws, losses)
+    return {
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "elo": elo,
+        "elo_low": elo_low,
+        "elo_high": elo_high,
+        "nps": {name: int(nodes[name] / seconds[name]) if seconds[name] > 0 else 0 for name in nodes},
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Play a self-play match between two engine settings.")
+    parser.add_argument("--engine", action="append", required=True, type=EngineConfig.parse,
+                        help="an engine setting as key=value pairs (name, backend, depth, movetime, nodes, hash); "
+                             "given twice, the first is the one scored")
+    parser.add_argument("--openings", help="a file of opening FENs, one per line (default: a built in set)")
+    parser.add_argument("--games", type=int, help="the number of games (default: two per opening)")
+    parser.add_argument("--workers", type=int, help="the number of worker processes (default: one per core)")
+    parser.add_argument("--pgn", help="a PGN file to write the games to")
+    args = parser.parse_args(argv)
+    if len(args.engine) != 2:
+        parser.error("--engine must be given twice")
+    first, second = args.engine
+    if first.name == second.name:
+        parser.error("the engines need different names")
+
+    openings = OPENINGS
+    if args.openings:
+        with open(args.openings) as file:
+            openings = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+    total = args.games or 2 * len(openings)
+    print(f"{first!r} vs {second!r}, {total} games", file=sys.stderr)
+    pgn = open(args.pgn, "w") if args.pgn else None
+    finished = 0
+
+    def on_game(game):
+        nonlocal finished
+        finished += 1
+        white, black = (first, second) if game["first_white"] else (second, first)
+        print(f"Game {finished}/{total}: {white.name} vs {black.name} {game['result']} ({game['reason']}, "
+              f"{game['plies']} plies)", file=sys.stderr)
+        if pgn is not None:
+            pgn.write(game["pgn"])
+
+    try:
+        result = run_match(first, second, openings, args.games, args.workers, on_game)
+    finally:
+        if pgn is not None:
+            pgn.close()
+    games = result["wins"] + result["draws"] + result["losses"]
+    score = (result["wins"] + result["draws"] / 2) / games if games else 0.0
+    print(f"Score of {first.name} vs {second.name}: {result['wins']} - {result['losses']} - {result['draws']} "
+          f"[{score:.3f}] {games}")
+    print(f"Elo difference: {result['elo']:.1f} (95% confidence: {result['elo_low']:.1f} to "
+          f"{result['elo_high']:.1f})")
+    for name, nps in result["nps"].items():
+        print(f"{name}: {nps} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
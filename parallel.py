@@ -0,0 +1,203 @@
+"""
+Searching on several cores at once, with Lazy SMP.
+
+Python threads can't search in parallel because of the GIL, so the helpers are processes. Every process searches
+the same root position with its own Searcher, and they share one transposition table in shared memory
+(transposition.SharedTranspositionTable). There is no other communication: the helpers fill the table with
+results that the main search then finds, and since the processes reach positions at different times they
+wander into different parts of the tree. Half of the helpers start their iterative deepening one depth ahead,
+so they are further apart still.
+https://www.chessprogramming.org/Lazy_SMP
+
+The main search runs in the calling process, so info callbacks and stop() work as with Searcher. When it
+finishes, the helpers are stopped, their node counts are added to the result, and a helper's move is played
+instead if it finished a deeper depth.
+
+Usage:
+    python parallel.py --workers 4 --depth 6
+"""
+
+import argparse
+import multiprocessing
+import pickle
+import time
+
+from core import FEN, Board, Move
+from evaluate import BACKENDS
+from search import SearchResult, Searcher, SearchStopped
+from tablebase import Tablebase
+from transposition import SharedTranspositionTable
+
+
+class HelperSearcher(Searcher):
+    """
+    A Searcher for a helper process, which also stops when the main process sets a shared event.
+
+    Attributes:
+        stop_event (multiprocessing.Event): Set by the main process when the helpers should stop.
+        skip (int): How many depths ahead of the main search to start iterative deepening.
+    """
+
+    def __init__(self, table: SharedTranspositionTable, stop_event, skip: int = 0, tablebase: Tablebase = None):
+        super().__init__(table=table, tablebase=tablebase)
+        self.stop_event = stop_event
+        self.skip = skip
+
+    def _check_limits(self) -> None:
+        if self.stop_event.is_set():
+            raise SearchStopped
+        super()._check_limits()
+
+    def negamax(self, board: Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+        # Iterative deepening calls negamax at ply 0 once per depth, so skipping is done here
+        return super().negamax(board, depth + self.skip if ply == 0 else depth, alpha, beta, ply)
+
+
+def _helper(table_name: str, size_mb: float, skip: int, syzygy_path: str, jobs, results, stop_event) -> None:
+    """
+    The loop of a helper process: searches each pickled (board, UCI strings of the moves to leave out at the root)
+    it is sent until stop_event is set, then sends back (depth, score, pv as UCI strings, nodes). Each helper maps
+    the tablebase files itself; the pages are shared through the page cache.
+    """
+    table = SharedTranspositionTable(size_mb, table_name)
+    tablebase = Tablebase(syzygy_path) if syzygy_path else None
+    searcher = HelperSearcher(table, stop_event, skip, tablebase)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            board, exclude = pickle.loads(job)
+            result = searcher.search(board, exclude=[Move.from_uci(board, text) for text in exclude])
+            # The result counts depths of iterative deepening, which skipping put ahead of the real depth
+            results.put((result.depth + skip if result.depth else 0, result.score,
+                         [move.uci() for move in result.pv], result.nodes))
+    finally:
+        table.close()
+        if tablebase is not None:
+            tablebase.close()
+
+
+class ParallelSearcher:
+    """
+    A Lazy SMP search over several processes, used like a Searcher. The helper processes are started once and
+    kept for every search until close() is called.
+
+    Attributes:
+        workers (int): The number of processes searching, including the calling one.
+        table (SharedTranspositionTable): The shared transposition table.
+        searcher (Searcher): The main search, run in the calling process.
+    """
+
+    def __init__(self, workers: int = 2, hash_mb: float = 16, syzygy_path: str = None):
+        """
+        Initialises the ParallelSearcher class.
+
+        Args:
+            workers (int): The number of processes to search with, including the calling one (default: 2).
+            hash_mb (float): The size of the shared transposition table in megabytes (default: 16).
+            syzygy_path (str): The directory of the Syzygy tablebases to probe, if any (default: None).
+        """
+        self.workers = max(1, workers)
+        self.table = SharedTranspositionTable(hash_mb)
+        self.searcher = Searcher(table=self.table, tablebase=Tablebase(syzygy_path) if syzygy_path else None)
+        self._stop_event = multiprocessing.Event()
+        self._results = multiprocessing.Queue()
+        self._jobs = []
+        self._processes = []
+        for i in range(self.workers - 1):
+            jobs = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_helper,
+                args=(self.table.name, hash_mb, i % 2, syzygy_path, jobs, self._results, self._stop_event),
+                daemon=True)
+            process.start()
+            self._jobs.append(jobs)
+            self._processes.append(process)
+
+    def stop(self) -> None:
+        """Stops the current search; it returns the best move of the last finished depth."""
+        self.searcher.stop()
+
+    def search(self, board: Board, depth: int = None, movetime: float = None, nodes: int = None,
+               info=None, exclude: list = None) -> SearchResult:
+        """
+        Searches a position on every worker, with the same arguments as Searcher.search(). The node limit only
+        applies to the main search, and the nodes of the result are those of all the processes.
+
+        Returns:
+            (SearchResult): The result of the main search, or of a helper if it finished a deeper depth.
+        """
+        start = time.perf_counter()
+        self._stop_event.clear()
+        # Queues pickle in a background thread, which could catch the board in the middle of the main search, so
+        # it is pickled here first. The helpers leave out the same root moves, so none of them can return one
+        job = pickle.dumps((board, [move.uci() for move in exclude or ()]))
+        for jobs in self._jobs:
+            jobs.put(job)
+        result = self.searcher.search(board, depth, movetime, nodes, info, exclude)
+        self._stop_event.set()
+
+        for _ in self._jobs:
+            helper_depth, score, pv, helper_nodes = self._results.get()
+            result.nodes += helper_nodes
+            if helper_depth > result.depth and pv:
+                result.depth, result.score = helper_depth, score
+                result.pv = self._pv_moves(board, pv)
+                result.move = result.pv[0]
+        result.seconds = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _pv_moves(board: Board, pv: list) -> list:
+        """Turns a principal variation of UCI strings back into Moves on the board, each in its position."""
+        moves = []
+        for text in pv:
+            move = Move.from_uci(board, text)
+            moves.append(move)
+            board.push(move)
+        for _ in moves:
+            board.pop()
+        return moves
+
+    def close(self) -> None:
+        """Stops the helper processes and frees the shared table."""
+        self._stop_event.set()
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join()
+        self.table.close(unlink=True)
+        if self.searcher.tablebase is not None:
+            self.searcher.tablebase.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Search a position for the best move on several cores.")
+    parser.add_argument("--workers", "--threads", type=int, default=multiprocessing.cpu_count(),
+                        help="the number of processes to search with (default: the number of cores)")
+    parser.add_argument("--fen", default=FEN, help="the position to search (default: the start position)")
+    parser.add_argument("--depth", type=int, help="the depth to search to, in plies")
+    parser.add_argument("--movetime", type=float, help="the time to search for, in seconds")
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox", help="the board representation to use")
+    parser.add_argument("--hash", type=float, default=16, help="the transposition table size in MB (default: 16)")
+    parser.add_argument("--syzygy", help="the directory of the Syzygy tablebases to probe")
+    args = parser.parse_args(argv)
+
+    if args.depth is None and args.movetime is None:
+        args.depth = 4
+    board = BACKENDS[args.backend](args.fen)
+    with ParallelSearcher(args.workers, args.hash, args.syzygy) as searcher:
+        result = searcher.search(board, args.depth, args.movetime, info=lambda result: print(result.info()))
+    print(f"info nodes {result.nodes} nps {result.nps} time {int(result.seconds * 1000)}")
+    print("bestmove", result.move.uci() if result.move is not None else "0000")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Perft: counting the leaf nodes of the move generation tree to a fixed depth.
+
+The counts for well known positions are published, so perft is the standard check that move generation is
+correct, and the time it takes is a measure of how fast it is.
+https://www.chessprogramming.org/Perft
+
+Usage:
+    python perft.py 4
+    python perft.py 3 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1" --divide
+"""
+
+import argparse
+import time
+
+from bitboard import BitBoard
+from core import FEN, Board, move_buffer
+
+# The board classes that can be chosen with --backend.
+BACKENDS = {"mailbox": Board, "bitboard": BitBoard}
+
+
+def perft(board: Board, depth: int) -> int:
+    """
+    Counts the leaf nodes of the legal move tree from the board's position to a given depth. The board is
+    walked with push/pop, and is left as it was. Moves are generated as packed ints into one buffer per ply,
+    reused for every node at that ply.
+
+    Args:
+        board (Board): The position to count from.
+        depth (int): The number of plies to look ahead.
+
+    Returns:
+        (int): The number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+    return _perft(board, depth, [move_buffer() for _ in range(depth)])
+
+
+def _perft(board: Board, depth: int, buffers: list) -> int:
+    """Counts leaf nodes for perft(), generating the moves of each depth into buffers[depth - 1]."""
+    buffer = buffers[depth - 1]
+    count = board.generate_packed(buffer)
+    if depth == 1:
+        # Bulk counting, the last ply doesn't need to be made
+        return count
+    nodes = 0
+    for i in range(count):
+        board.push_packed(buffer[i])
+        nodes += _perft(board, depth - 1, buffers)
+        board.pop()
+    return nodes
+
+
+def divide(board: Board, depth: int) -> dict:
+    """
+    Runs perft for each legal move, which narrows down where two move generators disagree.
+
+    Args:
+        board (Board): The position to count from.
+        depth (int): The number of plies to look ahead, including the first move.
+
+    Returns:
+        (dict): The leaf node count below each move, keyed by the move in UCI notation.
+
+    Raises:
+        ValueError: If the depth is less than 1, so there is no first move to divide by.
+    """
+    if depth < 1:
+        raise ValueError(f"Divide needs a depth of at least 1, not {depth}")
+    counts = {}
+    for move in list(board.iter_moves()):
+        board.push(move)
+        counts[move.uci()] = perft(board, depth - 1)
+        board.pop()
+    return counts
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Count move generation tree leaf nodes.")
+    parser.add_argument("depth", type=int, help="the number of plies to search")
+    parser.add_argument("--fen", default=FEN, help="the position to search from (default: the start position)")
+    parser.add_argument("--divide", action="store_true", help="print the count below each move")
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox", help="the board representation to use")
+    args = parser.parse_args(argv)
+
+    board = BACKENDS[args.backend](args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(board, args.depth)
+        for move, count in sorted(counts.items()):
+            print(f"{move}: {count}")
+        nodes = sum(counts.values())
+        print()
+    else:
+        nodes = perft(board, args.depth)
+    seconds = time.perf_counter() - start
+
+    print(f"Nodes: {nodes}")
+    print(f"Time: {seconds:.3f}s ({nodes / max(seconds, 1e-9):.0f} nodes/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Reading and writing games in PGN, with moves in Standard Algebraic Notation (SAN).
+
+Games are read lazily, one at a time, so memory use stays constant however large the file is: read_games() is a
+generator over the lines of the file, which can also be memory mapped. Reading a game only splits out its tags
+and SAN moves; resolving each SAN move to a Move needs the legal moves of its position, so it is left to
+Game.replay(), for the games that need it.
+https://www.chessprogramming.org/Portable_Game_Notation
+
+Usage:
+    python pgn.py games.pgn
+    python pgn.py games.pgn --replay --mmap
+"""
+
+import argparse
+import mmap
+import re
+import sys
+import time
+
+from core import (EMPTY, FEN, KING, PAWN, PIECE_CHARS, PIECE_CODES, WHITE, Board, Move, parse_square,
+                  square_col, square_name, square_row)
+
+# A tag pair, such as [Event "Casual game"].
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# A backslash escaped character of a tag value, a quote or a backslash.
+TAG_ESCAPE = re.compile(r"\\(.)")
+
+# The tokens of movetext: comments, variations, NAGs, move numbers, results and SAN moves.
+TOKEN_PATTERN = re.compile(r"\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+")
+
+# A SAN move other than castling: piece, from column, from row, capture, to square, promotion.
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# The tags every PGN game has, in the order they are written.
+SEVEN_TAG_ROSTER = (("Event", "?"), ("Site", "?"), ("Date", "????.??.??"), ("Round", "?"), ("White", "?"),
+                    ("Black", "?"), ("Result", "*"))
+
+# Movetext lines are wrapped at this length.
+LINE_LENGTH = 80
+
+
+def move_to_san(board: Board, move: Move) -> str:
+    """
+    Writes a legal move in SAN, such as "Nbd7", "exd5", "e8=Q+" or "O-O".
+
+    Args:
+        board (Board): The position the move is played in. The move is made to see if it checks, then taken back.
+        move (Move): The move.
+
+    Returns:
+        (str): The move in SAN.
+    """
+    mailbox = board.mailbox
+    code = mailbox[move.from_index]
+    kind = code & 7
+    if kind == KING and abs(move.to_index - move.from_index) == 2:
+        san = "O-O" if square_col(move.to_index) == 6 else "O-O-O"
+    elif kind == PAWN:
+        san = square_name(move.to_index)
+        if square_col(move.from_index) != square_col(move.to_index):
+            san = "abcdefgh"[square_col(move.from_index)] + "x" + san
+        if move.promotion is not None:
+            san += "=" + move.promotion.upper()
+    else:
+        # Another piece of the same kind that can reach the same square needs the moving piece told apart, by
+        # column if that's enough, otherwise by row, otherwise by both
+        rivals = [other.from_index for other in board.iter_moves()
+                  if mailbox[other.from_index] == code and other.to_index == move.to_index
+                  and other.from_index != move.from_index]
+        disambiguation = ""
+        if rivals:
+            if all(square_col(index) != square_col(move.from_index) for index in rivals):
+                disambiguation = "abcdefgh"[square_col(move.from_index)]
+            elif all(square_row(index) != square_row(move.from_index) for index in rivals):
+                disambiguation = str(8 - square_row(move.from_index))
+            else:
+                disambiguation = square_name(move.from_index)
+        capture = "x" if mailbox[move.to_index] != EMPTY else ""
+        san = PIECE_CHARS[kind] + disambiguation + capture + square_name(move.to_index)
+
+    board.push(move)
+    if board.in_check():
+        san += "+" if any(True for _ in board.iter_moves()) else "#"
+    board.pop()
+    return san
+
+
+def parse_san(board: Board, san: str) -> Move:
+    """
+    Finds the legal move a SAN string describes. Check marks and annotations like "!?" are ignored.
+
+    Args:
+        board (Board): The position the move is played in.
+        san (str): The move in SAN.
+
+    Returns:
+        (Move): The move.
+
+    Raises:
+        ValueError: If the SAN is malformed, or describes no legal move or more than one.
+    """
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        col = 6 if len(text) == 3 else 2
+        matches = [move for move in board.iter_moves()
+                   if board.mailbox[move.from_index] & 7 == KING and abs(move.to_index - move.from_index) == 2
+                   and square_col(move.to_index) == col]
+    else:
+        match = SAN_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"Bad SAN move: {san!r}")
+        piece, from_col, from_row, to_square, promotion = match.groups()
+        kind = PAWN if piece is None else PIECE_CODES[piece]
+        to_index = parse_square(to_square)
+        # Only the few pseudo-legal moves that fit are checked for legality, by making them, which is much
+        # quicker than generating every legal move
+        matches = []
+        colour = board.turn
+        for move in board.iter_pseudo_legal_moves():
+            if (move.to_index != to_index or board.mailbox[move.from_index] & 7 != kind
+                    or (from_col is not None and "abcdefgh"[square_col(move.from_index)] != from_col)
+                    or (from_row is not None and str(8 - square_row(move.from_index)) != from_row)
+                    or (None if move.promotion is None else move.promotion.upper()) != promotion):
+                continue
+            board.push(move)
+            if not board.is_square_attacked(board.king_square(colour), - colour):
+                matches.append(move)
+            board.pop()
+    if len(matches) != 1:
+        raise ValueError(f"{'Ambiguous' if matches else 'Illegal'} SAN move {san!r} in {board.generate_fen()}")
+    return matches[0]
+
+
+class Game:
+    """
+    A game read from PGN.
+
+    Attributes:
+        headers (dict): The tag pairs, such as {"White": "Carlsen, Magnus"}.
+        moves (list): The main line of the game as SAN strings; comments and variations are dropped.
+        result (str): The game termination marker, "1-0", "0-1", "1/2-1/2" or "*".
+    """
+
+    def __init__(self, headers: dict = None, moves: list = None, result: str = "*"):
+        self.headers = {} if headers is None else headers
+        self.moves = [] if moves is None else moves
+        self.result = result
+
+    def board(self, board_class=Board) -> Board:
+        """Returns a board set up at the start of the game, from the FEN tag if there is one."""
+        return board_class(self.headers.get("FEN", FEN))
+
+    def replay(self, board: Board = None):
+        """
+        Plays the moves of the game, resolving each SAN move against the legal moves of its position.
+
+        Args:
+            board (Board): The board to play on, set up at the start of the game (default: None, a new Board).
+
+        Yields:
+            (Move): Each move, after it has been made on the board.
+
+        Raises:
+            ValueError: If a move is illegal or ambiguous.
+        """
+        board = self.board() if board is None else board
+        for san in self.moves:
+            move = parse_san(board, san)
+            board.push(move)
+            yield move
+
+
+def parse_movetext(text: str) -> tuple:
+    """
+    Splits movetext into the SAN moves of its main line and its result.
+
+    Args:
+        text (str): The movetext.
+
+    Returns:
+        (tuple): (list of SAN moves, result or None).
+    """
+    moves = []
+    result = None
+    depth = 0
+    for token in TOKEN_PATTERN.findall(text):
+        first = token[0]
+        if first == "(":
+            depth += 1
+        elif first == ")":
+            depth -= 1
+        elif depth or first in "{;$" or token[-1] == ".":
+            # Variations, comments, NAGs and move numbers
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return moves, result
+
+
+def iter_games(lines):
+    """
+    Reads PGN games lazily from lines of text.
+
+    Args:
+        lines: An iterable of lines, such as an open file.
+
+    Yields:
+        (Game): Each game, as soon as its movetext ends.
+    """
+    headers = {}
+    movetext = []
+    for line in lines:
+        if line.startswith("["):
+            if movetext:
+                # A tag after movetext starts the next game
+                moves, result = parse_movetext("".join(movetext))
+                yield Game(headers, moves, result or headers.get("Result", "*"))
+                headers, movetext = {}, []
+            match = TAG_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = TAG_ESCAPE.sub(r"\1", match.group(2))
+        elif line.startswith("%"):
+            # An escaped line, ignored
+            continue
+        elif line.strip():
+            movetext.append(line)
+    if headers or movetext:
+        moves, result = parse_movetext("".join(movetext))
+        yield Game(headers, moves, result or headers.get("Result", "*"))
+
+
+def read_games(path: str, use_mmap: bool = False):
+    """
+    Reads the PGN games of a file lazily.
+
+    Args:
+        path (str): The PGN file.
+        use_mmap (bool): Memory map the file rather than reading it through a file buffer (default: False).
+
+    Yields:
+        (Game): Each game of the file in turn.
+    """
+    with open(path, "rb") as file:
+        # An empty file can't be mapped, and has no games to read anyway
+        if use_mmap and file.seek(0, 2):
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from iter_games(line.decode("utf-8", "replace") for line in iter(mapped.readline, b""))
+        else:
+            yield from iter_games(line.decode("utf-8", "replace") for line in file)
+
+
+def escape_tag(value) -> str:
+    """Escapes the backslashes and quotes of a tag value, so it can be written between quotes."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def game_to_pgn(board: Board, headers: dict = None, result: str = None) -> str:
+    """
+    Writes the game played on a board, the moves of its history, as PGN. The board is taken back to the start
+    of the game to write the moves in SAN, then played forward again, so it is left as it was.
+
+    Args:
+        board (Board): The board the game was played on.
+        headers (dict): Tag pairs to write; the Seven Tag Roster is filled in with "?" where missing
+            (default: None).
+        result (str): The result; taken from the headers if not given, otherwise "*" (default: None).
+
+    Returns:
+        (str): The game in PGN, ending with a blank line.
+    """
+    headers = {} if headers is None else dict(headers)
+    result = result or headers.get("Result", "*")
+    headers["Result"] = result
+
+    # Moves made with Board.push_packed() are recorded as packed ints, decoded as they are played again below
+    moves = [record[0] for record in board.history]
+    for _ in moves:
+        board.pop()
+    start_fen = board.generate_fen()
+    if start_fen != FEN:
+        headers.setdefault("SetUp", "1")
+        headers.setdefault("FEN", start_fen)
+
+    tokens = []
+    for i, move in enumerate(moves):
+        if board.turn == WHITE:
+            tokens.append(f"{board.fullmove_number}.")
+        elif i == 0:
+            tokens.append(f"{board.fullmove_number}...")
+        if not isinstance(move, Move):
+            move = board.decode_move(move)
+        tokens.append(move_to_san(board, move))
+        board.push(move)
+    tokens.append(result)
+
+    lines = [f'[{name} "{escape_tag(headers.get(name, default))}"]' for name, default in SEVEN_TAG_ROSTER]
+    lines += [f'[{name} "{escape_tag(value)}"]' for name, value in headers.items()
+              if name not in dict(SEVEN_TAG_ROSTER)]
+    lines.append("")
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Read the games of a PGN file, reporting how fast.")
+    parser.add_argument("file", help="the PGN file")
+    parser.add_argument("--replay", action="store_true", help="also resolve every SAN move on a board")
+    parser.add_argument("--mmap", action="store_true", help="memory map the file")
+    args = parser.parse_args(argv)
+
+    games = 0
+    plies = 0
+    start = time.perf_counter()
+    for game in read_games(args.file, args.mmap):
+        games += 1
+        plies += sum(1 for _ in game.replay()) if args.replay else len(game.moves)
+    seconds = time.perf_counter() - start
+    print(f"Read {games} games ({plies} plies) in {seconds:.3f}s ({games / max(seconds, 1e-9):.1f} games/s)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,592 +1,408 @@
-"""A simple chess engine using Python."""
-
-import tkinter as tk
-import os
-import pathlib
-
-# Global variables
-FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-BLACK = -1
-WHITE = 1
-
-
-class Piece:
-    """
-    Object for pieces.
-
-    Attributes:
-        colour (int): The colour of the piece, WHITE = 1, BLACK = -1
-        piece_type (str): The piece type character. Uppercase represents white, lowercase black.
-    """
-
-    def __init__(self, colour: int = None, piece_type: str = None):
-        self.colour = colour
-        self.piece_type = piece_type
-
-
-class Square:
-    """
-    An object that represents a square.
-
-    Attributes:
-        col (int): Integer value for the column.
-        row (int): Integer value for the row.
-        canvas (tk.Canvas): Canvas object for this square, used for changing its appearance (default: None).
-        piece (Piece): The piece that occupies this square (default: None).
-        colour (str):
-            String for the square's color, using tkinter internal colour names (default: None).
-            http://www.science.smith.edu/dftwiki/index.php/Color_Charts_for_TKinter
-    """
-
-    def __init__(self, col: int, row: int, canvas: tk.Canvas = None, piece: Piece = None, colour=None):
-        self.col = col
-        self.row = row
-        self.canvas = canvas
-        self.piece = piece
-        self.colour = colour
-        self.EP = False
-
-
-class Move:
-    """
-    A class that represents a move between two Square objects.
-
-    Attributes:
-        square_from (Square): A Square which the Move originates from.
-        square_to (Square): A Square which is the destination of the Move.
-    """
-
-    def __init__(self, square_from, square_to):
-        """Initialises Move class."""
-        self.square_from = board.get_square(square_from.col, square_from.row)
-        self.square_to = board.get_square(square_to.col, square_to.row)
-
-    def is_legal(self) -> bool:
-        """Method to check if a Move object is legal, using the check_legality function and checking
-         what player's turn it is."""
-        if self.square_from.piece is None:
-            return check_legality(self)
-        elif self.square_from.piece.colour == board.turn:
-            return check_legality(self)
-        else:
-            return False
-
-    def make_move(self) -> None:
-        """Method for executing a move with a given Move object on the board, given a legal Move."""
-        if self.is_legal():
-            if self.square_to.row == 0 or self.square_to.row == 7:
-                if self.square_from.piece.piece_type.lower() == "p":
-                    promotion_window(self, self.square_to.piece)
-
-            self.square_to.piece = self.square_from.piece
-            self.square_from.piece = None
-
-            board.generate_moves()  # Re-calculates legal moves after one is made.
-
-            board.check.clear()
-            for _move in board.moves:
-                if _move.square_to.piece is not None:
-                    if _move.square_to.piece.piece_type.lower() == "k":
-                        board.check.append(_move.square_to)
-                        break
-
-            board.turn = - board.turn
-
-            if self.square_to == board.en_passant_square:
-                if self.square_to.piece.piece_type.lower() == "p":
-                    taken = square_offset(self.square_to, 0, + self.square_to.piece.colour)
-                    taken.piece = None
-
-            # This flags the en passant square
-            if self.square_from == square_offset(self.square_to, 0, + self.square_to.piece.colour * 2):
-                if self.square_to.piece.piece_type.lower() == "p":
-                    # If a pawn moves two squares, sets the en passant square to be the one behind it.
-                    board.en_passant_square = square_offset(self.square_to, 0, + self.square_to.piece.colour)
-            else:
-                board.en_passant_square = None
-
-            board.generate_moves()  # Re-calculates legal moves after one is made.
-
-
-class Board:
-    """
-    Board class.
-
-    Attributes:
-        squares (list): The list of all 64 squares on the board. Created in Board.initialise_squares().
-        turn (int): Which colour's turn it is; WHITE = 1, BLACK = -1 (default: 1).
-        move_from (Square): The move from square used for user inputting moves (default: None).
-        en_passant_square (Square):
-            A square that can be moved to if an en passant capture is possible (default: None).
-    """
-
-    def __init__(self):
-        """ Initialises the Board class. """
-        self.squares = []
-        self.moves = []
-        self.turn = WHITE
-        self.move_from = None
-        self.en_passant_square = None
-        self.check = []
-
-        # This stores the castling rights as a 4 digit binary number, 15 = default castling, 0 = no castling.
-        # Goes in the FEN castling order, KQkq (white king first, black queen last).
-        self.castling = format(15, "b")
-
-        self.initialise_squares()
-        self.read_fen(FEN)
-        self.draw()
-
-    def generate_moves(self):
-        """Generates a list of all legal moves with the current board position. """
-        self.moves.clear()
-        for square_from in self.squares:
-            for square_to in self.squares:
-                _move = Move(square_from, square_to)
-                if _move.is_legal():
-                    self.moves.append(_move)
-
-        """
-        Commented out for being slow and not working
-        
-        for move in self.moves:
-            move.square_to.piece, move.square_from.piece = move.square_from.piece, move.square_to.piece
-            self.turn = -self.turn
-            for _from in self.squares:
-                for _to in self.squares:
-                    _move = Move(_from, _to)
-                    if _move.is_legal():
-                        if _move.square_to.piece is not None:
-                            if _move.square_to.piece.piece_type.lower() == "k":
-                                try:
-                                    self.moves.remove(move)
-                                except:
-                                    print("error")
-            move.square_to.piece, move.square_from.piece = move.square_from.piece, move.square_to.piece
-            self.turn = -self.turn"""
-
-    def initialise_squares(self) -> None:
-        """ A method for creating the squares of the board, assigning the canvas and colour of the square. """
-        for row in range(8):
-            for col in range(8):
-                _temp_square = Square(col, row)
-                _temp_square.colour = "linen" if (col + row) % 2 == 0 else "PaleVioletRed3"
-                _temp_square.canvas = tk.Canvas(window.board_frame, width=50, height=50, bg=_temp_square.colour)
-                _temp_square.canvas.config(bd=0, highlightthickness=0, relief='ridge')
-
-                # Binds commands to the canvas
-                _temp_square.canvas.bind("<Button-1>", lambda e, s=_temp_square: square_clicked(e, s))
-                _temp_square.canvas.bind("<Button-3>", lambda e: clear_move())
-
-                _temp_square.canvas.grid(row=row, column=col)
-
-                self.squares.append(_temp_square)
-
-    def draw(self) -> None:
-        """
-        A method that draws the board.
-
-        It uses the Board.squares list and draws each of them, iterating through rows and columns and
-        fetching each square. It then assigns the colour of the square, clears the canvas, and then draws
-        a piece if one exists there.
-        """
-        for row in range(8):
-            for col in range(8):
-                # Fetches the correct square object to assign its canvas and to read its piece information for drawing
-                square = self.get_square(col, row)
-
-                # Resets the appearance of the canvas.
-                square.canvas.delete("all")
-                square.canvas.config(bg=square.colour)
-
-                # If a piece exists it fetches its image and draws it on the canvas.
-                if square.piece is not None:
-                    colour = "w" if square.piece.colour == WHITE else "b"
-                    piece = colour + square.piece.piece_type + ".png"
-                    square.canvas.create_image(24, 25, image=images[piece])
-
-                for square in self.check:
-                    square.canvas.config(bg="yellow")
-
-    def get_square(self, col: int, row: int) -> Square:
-        """
-        Returns a specific Square object belonging to Board.squares
-        when given coordinates.
-
-        Args:
-            col (int): The column of the desired square.
-            row (int): The row of the desired square.
-
-        Returns:
-            element (Square): The board's Square object, if it exists.
-            None: if a square with the same coordinates as the argument square doesn't exist.
-        """
-        for element in self.squares:
-            if element.col == col and element.row == row:
-                return element
-
-    def generate_fen(self) -> str:
-        fen = ""
-        column = 0
-        skip = 0
-        for square in self.squares:
-            if square.piece is not None:
-                if skip != 0:
-                    # This should insert the number value of empty squares to the FEN string
-                    fen += str(skip)  # This never triggers?
-                    skip = 0
-                fen += square.piece.piece_type  # Puts the piece character in the string if there's a piece
-            else:
-                skip += 1
-
-            # This bit adds the slashes at the end of each row
-            column += 1
-            if column == 8:
-                if skip != 0:
-                    # This should insert the number value of empty squares to the FEN string
-                    fen += str(skip)  # This never triggers?
-                    skip = 0
-                column = 0
-                fen += "/"
-        else:
-            fen = fen[:-1]
-            fen += " w " if board.turn == WHITE else " b "
-            fen += "w"
-        return fen
-
-    def reset_pieces(self):
-        for square in self.squares:
-            square.piece = None
-
-    def read_fen(self, fen_string: str) -> None:
-        """
-        Reads a string in FEN format, and assigns relevant variables based off of what it reads.
-        https://en.wikipedia.org/wiki/Forsyth%E2%80%93Edwards_Notation
-
-        Args:
-            fen_string (str): A string that should be in FEN format with information on the board's status.
-
-        Todo:
-            * Some function that reads the board's status and creates a FEN string.
-            * Castling rights.
-            * Remaining values at the bottom of this function.
-        """
-        self.reset_pieces()
-
-        col = 0
-        row = 0
-        try:
-            fen = fen_string.split()
-            for char in fen[0]:
-                if (char == "/") or (col >= 9):
-                    # Skips to the next row if the character is a slash
-                    col = 0
-                    row += 1
-                    continue
-                if char.isdigit():
-                    # If the FEN string has a number, skip that many columns over
-                    col += int(char)
-                else:
-                    # This part creates the piece object and assigns it to the correct square
-                    piece_type = char
-                    square = self.get_square(col, row)
-                    col += 1
-                    if char.isupper():
-                        colour = WHITE
-                    else:
-                        colour = BLACK
-                    square.piece = Piece(colour, piece_type)
-
-            if fen[1] == "w":
-                self.turn = WHITE
-            elif fen[1] == "b":
-                self.turn = BLACK
-
-            for char in fen[2]:
-                pass
-
-        except IndexError:
-            print("Error: FEN string cannot be empty.")
-
-
-def square_offset(square: Square, col: int, row: int) -> Square:
-    """A function that returns a square offset by a specified row and column values."""
-    return board.get_square(square.col + col, square.row + row)
-
-
-def check_legality(move: Move) -> bool:
-    """
-    A function that takes in a Move object and returns if it is legal.
-
-    Args:
-        move (Move): A Move object between two squares which is checked to see if it is a valid move.
-
-    Attributes:
-        move.square_from (Square):
-        move.square_to (Square):
-            A Square for a Move.
-
-    Returns:
-        (Bool): True if the move is legal, False otherwise.
-    """
-
-    if move.square_from.piece is None:
-        # If you're trying to move an empty square, it fails
-        return False
-    if move.square_to.piece is not None:
-        if move.square_from.piece.colour == move.square_to.piece.colour:
-            # If you're trying to capture a piece of the same colour, it fails
-            return False
-
-    # If it gets here we know a piece is moving and isn't trying to capture its own piece - do more checks here
-    if move.square_from.piece.piece_type.lower() == "p":
-        # Pawns
-        # Moving forward if the square is empty
-        if move.square_to == square_offset(move.square_from, 0, - move.square_from.piece.colour):
-            if move.square_to.piece is None:
-                return True
-        # Moving two squares if on the 2nd or 7th rank
-        if move.square_to == square_offset(move.square_from, 0, - move.square_from.piece.colour * 2):
-            if move.square_to.piece is None:
-                if move.square_from.row == 6 or move.square_from.row == 1:
-                    return True
-        # Capturing
-        if move.square_to.piece is not None and move.square_to.piece.colour != move.square_from.colour:
-            if move.square_to == square_offset(move.square_from, 1, - move.square_from.piece.colour):
-                return True
-            if move.square_to == square_offset(move.square_from, -1, - move.square_from.piece.colour):
-                return True
-        # Capturing en passant
-        if move.square_to == board.en_passant_square:
-            if move.square_to == square_offset(move.square_from, -1, - move.square_from.piece.colour):
-                return True
-            if move.square_to == square_offset(move.square_from, 1, - move.square_from.piece.colour):
-                return True
-
-    # Movement for sliding pieces
-    # the list here stores the offsets for all 8 directions which sliding pieces can move.
-    sliding_directions = [(1, 1), (-1, 1), (1, -1), (-1, -1), (0, 1), (0, -1), (1, 0), (-1, 0)]
-    if move.square_from.piece.piece_type.lower() == "r":
-        # Rooks
-        for i in range(4, 8):
-            if move.square_to in sliding_move(move.square_from, sliding_directions[i][0], sliding_directions[i][1]):
-                return True
-
-    if move.square_from.piece.piece_type.lower() == "b":
-        # Bishops
-        for i in range(4):
-            if move.square_to in sliding_move(move.square_from, sliding_directions[i][0], sliding_directions[i][1]):
-                return True
-
-    if move.square_from.piece.piece_type.lower() == "q":
-        # Queens
-        for i in range(8):
-            if move.square_to in sliding_move(move.square_from, sliding_directions[i][0], sliding_directions[i][1]):
-                return True
-
-    if move.square_from.piece.piece_type.lower() == "k":
-        # Kings
-        for i in range(8):
-            if move.square_to == square_offset(move.square_from, sliding_directions[i][0], sliding_directions[i][1]):
-                return True
-
-    if move.square_from.piece.piece_type.lower() == "n":
-        # Knights
-        knight_moves = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
-        for m in knight_moves:
-            if move.square_to == square_offset(move.square_from, m[0], m[1]):
-                return True
-
-    return False
-
-
-def sliding_move(square: Square, col_offset: int, row_offset: int, original_square: Square = None) -> list:
-    """
-    A function to calculate a list of squares a sliding piece can move to in a line with a given offset direction,
-    for both straight and diagonal moving pieces.
-
-    Args:
-        square (Square): The original square to check from.
-        col_offset (int): Integer value for the column offset.
-        row_offset (int): Integer value for the row offset.
-        original_square (Square):
-            A temporary variable that is used to store the original square, to
-            see see if a piece on a square we check can be captured (default: None).
-
-    Todo:
-        * This doesn't need to be recursive and may be more readable and faster if refactored.
-    """
-
-    # This is meant to be for capturing
-    if original_square is None:
-        original_square = square
-
-    temp_square = square_offset(square, col_offset, row_offset)
-    if temp_square is None:
-        return [square]
-    if temp_square.piece is not None:
-        if temp_square.piece.colour == original_square.colour:
-            return [square]
-        else:
-            return [square] + [temp_square]
-
-    else:
-        return [temp_square] + sliding_move(temp_square, col_offset, row_offset, original_square)
-
-
-def square_clicked(event: tk.Event, square: Square) -> None:
-    """
-    A function which allows a player to make moves by clicking pieces on the board.
-
-    It checks to see if a piece has already been clicked; if not, it will store the Square
-    in the global move_from variable, highlight the square to visually differentiate it,
-    and highlights possible moves from that square. If a Square has already been stored
-    before this function is triggered again, it will make the move and redraw the board.
-
-    Args:
-        event (tk.Event): The Tkinter event. Not currently used.
-        square (Square): The Square object that has been clicked.
-
-    Todo:
-        * Generate all legal moves elsewhere and fetch them instead of iterating through every square
-            when highlighting legal moves.
-    """
-    square = board.get_square(square.col, square.row)
-
-    if board.move_from is None:
-        square.canvas.config(bg="red")
-        board.move_from = square
-        # ==========================================================================================================
-        for move in board.moves:
-            if move.square_from == board.move_from:
-                move.square_to.canvas.create_oval(20, 20, 30, 30, fill="orange")
-
-    else:
-        if board.move_from == square:
-            board.move_from = None
-            board.draw()
-            return
-        Move(board.move_from, square).make_move()
-        board.move_from = None
-        board.draw()
-
-
-def clear_move() -> None:
-    """ A function to clear the global make_move variable, used in square_clicked(). """
-    board.move_from = None
-    board.draw()
-
-
-def insert_text(textbox: tk.Text, text: str):
-    textbox.delete(1.0, tk.END)
-    textbox.insert(1.0, text)
-
-
-def read_fen(fen: str):
-    board.read_fen(fen)
-    board.draw()
-
-
-class Window:
-    """A static class used for drawing the UI."""
-    def __init__(self):
-        main_frame = tk.Frame(root, width=1200, height=600, bg="white")
-        main_frame.grid(row=0, column=0)
-
-        self.board_frame = tk.Frame(main_frame, height=400, width=400, bd=10, bg="pink")
-        self.board_frame.grid(row=0, column=0)
-
-        right_frame = tk.Frame(root, width=600)
-        right_frame.grid(row=0, column=1, rowspan=2)
-
-        bottom_left_frame = tk.Frame(root, width=420, height=200)
-        bottom_left_frame.grid(row=1, column=0)
-
-        fen_string_entry = tk.Text(bottom_left_frame, width=40, height=2, relief="flat", bd=4)
-        fen_string_entry.insert(1.0, FEN)
-        fen_string_entry.grid(row=0, column=0)
-
-        fen_load_button = tk.Button(bottom_left_frame, command=lambda: read_fen(fen_string_entry.get(1.0, tk.END)))
-        fen_load_button.config(text="Read FEN")
-        fen_load_button.grid(row=0, column=1)
-
-        fen_gen_button = tk.Button(bottom_left_frame,
-                                   command=lambda: insert_text(fen_string_entry,board.generate_fen()))
-        fen_gen_button.config(text="Generate FEN")
-        fen_gen_button.grid(row=0, column=2)
-
-        reset_button = tk.Button(bottom_left_frame, width=10, relief="groove", pady=10, text="Reset",
-                                 command=lambda: self.reset())
-        reset_button.grid(row=1, column=0)
-
-    def reset(self) -> None:
-        """Resets the board to its original state."""
-        board.squares.clear()
-        board.initialise_squares()
-        board.read_fen(FEN)
-        board.draw()
-        board.generate_moves()
-
-
-
-def promotion_window(move: Move, other_piece: Piece) -> None:
-    """ Function that displays pawn promotion options. """
-
-    # Defines a list of pieces to promote to, for which ever colour is promoting.
-    pieces = ["wN", "wB", "wR", "wQ"] if move.square_from.piece.colour == WHITE else ["bn", "bb", "bq", "br"]
-
-    # Creating and setting aspects of the promotion window.
-    w = tk.Toplevel(root)
-    w.title("Promote pawn")
-    w.geometry("264x90")
-
-    """
-    Here, it loops over the pieces in the pieces list. It creates a button with the correct image, and
-    assigns the correct values within the command it triggers on being pressed.
-    Credit to StackOverflow user BretBarn for the explanation on how to do this in a loop:
-    https://stackoverflow.com/questions/10865116/tkinter-creating-buttons-in-for-loop-passing-command-arguments
-    """
-    for i, piece in enumerate(pieces):
-        _temp = tk.Button(w, image=images[piece+".png"], command=lambda x=piece: promote_piece(move, w, x[1]))
-        _temp.grid(row=0, column=i)
-    t = tk.Button(w, text="cancel", command=lambda: cancel_promotion(move, w, other_piece))
-    t.grid(row=1, column=0, columnspan=4)
-
-
-def cancel_promotion(move, w, other_piece) -> None:
-    """Undoes piece promotion and closes the promotion window."""
-    w.destroy()
-    move.square_from.piece = move.square_to.piece  # Swaps pieces
-    move.square_to.piece = other_piece
-
-    board.turn = - board.turn
-    board.draw()
-
-
-def promote_piece(move: Move, w: tk.Toplevel, piece: str) -> None:
-    """Promotes a pawn to a piece given by the piece string."""
-    move.square_to.piece.piece_type = piece
-    board.draw()
-    w.destroy()
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-
-    # This just fetches images from the folder images, creates tkinter PhotoImage classes
-    # and stores them in a dictionary with the file name as the key for easy access
-    # TODO - there's got to be a cleaner way of both retrieving the files, and maybe don't rely on file names?
-    images = {}
-    local_dir = pathlib.Path(__file__).parent.absolute()
-    image_dir = os.path.join(local_dir, "images")
-    for filename in os.listdir(image_dir):
-        images[filename] = tk.PhotoImage(file=image_dir + "/" + filename)
-
-    # Makes the window that the board is drawn in
-    window = Window()
-
-    # Creates the main board whose __init__ method has calls to other functions to initialise the game
-    board = Board()
-    board.generate_moves()
-
-    root.mainloop()
+"""
+A simple chess engine using Python.
+
+The window only redraws the squares that changed since the last draw, and each square keeps one image item that
+is pointed at a different piece image, rather than being cleared and drawn again. The engine searches on a
+background thread (EngineWorker), so the window keeps responding while it thinks; tkinter may only be used from
+the main thread, so the main loop picks up its moves by polling with root.after().
+"""
+
+import tkinter as tk
+import os
+import pathlib
+import pickle
+import queue
+import threading
+
+from core import BLACK, FEN, WHITE, Move, piece_colour, square_col, square_index, square_row
+from evaluate import BACKENDS
+from search import Searcher, SearchStopped
+
+# How long the engine thinks for each move, in seconds.
+ENGINE_MOVETIME = 1.0
+# How often the main loop checks for the engine's move, in milliseconds.
+POLL_INTERVAL = 50
+
+# The choices of who the engine plays, and the colour it plays for each.
+ENGINE_SIDES = {"Human vs human": None, "Engine plays black": BLACK, "Engine plays white": WHITE}
+
+
+class BoardView:
+    """
+    Draws a core Board onto a grid of tkinter canvases.
+
+    Attributes:
+        board (Board): The Board being displayed.
+        canvases (dict): The canvas for each square, keyed by (col, row).
+        colours (dict):
+            The colour of each square, keyed by (col, row), using tkinter internal colour names.
+            http://www.science.smith.edu/dftwiki/index.php/Color_Charts_for_TKinter
+        move_from (int): The mailbox index of the square a user input move starts from (default: None).
+        pieces (dict): The image item of each canvas, keyed by (col, row).
+        markers (dict): The move target marker item of each canvas, keyed by (col, row).
+        drawn (dict): What each square was last drawn as, keyed by (col, row): (piece, background, marked).
+    """
+
+    def __init__(self, board, frame: tk.Frame):
+        self.board = board
+        self.canvases = {}
+        self.colours = {}
+        self.move_from = None
+        self.pieces = {}
+        self.markers = {}
+        self.drawn = {}
+        self.initialise_canvases(frame)
+        self.draw()
+
+    def initialise_canvases(self, frame: tk.Frame) -> None:
+        """ A method for creating the canvas of every square, and assigning its colour. """
+        for row in range(8):
+            for col in range(8):
+                colour = "linen" if (col + row) % 2 == 0 else "PaleVioletRed3"
+                canvas = tk.Canvas(frame, width=50, height=50, bg=colour)
+                canvas.config(bd=0, highlightthickness=0, relief='ridge')
+
+                # Binds commands to the canvas
+                canvas.bind("<Button-1>", lambda e, c=col, r=row: square_clicked(e, c, r))
+                canvas.bind("<Button-3>", lambda e: clear_move())
+
+                canvas.grid(row=row, column=col)
+
+                # Each canvas keeps one image item and one marker, which draw() changes rather than remaking
+                self.pieces[(col, row)] = canvas.create_image(24, 25)
+                self.markers[(col, row)] = canvas.create_oval(20, 20, 30, 30, fill="orange", state="hidden")
+                self.canvases[(col, row)] = canvas
+                self.colours[(col, row)] = colour
+
+    def draw(self) -> None:
+        """
+        A method that draws the board.
+
+        It works out how each square should look: its piece, its colour (red for the square a move starts from,
+        yellow for a king in check) and whether it's marked as a target of the selected piece. Only the squares
+        that look different from the last draw are changed.
+        """
+        check = {(square_col(index), square_row(index)) for index in self.board.check}
+        targets = set()
+        if self.move_from is not None:
+            targets = {(square_col(move.to_index), square_row(move.to_index)) for move in self.board.moves
+                       if move.from_index == self.move_from}
+
+        for row in range(8):
+            for col in range(8):
+                square = (col, row)
+                if self.move_from == square_index(col, row):
+                    background = "red"
+                elif square in check:
+                    background = "yellow"
+                else:
+                    background = self.colours[square]
+                state = (self.board.piece_at(col, row), background, square in targets)
+                drawn = self.drawn.get(square)
+                if state == drawn:
+                    continue
+
+                canvas = self.canvases[square]
+                piece, _, marked = state
+                if drawn is None or drawn[0] != piece:
+                    # If a piece exists it points the image item at its image, otherwise at no image
+                    image = "" if piece is None else images[("w" if piece.isupper() else "b") + piece + ".png"]
+                    canvas.itemconfig(self.pieces[square], image=image)
+                if drawn is None or drawn[1] != background:
+                    canvas.config(bg=background)
+                if drawn is None or drawn[2] != marked:
+                    canvas.itemconfig(self.markers[square], state="normal" if marked else "hidden")
+                self.drawn[square] = state
+
+
+def square_clicked(event: tk.Event, col: int, row: int) -> None:
+    """
+    A function which allows a player to make moves by clicking pieces on the board.
+
+    It checks to see if a piece has already been clicked; if not, it will store the square
+    in the view's move_from variable, highlight the square to visually differentiate it,
+    and highlights possible moves from that square. If a square has already been stored
+    before this function is triggered again, it will make the move and redraw the board.
+
+    Args:
+        event (tk.Event): The Tkinter event. Not currently used.
+        col (int): The column of the square that has been clicked.
+        row (int): The row of the square that has been clicked.
+    """
+    # The board can't be moved on while the engine is thinking about it
+    if engine.thinking:
+        return
+    index = square_index(col, row)
+
+    if view.move_from is None:
+        view.move_from = index
+        view.draw()
+
+    else:
+        if view.move_from == index:
+            view.move_from = None
+            view.draw()
+            return
+        # The clicked move is looked up in the already generated legal moves, and then made in place
+        if any(move.from_index == view.move_from and move.to_index == index for move in board.moves):
+            move = Move(board, view.move_from, index)
+            promotion = move.is_promotion()
+            board.push(move)
+            board.generate_moves()
+            view.move_from = None
+            view.draw()
+            if promotion:
+                promotion_window(move)
+            else:
+                start_engine()
+            return
+        view.move_from = None
+        view.draw()
+
+
+class JobSearcher(Searcher):
+    """
+    A Searcher that also stops when the Event of the job it is searching is set. Unlike stop(), which search()
+    undoes when it starts, the Event can be set before the search has started and still stop it.
+
+    Attributes:
+        cancelled (threading.Event): The Event of the current job.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = threading.Event()
+
+    def _check_limits(self) -> None:
+        if self.cancelled.is_set():
+            raise SearchStopped
+        super()._check_limits()
+
+
+class EngineWorker:
+    """
+    Searches for the engine's moves on a background thread, so the window keeps responding while it thinks.
+
+    Attributes:
+        searcher (JobSearcher): The searcher, only used on the worker thread.
+        results (queue.Queue): (search number, move as UCI text or None, UCI info line) for each finished search.
+        search_number (int): The number of the search whose result is wanted; results of others are stale.
+        thinking (bool): True from when a search is started until its result is picked up or it is cancelled.
+    """
+
+    def __init__(self, movetime: float = ENGINE_MOVETIME):
+        self.movetime = movetime
+        self.searcher = JobSearcher()
+        self.results = queue.Queue()
+        self.search_number = 0
+        self.thinking = False
+        self._jobs = queue.Queue()
+        # The Event of the last job started, set to cancel it
+        self._cancelled = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def start(self, board) -> None:
+        """Starts searching a copy of a position, so the board shown can still be drawn while it searches."""
+        self.search_number += 1
+        self.thinking = True
+        self._cancelled = threading.Event()
+        self._jobs.put((self.search_number, pickle.dumps(board), self._cancelled))
+
+    def cancel(self) -> None:
+        """Stops the current search, whether or not it has started yet; its move is ignored when it arrives."""
+        self.search_number += 1
+        self.thinking = False
+        self._cancelled.set()
+
+    def _run(self) -> None:
+        """The loop of the worker thread."""
+        while True:
+            number, job, cancelled = self._jobs.get()
+            if number != self.search_number or cancelled.is_set():
+                continue
+            self.searcher.cancelled = cancelled
+            result = self.searcher.search(pickle.loads(job), movetime=self.movetime)
+            self.results.put((number, None if result.move is None else result.move.uci(), result.info()))
+
+
+def start_engine() -> None:
+    """Starts the engine thinking if it plays the side to move and the game isn't over."""
+    if ENGINE_SIDES[window.engine_side.get()] == board.turn and board.moves and not engine.thinking:
+        window.status.set("Engine thinking...")
+        engine.start(board)
+
+
+def poll_engine() -> None:
+    """Plays the engine's move once it has found one, then checks again after POLL_INTERVAL milliseconds."""
+    try:
+        while True:
+            number, text, info = engine.results.get_nowait()
+            if number != engine.search_number:
+                continue
+            engine.thinking = False
+            window.status.set(info)
+            if text is not None:
+                board.push(Move.from_uci(board, text))
+                board.generate_moves()
+                view.move_from = None
+                view.draw()
+    except queue.Empty:
+        pass
+    root.after(POLL_INTERVAL, poll_engine)
+
+
+def clear_move() -> None:
+    """ A function to clear the view's move_from variable, used in square_clicked(). """
+    view.move_from = None
+    view.draw()
+
+
+def engine_side_changed(*_) -> None:
+    """Stops the engine if it no longer plays the side to move, or starts it if it now does."""
+    if engine.thinking and ENGINE_SIDES[window.engine_side.get()] != board.turn:
+        engine.cancel()
+        window.status.set("")
+    start_engine()
+
+
+def insert_text(textbox: tk.Text, text: str):
+    textbox.delete(1.0, tk.END)
+    textbox.insert(1.0, text)
+
+
+def read_fen(fen: str):
+    try:
+        board.read_fen(fen)
+    except ValueError as error:
+        print("Error:", error)
+        return
+    # A search of the old position is no longer wanted
+    if engine.thinking:
+        engine.cancel()
+        window.status.set("")
+    board.generate_moves()
+    view.draw()
+    start_engine()
+
+
+class Window:
+    """A static class used for drawing the UI."""
+    def __init__(self):
+        main_frame = tk.Frame(root, width=1200, height=600, bg="white")
+        main_frame.grid(row=0, column=0)
+
+        self.board_frame = tk.Frame(main_frame, height=400, width=400, bd=10, bg="pink")
+        self.board_frame.grid(row=0, column=0)
+
+        right_frame = tk.Frame(root, width=600)
+        right_frame.grid(row=0, column=1, rowspan=2)
+
+        bottom_left_frame = tk.Frame(root, width=420, height=200)
+        bottom_left_frame.grid(row=1, column=0)
+
+        fen_string_entry = tk.Text(bottom_left_frame, width=40, height=2, relief="flat", bd=4)
+        fen_string_entry.insert(1.0, FEN)
+        fen_string_entry.grid(row=0, column=0)
+
+        fen_load_button = tk.Button(bottom_left_frame, command=lambda: read_fen(fen_string_entry.get(1.0, tk.END)))
+        fen_load_button.config(text="Read FEN")
+        fen_load_button.grid(row=0, column=1)
+
+        fen_gen_button = tk.Button(bottom_left_frame,
+                                   command=lambda: insert_text(fen_string_entry, board.generate_fen()))
+        fen_gen_button.config(text="Generate FEN")
+        fen_gen_button.grid(row=0, column=2)
+
+        reset_button = tk.Button(bottom_left_frame, width=10, relief="groove", pady=10, text="Reset",
+                                 command=lambda: self.reset())
+        reset_button.grid(row=1, column=0)
+
+        # Who the engine plays, and the engine's last search
+        self.engine_side = tk.StringVar(root, next(iter(ENGINE_SIDES)))
+        engine_menu = tk.OptionMenu(bottom_left_frame, self.engine_side, *ENGINE_SIDES)
+        engine_menu.grid(row=1, column=1, columnspan=2)
+        self.engine_side.trace_add("write", engine_side_changed)
+
+        self.status = tk.StringVar(root, "")
+        status_label = tk.Label(bottom_left_frame, textvariable=self.status, width=60, anchor="w")
+        status_label.grid(row=2, column=0, columnspan=3)
+
+    def reset(self) -> None:
+        """Resets the board to its original state."""
+        view.move_from = None
+        read_fen(FEN)
+
+
+def promotion_window(move: Move) -> None:
+    """ Function that displays pawn promotion options, after the pawn has been moved. """
+
+    # Defines a list of pieces to promote to, for which ever colour is promoting.
+    colour = piece_colour(board.mailbox[move.to_index])
+    pieces = ["wN", "wB", "wR", "wQ"] if colour == WHITE else ["bn", "bb", "bq", "br"]
+
+    # Creating and setting aspects of the promotion window.
+    w = tk.Toplevel(root)
+    w.title("Promote pawn")
+    w.geometry("264x90")
+    # Keeps the board from being clicked until the promotion is chosen, as it undoes the last move
+    w.grab_set()
+    # Closing the window takes the move back, as the cancel button does
+    w.protocol("WM_DELETE_WINDOW", lambda: cancel_promotion(w))
+
+    """
+    Here, it loops over the pieces in the pieces list. It creates a button with the correct image, and
+    assigns the correct values within the command it triggers on being pressed.
+    Credit to StackOverflow user BretBarn for the explanation on how to do this in a loop:
+    https://stackoverflow.com/questions/10865116/tkinter-creating-buttons-in-for-loop-passing-command-arguments
+    """
+    for i, piece in enumerate(pieces):
+        _temp = tk.Button(w, image=images[piece+".png"], command=lambda x=piece: promote_piece(move, w, x[1]))
+        _temp.grid(row=0, column=i)
+    t = tk.Button(w, text="cancel", command=lambda: cancel_promotion(w))
+    t.grid(row=1, column=0, columnspan=4)
+
+
+def cancel_promotion(w) -> None:
+    """Takes back the promoting move and closes the promotion window."""
+    w.destroy()
+    board.pop()
+    board.generate_moves()
+    view.draw()
+
+
+def promote_piece(move: Move, w: tk.Toplevel, piece: str) -> None:
+    """Promotes a pawn to a piece given by the piece string, by making the move again with the promotion."""
+    board.pop()
+    move.promotion = piece
+    board.push(move)
+    board.generate_moves()
+    view.draw()
+    w.destroy()
+    start_engine()
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+
+    # This just fetches images from the folder images, creates tkinter PhotoImage classes
+    # and stores them in a dictionary with the file name as the key for easy access
+    # TODO - there's got to be a cleaner way of both retrieving the files, and maybe don't rely on file names?
+    images = {}
+    local_dir = pathlib.Path(__file__).parent.absolute()
+    image_dir = os.path.join(local_dir, "images")
+    for filename in os.listdir(image_dir):
+        images[filename] = tk.PhotoImage(file=image_dir + "/" + filename)
+
+    # Makes the window that the board is drawn in
+    window = Window()
+
+    # Creates the headless board holding the game state, and the view that draws it. The board keeps a running
+    # evaluation, so the engine can search copies of it.
+    board = BACKENDS["mailbox"]()
+    board.generate_moves()
+    view = BoardView(board, window.board_frame)
+
+    engine = EngineWorker()
+    root.after(POLL_INTERVAL, poll_engine)
+
+    root.mainloop()
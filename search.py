@@ -0,0 +1,436 @@
+"""
+Searching for the best move of the side to move.
+
+The search is a negamax alpha-beta search, run with iterative deepening so that there is always a best move
+from the last finished depth to fall back on when the time or node budget runs out. Captures are searched
+further in a quiescence search so that positions aren't evaluated in the middle of an exchange. Moves are
+ordered by the transposition table's best move first, MVV-LVA for captures, then killer moves, then the
+history heuristic for other quiet moves. Results are kept in a transposition table, so each depth of iterative
+deepening reuses the work of the last one.
+
+Inside the search moves are packed 16 bit ints (see core.Board.encode_move()), generated into one preallocated
+buffer per ply that every node at that ply reuses, so no Move object is built for a candidate move. Only the
+result is turned back into Moves.
+https://www.chessprogramming.org/Alpha-Beta
+
+With Syzygy tablebases (tablebase.Tablebase), a root position they cover is played straight from the DTZ tables
+without searching, and inside the search positions they cover are scored from the WDL tables as soon as a
+capture or pawn move reaches them.
+
+Usage:
+    python search.py --depth 5
+    python search.py --movetime 2 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    python search.py --syzygy /path/to/syzygy --fen "8/8/8/4k3/8/8/8/KR6 w - - 0 1"
+"""
+
+import argparse
+import time
+
+from core import FEN, MAILBOX64, PACKED_CAPTURE, PAWN, Board, move_buffer
+from evaluate import BACKENDS, MATE, MATE_THRESHOLD, PIECE_VALUES, evaluate
+from tablebase import Tablebase, piece_count
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+INFINITY = MATE + 1
+
+MAX_PLY = 128
+
+# The score of a tablebase win, less the ply it's found at; below any mate score, above any evaluation.
+TB_WIN = MATE_THRESHOLD - MAX_PLY - 1
+
+# Move ordering scores. The transposition table move comes first, then captures, then the two killer moves,
+# then the rest by history score.
+HASH_ORDER = 1 << 31
+CAPTURE_ORDER = 1 << 30
+KILLER_ORDER = (1 << 29, (1 << 29) - 1)
+
+# How often, in nodes, the time and node limits are checked.
+CHECK_INTERVAL = 1024
+
+
+class SearchStopped(Exception):
+    """Raised inside the search when it runs out of time or nodes, or is told to stop."""
+
+
+class SearchResult:
+    """
+    The result of a search, updated after each depth of iterative deepening.
+
+    Attributes:
+        move (Move): The best move found, or None if there are no legal moves.
+        score (int): The score of the best move in centipawns, from the side to move's point of view.
+        depth (int): The last depth that was searched to the end.
+        nodes (int): The number of nodes searched, including quiescence nodes.
+        seconds (float): The time taken so far.
+        pv (list): The principal variation, the line of best play that the score is based on.
+        tbhits (int): The number of positions scored from the tablebases.
+    """
+
+    def __init__(self):
+        self.move = None
+        self.score = 0
+        self.depth = 0
+        self.nodes = 0
+        self.seconds = 0.0
+        self.pv = []
+        self.tbhits = 0
+
+    @property
+    def nps(self) -> int:
+        """Nodes searched per second."""
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+    def uci_score(self) -> tuple:
+        """Returns the score as UCI gives it: ("cp", centipawns), or ("mate", moves) for a mate score."""
+        if abs(self.score) >= MATE_THRESHOLD:
+            # UCI mate scores are in moves rather than plies, negative when being mated
+            moves = (MATE - abs(self.score) + 1) // 2
+            return "mate", moves if self.score > 0 else -moves
+        return "cp", self.score
+
+    def info(self) -> str:
+        """Returns the result as a UCI info line."""
+        score = " ".join(map(str, self.uci_score()))
+        pv = " ".join(move.uci() for move in self.pv)
+        tbhits = f" tbhits {self.tbhits}" if self.tbhits else ""
+        return (f"info depth {self.depth} score {score} nodes {self.nodes} nps {self.nps}{tbhits} "
+                f"time {int(self.seconds * 1000)} pv {pv}")
+
+
+class Searcher:
+    """
+    Searches positions for their best move. Killer moves and history scores are kept between the depths of
+    one search, and cleared at the start of the next.
+
+    Attributes:
+        nodes (int): The number of nodes searched so far in the current search.
+        stopped (bool): Set to True, from any thread, to stop the current search as soon as possible.
+        killers (list): For each ply, the last two quiet moves that caused a beta cutoff, as packed moves.
+        history (list): How often each quiet move, indexed by the from and to squares of its packed move (its
+            low 12 bits), caused a cutoff, weighted by depth.
+        buffers (list): A move buffer for each ply, reused by every search.
+        table (TranspositionTable): The transposition table, kept between searches.
+        tablebase (Tablebase): The endgame tablebases to probe, or None.
+        excluded (set): Packed moves left out at the root of the current search.
+    """
+
+    def __init__(self, hash_mb: float = 16, table: TranspositionTable = None, tablebase: Tablebase = None):
+        """
+        Initialises the Searcher class.
+
+        Args:
+            hash_mb (float): The size of the transposition table in megabytes (default: 16).
+            table (TranspositionTable): A table to use instead of making one, such as a shared one (default: None).
+            tablebase (Tablebase): Endgame tablebases to probe (default: None).
+        """
+        self.table = TranspositionTable(hash_mb) if table is None else table
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.tbhits = 0
+        self.stopped = False
+        self.killers = []
+        self.history = []
+        self.pv = []
+        self.buffers = [move_buffer() for _ in range(MAX_PLY + 1)]
+        self.excluded = set()
+        self._deadline = None
+        self._node_limit = None
+
+    def stop(self) -> None:
+        """Stops the current search; it returns the best move of the last finished depth."""
+        self.stopped = True
+
+    def search(self, board: Board, depth: int = None, movetime: float = None, nodes: int = None,
+               info=None, exclude: list = None) -> SearchResult:
+        """
+        Searches a position with iterative deepening until a limit is reached. With no limits it searches until
+        stop() is called, or until it finds a forced mate.
+
+        Args:
+            board (Board): The position to search. It is searched in place with push/pop and left as it was.
+            depth (int): The depth to search to, in plies (default: None, no limit).
+            movetime (float): The time to search for, in seconds (default: None, no limit).
+            nodes (int): The number of nodes to search (default: None, no limit).
+            info (callable): Called with the SearchResult after each finished depth (default: None).
+            exclude (list): Moves to leave out at the root, such as the best moves of earlier lines of a
+                multi-PV search (default: None).
+
+        Returns:
+            (SearchResult): The result of the last finished depth; its move is None if every legal move was left
+                out.
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.tbhits = 0
+        self.stopped = False
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * 4096
+        self._deadline = None if movetime is None else start + movetime
+        self._node_limit = nodes
+        self.table.new_search()
+
+        result = SearchResult()
+        moves = list(board.iter_moves())
+        if not moves:
+            result.score = - MATE if board.in_check() else 0
+            return result
+        self.excluded = {board.encode_move(move) for move in exclude} if exclude else set()
+        moves = [move for move in moves if board.encode_move(move) not in self.excluded]
+        if not moves:
+            return result
+        # There is always a move to play, even if the first depth doesn't finish
+        result.move = moves[0]
+        result.pv = [moves[0]]
+
+        if self.tablebase is not None and not self.excluded:
+            found = self.tablebase.root_move(board)
+            if found is not None:
+                # The tables know the best move already
+                move, wdl, dtz = found
+                result.move = move
+                result.pv = [move]
+                result.depth = 1
+                result.score = TB_WIN - abs(dtz) if wdl == 2 else - TB_WIN + abs(dtz) if wdl == -2 else 0
+                result.tbhits = 1
+                result.seconds = time.perf_counter() - start
+                if info is not None:
+                    info(result)
+                return result
+
+        max_depth = MAX_PLY if depth is None else min(depth, MAX_PLY)
+        history_length = len(board.history)
+        for current_depth in range(1, max_depth + 1):
+            self.pv = [[] for _ in range(MAX_PLY + 1)]
+            try:
+                score = self.negamax(board, current_depth, - INFINITY, INFINITY, 0)
+            except SearchStopped:
+                # Unwinds the moves that were being searched when the search stopped
+                while len(board.history) > history_length:
+                    board.pop()
+                break
+            result.score = score
+            result.depth = current_depth
+            result.pv = self.decode_pv(board, self.pv[0])
+            result.move = result.pv[0]
+            result.nodes = self.nodes
+            result.tbhits = self.tbhits
+            result.seconds = time.perf_counter() - start
+            if info is not None:
+                info(result)
+
+            if abs(score) >= MATE_THRESHOLD and MATE - abs(score) <= current_depth:
+                # A forced mate was found, searching deeper won't change it
+                break
+            if self._deadline is not None and time.perf_counter() > start + (self._deadline - start) / 2:
+                # The next depth would most likely not finish in the time left
+                break
+
+        result.nodes = self.nodes
+        result.tbhits = self.tbhits
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _check_limits(self) -> None:
+        """Raises SearchStopped if the search is out of time or nodes, or has been told to stop."""
+        if self.stopped:
+            raise SearchStopped
+        if self._node_limit is not None and self.nodes >= self._node_limit:
+            raise SearchStopped
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchStopped
+
+    def negamax(self, board: Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """
+        The alpha-beta search. Returns the score of the position from the side to move's point of view, and
+        fills in the principal variation from this ply in self.pv[ply].
+
+        Args:
+            board (Board): The position to search.
+            depth (int): The remaining depth in plies.
+            alpha (int): The score the side to move is already sure of.
+            beta (int): The score the opponent is already sure of; any score at or above it is a cutoff.
+            ply (int): The distance from the root.
+        """
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_limits()
+        self.pv[ply] = []
+
+        if ply > 0 and (board.halfmove_clock >= 100 or board.is_repetition()):
+            return 0
+
+        in_check = board.in_check()
+        if in_check:
+            # Check extension, so that a check at the horizon is seen through
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(board, alpha, beta, ply)
+
+        hash_move = 0
+        entry = self.table.probe(board.key, ply)
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move = entry
+            # The root always searches, so that there is a principal variation and a move to play
+            if ply > 0 and entry_depth >= depth:
+                if (bound == EXACT or (bound == LOWER and entry_score >= beta)
+                        or (bound == UPPER and entry_score <= alpha)):
+                    return entry_score
+
+        # The WDL tables assume the fifty move counter was just reset, so they are probed after captures and pawn
+        # moves; the search ends there
+        tablebase = self.tablebase
+        if (tablebase is not None and ply > 0 and board.halfmove_clock == 0 and not board.castling
+                and piece_count(board) <= tablebase.max_pieces):
+            wdl = tablebase.probe_wdl(board)
+            if wdl is not None:
+                self.tbhits += 1
+                # Wins and losses the fifty move rule turns into draws score as draws
+                return TB_WIN - ply if wdl == 2 else - TB_WIN + ply if wdl == -2 else 0
+
+        moves = self.buffers[ply]
+        count = board.generate_packed(moves)
+        if not count:
+            return - MATE + ply if in_check else 0
+
+        original_alpha = alpha
+        best = - INFINITY
+        best_move = 0
+        ordered = self.order_moves(board, moves, count, ply, hash_move)
+        if ply == 0 and self.excluded:
+            ordered = [move for move in ordered if move not in self.excluded]
+        for move in ordered:
+            board.push_packed(move)
+            score = - self.negamax(board, depth - 1, - beta, - alpha, ply + 1)
+            board.pop()
+
+            if score > best:
+                best = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                self.pv[ply] = [move] + self.pv[ply + 1]
+            if alpha >= beta:
+                if move < PACKED_CAPTURE:
+                    self.store_cutoff(move, depth, ply)
+                break
+
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        # A root searched without some of its moves has no true score to keep
+        if ply > 0 or not self.excluded:
+            self.table.store(board.key, depth, best, bound, best_move, ply)
+        return best
+
+    def quiescence(self, board: Board, alpha: int, beta: int, ply: int) -> int:
+        """
+        Searches only captures and promotions until the position is quiet, so that it is evaluated when no
+        pieces are hanging. The side to move may also "stand pat" on the static evaluation instead of capturing.
+        """
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_limits()
+
+        stand_pat = evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        moves = self.buffers[ply]
+        count = board.generate_packed(moves)
+        # Every capture and promotion packs to at least PACKED_CAPTURE
+        captures = [move for move in moves[:count] if move >= PACKED_CAPTURE]
+        captures.sort(key=lambda move: self.mvv_lva(board, move), reverse=True)
+        for move in captures:
+            board.push_packed(move)
+            score = - self.quiescence(board, - beta, - alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    @staticmethod
+    def mvv_lva(board: Board, move: int) -> int:
+        """
+        Most valuable victim, least valuable attacker: a capture ordering score for a packed move, higher is
+        searched first.
+        """
+        victim = board.mailbox[MAILBOX64[move >> 6 & 63]] & 7 or PAWN
+        attacker = board.mailbox[MAILBOX64[move & 63]] & 7
+        return PIECE_VALUES[victim] * 8 - attacker
+
+    def order_moves(self, board: Board, moves, count: int, ply: int, hash_move: int = 0) -> list:
+        """
+        Orders the first count packed moves of a buffer in the order they should be searched, given the
+        transposition table move (or 0).
+
+        Returns:
+            (list): The packed moves, in order.
+        """
+        killers = self.killers[ply]
+        history = self.history
+
+        def order(move):
+            if move == hash_move:
+                return HASH_ORDER
+            if move >= PACKED_CAPTURE:
+                return CAPTURE_ORDER + self.mvv_lva(board, move)
+            if move == killers[0]:
+                return KILLER_ORDER[0]
+            if move == killers[1]:
+                return KILLER_ORDER[1]
+            return history[move & 0xFFF]
+
+        return sorted(moves[:count], key=order, reverse=True)
+
+    def store_cutoff(self, move: int, depth: int, ply: int) -> None:
+        """Remembers a quiet packed move that caused a beta cutoff as a killer move, and in the history table."""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & 0xFFF] += depth * depth
+
+    @staticmethod
+    def decode_pv(board: Board, pv: list) -> list:
+        """Turns a principal variation of packed moves into Moves on the board, each decoded in its position."""
+        moves = []
+        for packed in pv:
+            moves.append(board.decode_move(packed))
+            board.push_packed(packed)
+        for _ in moves:
+            board.pop()
+        return moves
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Search a position for the best move.")
+    parser.add_argument("--fen", default=FEN, help="the position to search (default: the start position)")
+    parser.add_argument("--depth", type=int, help="the depth to search to, in plies")
+    parser.add_argument("--movetime", type=float, help="the time to search for, in seconds")
+    parser.add_argument("--nodes", type=int, help="the number of nodes to search")
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox", help="the board representation to use")
+    parser.add_argument("--hash", type=float, default=16, help="the transposition table size in MB (default: 16)")
+    parser.add_argument("--debug-eval", action="store_true",
+                        help="check the running evaluation against a full recompute at every evaluation (slow)")
+    parser.add_argument("--syzygy", help="the directory of the Syzygy tablebases to probe")
+    args = parser.parse_args(argv)
+
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.depth = 4
+    board = BACKENDS[args.backend](args.fen)
+    board.debug = args.debug_eval
+    tablebase = Tablebase(args.syzygy) if args.syzygy else None
+    result = Searcher(args.hash, tablebase=tablebase).search(board, args.depth, args.movetime, args.nodes,
+                                                             info=lambda result: print(result.info()))
+    print("bestmove", result.move.uci() if result.move is not None else "0000")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""
+An analysis server, for other tools to search positions over a local socket.
+
+Clients send requests as JSON lines, such as {"id": 1, "fen": "...", "depth": 6, "multipv": 3}, and get JSON lines
+back: an "info" message for each finished depth of each line, then one "result" message, or an "error" message
+if the request can't be answered. Replies carry the id of their request, so a client can send several requests
+on one connection without waiting, and their replies interleave.
+
+The event loop only reads, writes and routes messages. Searches run on a pool of worker processes, each with its
+own Searcher, fed from one job queue, and their info messages come back on one result queue that a thread reads
+for the event loop. A worker that dies is replaced, and the requests waiting on its search get an error. Results
+are cached by the Zobrist key of the position and the search limits, so a repeated request is answered straight
+away, and identical requests made while one is being searched share the search.
+
+Usage:
+    python server.py --port 8765 --workers 4
+    python server.py --port 8765 --query "8/8/8/4k3/8/8/8/KR6 w - - 0 1" --depth 6 --multipv 2
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import multiprocessing.connection
+import sys
+from collections import OrderedDict
+
+from core import FEN, Board
+from evaluate import BACKENDS
+from search import Searcher
+
+HOST = "127.0.0.1"
+
+# The search limits a request may give, with their types.
+LIMITS = {"depth": int, "movetime": float, "nodes": int}
+
+# The depth searched to when a request gives no limit, so that nothing searches forever.
+DEFAULT_DEPTH = 5
+
+MAX_MULTIPV = 32
+
+# The number of results kept in the cache.
+CACHE_SIZE = 1 << 12
+
+
+def analyse(board: Board, searcher: Searcher, depth: int = None, movetime: float = None, nodes: int = None,
+            multipv: int = 1, info=None) -> dict:
+    """
+    Searches a position for its best lines. Each line after the first is searched without the first moves of the
+    lines before it, and the time and nodes are shared out between the lines.
+
+    Args:
+        board (Board): The position to search.
+        searcher (Searcher): The searcher.
+        depth (int): The depth to search each line to, in plies (default: None, no limit).
+        movetime (float): The time to search for, in seconds (default: None, no limit).
+        nodes (int): The number of nodes to search (default: None, no limit).
+        multipv (int): The number of lines to find (default: 1).
+        info (callable): Called with the dict of a line after each finished depth (default: None).
+
+    Returns:
+        (dict): The bestmove in UCI notation (None if there are no legal moves), the total nodes and seconds, and
+            the lines, best first.
+    """
+    lines = []
+    excluded = []
+    for number in range(1, multipv + 1):
+        result = searcher.search(board, depth, None if movetime is None else movetime / multipv,
+                                 None if nodes is None else max(nodes // multipv, 1),
+                                 None if info is None else lambda result: info(line_dict(result, number)),
+                                 excluded)
+        if result.move is None and lines:
+            # There were fewer legal moves than lines
+            break
+        lines.append(line_dict(result, number))
+        if result.move is None:
+            # No legal moves, the line is just the mate or stalemate score
+            break
+        excluded.append(result.move)
+    return {
+        "bestmove": lines[0]["pv"][0] if lines[0]["pv"] else None,
+        "nodes": sum(line["nodes"] for line in lines),
+        "seconds": sum(line["seconds"] for line in lines),
+        "lines": lines,
+    }
+
+
+def line_dict(result, number: int) -> dict:
+    """Returns a SearchResult as the dict sent to clients, as line number (multipv) of the position."""
+    kind, score = result.uci_score()
+    return {"multipv": number, "depth": result.depth, kind: score, "nodes": result.nodes, "nps": result.nps,
+            "seconds": result.seconds, "pv": [move.uci() for move in result.pv]}
+
+
+def _worker(backend: str, hash_mb: float, jobs, results, number: int) -> None:
+    """
+    The loop of worker process number: searches each job it takes, a tuple of (job id, FEN, depth, movetime,
+    nodes, multipv), until it takes None. Sends ("start", job id, number) on taking it, ("info", job id, line)
+    after each depth, then ("done", job id, result), or ("error", job id, message).
+    """
+    board = BACKENDS[backend]()
+    searcher = Searcher(hash_mb)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, fen, depth, movetime, nodes, multipv = job
+        results.put(("start", job_id, number))
+        try:
+            board.read_fen(fen)
+            result = analyse(board, searcher, depth, movetime, nodes, multipv,
+                             lambda line: results.put(("info", job_id, line)))
+            results.put(("done", job_id, result))
+        except Exception as error:
+            results.put(("error", job_id, f"{type(error).__name__}: {error}"))
+
+
+class AnalysisServer:
+    """
+    Answers analysis requests from many clients at once with a pool of worker processes.
+
+    Attributes:
+        workers (int): The number of worker processes.
+        cache (OrderedDict): Finished results by (Zobrist key, depth, movetime, nodes, multipv), least recently
+            used first.
+        cache_size (int): The most results kept in the cache.
+        cache_hits (int): The number of requests answered from the cache.
+        address (tuple): The (host, port) the server listens on, once started.
+    """
+
+    def __init__(self, workers: int = None, backend: str = "mailbox", hash_mb: float = 16,
+                 cache_size: int = CACHE_SIZE):
+        """
+        Initialises the AnalysisServer class.
+
+        Args:
+            workers (int): The number of worker processes (default: None, one per core).
+            backend (str): The name of the board backend the workers search with (default: "mailbox").
+            hash_mb (float): The transposition table size of each worker in megabytes (default: 16).
+            cache_size (int): The most results kept in the cache (default: CACHE_SIZE).
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.backend = backend
+        self.hash_mb = hash_mb
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.address = None
+        self._jobs = None
+        self._results = None
+        self._processes = []
+        self._job_ids = itertools.count()
+        # The message queues of the requests waiting on each job, the job searching each cache key, and the job
+        # each worker last took
+        self._subscribers = {}
+        self._searching = {}
+        self._running = {}
+        self._server = None
+        self._reader = None
+        self._watcher = None
+        self._closing = False
+
+    async def start(self, host: str = HOST, port: int = 0) -> tuple:
+        """
+        Starts the worker processes and listens for clients.
+
+        Args:
+            host (str): The address to listen on (default: HOST, this machine only).
+            port (int): The port to listen on (default: 0, any free port).
+
+        Returns:
+            (tuple): The (host, port) listened on.
+        """
+        self._jobs = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._processes = [self._start_worker(number) for number in range(self.workers)]
+        self._reader = asyncio.create_task(self._read_results())
+        self._watcher = asyncio.create_task(self._watch_workers())
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        self.address = self._server.sockets[0].getsockname()[:2]
+        return self.address
+
+    def _start_worker(self, number: int) -> multiprocessing.Process:
+        """Starts worker process number."""
+        process = multiprocessing.Process(target=_worker, args=(self.backend, self.hash_mb, self._jobs,
+                                                                 self._results, number), daemon=True)
+        process.start()
+        return process
+
+    async def serve_forever(self) -> None:
+        """Serves clients until cancelled."""
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stops listening, and stops the worker processes once they finish their searches."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._closing = True
+        for _ in self._processes:
+            self._jobs.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+        if self._watcher is not None:
+            await self._watcher
+        self._processes = []
+        if self._reader is not None:
+            # Wakes the reading thread up so that it ends
+            self._results.put(None)
+            await self._reader
+
+    async def analyse(self, request: dict, send=None) -> dict:
+        """
+        Answers a request, from the cache or by searching it on a worker.
+
+        Args:
+            request (dict): The request: a "fen" (default: the start position), any of "depth", "movetime" (in
+                seconds) and "nodes", and "multipv" (default: 1). With no limit it is searched to DEFAULT_DEPTH.
+            send (coroutine function): Awaited with each info line dict as the search finds it (default: None).
+
+        Returns:
+            (dict): The result, as analyse() makes it, with "cached" set to whether it came from the cache.
+
+        Raises:
+            ValueError: If the request is malformed, or the search failed.
+        """
+        fen = request.get("fen", FEN)
+        if not isinstance(fen, str):
+            raise ValueError("fen must be a string")
+        limits = []
+        for name, kind in LIMITS.items():
+            value = request.get(name)
+            if value is not None:
+                try:
+                    value = kind(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{name} must be a number") from None
+                if value <= 0:
+                    raise ValueError(f"{name} must be positive")
+            limits.append(value)
+        if limits == [None, None, None]:
+            limits[0] = DEFAULT_DEPTH
+        try:
+            multipv = int(request.get("multipv", 1))
+        except (TypeError, ValueError):
+            raise ValueError("multipv must be a number") from None
+        multipv = min(max(multipv, 1), MAX_MULTIPV)
+        # Checks the FEN here, and finds the key of its position
+        key = (Board(fen).key, *limits, multipv)
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            return {**self.cache[key], "cached": True}
+        messages = asyncio.Queue()
+        job_id = self._searching.get(key)
+        if job_id is None:
+            job_id = next(self._job_ids)
+            self._searching[key] = job_id
+            self._subscribers[job_id] = (key, [])
+            self._jobs.put((job_id, fen, *limits, multipv))
+        self._subscribers[job_id][1].append(messages)
+        while True:
+            kind, payload = await messages.get()
+            if kind == "info":
+                if send is not None:
+                    await send(payload)
+            elif kind == "error":
+                raise ValueError(payload)
+            else:
+                return {**payload, "cached": False}
+
+    async def _read_results(self) -> None:
+        """Passes the messages of the workers on to the requests waiting for them, and caches finished results."""
+        loop = asyncio.get_running_loop()
+        while True:
+            # The queue is read on a thread, so the event loop never blocks on it
+            message = await loop.run_in_executor(None, self._results.get)
+            if message is None:
+                break
+            kind, job_id, payload = message
+            if kind == "start":
+                self._running[payload] = job_id
+                continue
+            if kind == "exit":
+                # Comes after every message the worker sent before it died, so its job is the last it took
+                number, exitcode = payload
+                job_id = self._running.pop(number, None)
+                if job_id not in self._subscribers:
+                    continue
+                kind, payload = "error", f"The worker searching the position died (exit code {exitcode})"
+            key, subscribers = self._subscribers[job_id]
+            if kind != "info":
+                del self._subscribers[job_id]
+                del self._searching[key]
+                if kind == "done":
+                    self.cache[key] = payload
+                    if len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+            for messages in subscribers:
+                messages.put_nowait((kind, payload))
+
+    async def _watch_workers(self) -> None:
+        """
+        Replaces the worker processes that die, and sends ("exit", None, (number, exit code)) on the result queue
+        for each, so _read_results() fails the job it was searching.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            sentinels = [process.sentinel for process in self._processes]
+            # Waits on a thread, so the event loop never blocks on it
+            dead = await loop.run_in_executor(None, multiprocessing.connection.wait, sentinels)
+            if self._closing:
+                break
+            for sentinel in dead:
+                number = sentinels.index(sentinel)
+                process = self._processes[number]
+                process.join()
+                self._results.put(("exit", None, (number, process.exitcode)))
+                self._processes[number] = self._start_worker(number)
+
+    async def _handle_client(self, reader, writer) -> None:
+        """Answers the requests of one connection, each as soon as it arrives, until the client closes it."""
+        requests = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    requests.add(asyncio.create_task(self._respond(line, writer)))
+            # The client may close its side as soon as it has sent its requests, and still wait for the replies
+            await asyncio.gather(*requests)
+        except ConnectionError:
+            pass
+        finally:
+            for request in requests:
+                request.cancel()
+            writer.close()
+
+    async def _respond(self, line: bytes, writer) -> None:
+        """Answers one request line, writing its info messages and then its result or an error."""
+        request_id = None
+
+        async def send(message):
+            writer.write((json.dumps({"id": request_id, **message}) + "\n").encode())
+            await writer.drain()
+
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+            request_id = request.get("id")
+            result = await self.analyse(request, lambda info: send({"type": "info", **info}))
+            await send({"type": "result", **result})
+        except ValueError as error:
+            # json.JSONDecodeError is a ValueError too
+            await send({"type": "error", "error": str(error)})
+
+
+async def query(host: str, port: int, request: dict, on_info=None) -> dict:
+    """
+    Sends one request to an analysis server and waits for its result.
+
+    Args:
+        host (str): The server's address.
+        port (int): The server's port.
+        request (dict): The request.
+        on_info (callable): Called with each info message (default: None).
+
+    Returns:
+        (dict): The result message.
+
+    Raises:
+        ValueError: If the server answered with an error.
+        ConnectionError: If the server closed the connection without answering.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("The server closed the connection")
+            message = json.loads(line)
+            if message["type"] == "info":
+                if on_info is not None:
+                    on_info(message)
+            elif message["type"] == "error":
+                raise ValueError(message["error"])
+            else:
+                return message
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def _serve(args) -> None:
+    server = AnalysisServer(args.workers, args.backend, args.hash)
+    host, port = await server.start(args.host, args.port)
+    print(f"Listening on {host}:{port} with {server.workers} workers", file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve analysis requests as JSON lines over a local socket.")
+    parser.add_argument("--host", default=HOST, help=f"the address to listen on or connect to (default: {HOST})")
+    parser.add_argument("--port", type=int, default=8765, help="the port to listen on or connect to (default: 8765)")
+    parser.add_argument("--workers", type=int, help="the number of worker processes (default: one per core)")
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox", help="the board representation to use")
+    parser.add_argument("--hash", type=float, default=16,
+                        help="the transposition table size of each worker in MB (default: 16)")
+    parser.add_argument("--query", metavar="FEN", help="send a request for this position to a running server")
+    parser.add_argument("--depth", type=int, help="with --query, the depth to search to")
+    parser.add_argument("--movetime", type=float, help="with --query, the time to search for, in seconds")
+    parser.add_argument("--nodes", type=int, help="with --query, the number of nodes to search")
+    parser.add_argument("--multipv", type=int, default=1, help="with --query, the number of lines (default: 1)")
+    args = parser.parse_args(argv)
+
+    if args.query is None:
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+        return
+    request = {"fen": args.query, "depth": args.depth, "movetime": args.movetime, "nodes": args.nodes,
+               "multipv": args.multipv}
+    result = asyncio.run(query(args.host, args.port, request, lambda message: print(json.dumps(message))))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,987 @@
+"""
+Probing Syzygy endgame tablebases, for perfect play in positions with few pieces.
+
+A Syzygy table holds the result of every position of one material balance, such as KRvK: the WDL table (.rtbw)
+whether the side to move wins, draws or loses, and the DTZ table (.rtbz) how many plies it takes to reach a
+capture or pawn move that keeps that result, the distance to zeroing the fifty move counter. Playing the move
+with the smallest DTZ always wins a won position. The tables are compressed, and each position is looked up by
+turning its piece squares into an index, then decoding the block of the table that index falls in.
+https://www.chessprogramming.org/Syzygy_Bases
+
+The reading of the table files and the probing follow Fathom (https://github.com/jdart1/Fathom, MIT licence),
+which is built on Ronald de Man's own probing code for his tables. The constant tables below are part of the
+file format, and have the same values there.
+
+Tablebase finds the tables of a directory by their file names, but a table file is only memory mapped when a
+position of its material is first probed, and its pages are only read from disk as the lookups touch them, so
+tables the search never reaches cost nothing. Probe results are also kept in an LRU cache by Zobrist key, as the
+search keeps reaching the same endgame positions. Everything is read from the local files, nothing is
+downloaded.
+
+Tables only hold positions without castling rights, and assume the fifty move counter has just been reset; the
+search probes them after captures and pawn moves.
+
+Usage:
+    python tablebase.py /path/to/syzygy --fen "8/8/8/8/8/2k5/8/KR6 w - - 0 1"
+"""
+
+import argparse
+import math
+import mmap
+import os
+import re
+import struct
+from collections import OrderedDict
+
+from core import BLACK_PIECE, EMPTY, KING, MAILBOX64, PAWN, WHITE, Board, Move, square_col, square_row
+
+WDL_SUFFIX = ".rtbw"
+DTZ_SUFFIX = ".rtbz"
+WDL_MAGIC = b"\x71\xe8\x23\x5d"
+DTZ_MAGIC = b"\xd7\x66\x0c\xa5"
+
+# Table names, such as KRPvKR: each side's pieces, strongest first.
+TABLE_NAME = re.compile(r"^K[QRBNP]*vK[QRBNP]*$")
+PIECE_ORDER = "KQRBNP"
+
+# The number of probe results kept in the cache.
+CACHE_SIZE = 1 << 16
+
+UINT16 = struct.Struct("<H")
+UINT32 = struct.Struct("<I")
+UINT32_BE = struct.Struct(">I")
+UINT64_BE = struct.Struct(">Q")
+
+# Tables number the squares from a1 (0) to h8 (63), rank by rank. The mailbox index and square number of each
+# square, in square number order.
+SQUARE_NUMBERS = tuple((index, (7 - square_row(index)) * 8 + square_col(index))
+                       for index in sorted(MAILBOX64, key=lambda index: (- square_row(index), square_col(index))))
+
+# The tables below are part of the format: they fold the board's symmetries into the index of a position. Without
+# pawns a position can be mirrored so its first piece is in the a1-d1-d4 triangle, with pawns so its leading pawn
+# is on the a-d files.
+TRIANGLE = (
+    6, 0, 1, 2, 2, 1, 0, 6,
+    0, 7, 3, 4, 4, 3, 7, 0,
+    1, 3, 8, 5, 5, 8, 3, 1,
+    2, 4, 5, 9, 9, 5, 4, 2,
+    2, 4, 5, 9, 9, 5, 4, 2,
+    1, 3, 8, 5, 5, 8, 3, 1,
+    0, 7, 3, 4, 4, 3, 7, 0,
+    6, 0, 1, 2, 2, 1, 0, 6,
+)
+
+# The square in the a1-d1-d4 triangle of each TRIANGLE number.
+INVERSE_TRIANGLE = (1, 2, 3, 10, 11, 19, 0, 9, 18, 27)
+
+LOWER = (
+    28, 0, 1, 2, 3, 4, 5, 6,
+    0, 29, 7, 8, 9, 10, 11, 12,
+    1, 7, 30, 13, 14, 15, 16, 17,
+    2, 8, 13, 31, 18, 19, 20, 21,
+    3, 9, 14, 18, 32, 22, 23, 24,
+    4, 10, 15, 19, 22, 33, 25, 26,
+    5, 11, 16, 20, 23, 25, 34, 27,
+    6, 12, 17, 21, 24, 26, 27, 35,
+)
+
+DIAGONAL = (
+    0, 0, 0, 0, 0, 0, 0, 8,
+    0, 1, 0, 0, 0, 0, 9, 0,
+    0, 0, 2, 0, 0, 10, 0, 0,
+    0, 0, 0, 3, 11, 0, 0, 0,
+    0, 0, 0, 12, 4, 0, 0, 0,
+    0, 0, 13, 0, 0, 5, 0, 0,
+    0, 14, 0, 0, 0, 0, 6, 0,
+    15, 0, 0, 0, 0, 0, 0, 7,
+)
+
+FLAP = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 6, 12, 18, 18, 12, 6, 0,
+    1, 7, 13, 19, 19, 13, 7, 1,
+    2, 8, 14, 20, 20, 14, 8, 2,
+    3, 9, 15, 21, 21, 15, 9, 3,
+    4, 10, 16, 22, 22, 16, 10, 4,
+    5, 11, 17, 23, 23, 17, 11, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+
+PAWN_TWIST = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    47, 35, 23, 11, 10, 22, 34, 46,
+    45, 33, 21, 9, 8, 20, 32, 44,
+    43, 31, 19, 7, 6, 18, 30, 42,
+    41, 29, 17, 5, 4, 16, 28, 40,
+    39, 27, 15, 3, 2, 14, 26, 38,
+    37, 25, 13, 1, 0, 12, 24, 36,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+
+# The square of each FLAP number.
+INVERSE_FLAP = (
+    8, 16, 24, 32, 40, 48,
+    9, 17, 25, 33, 41, 49,
+    10, 18, 26, 34, 42, 50,
+    11, 19, 27, 35, 43, 51,
+)
+
+FILE_TO_FILE = (0, 1, 2, 3, 3, 2, 1, 0)
+
+# The number of placements of the first three unique pieces, or of the two kings, once the symmetries are folded.
+PIVOT_FACTORS = {0: 31332, 2: 462}
+
+# Maps from a WDL result (-2 to 2, plus 2) to the DTZ table's value map, and to the flag saying the DTZ values of
+# that result are stored in plies rather than moves (Fathom's WdlToMap and PAFlags).
+WDL_TO_MAP = (1, 3, 0, 2, 0)
+PLY_FLAGS = (8, 0, 0, 0, 4)
+
+# The DTZ of a capture or pawn move with each WDL result (-2 to 2, plus 2): 1 for a win or loss, 101 for one the
+# fifty move rule turns into a draw.
+WDL_TO_DTZ = (-1, -101, 0, 101, 1)
+
+
+def _off_diagonal(square: int) -> int:
+    """Returns how far a square is above (positive) or below (negative) the a1-h8 diagonal."""
+    return (square >> 3) - (square & 7)
+
+
+def _flip_diagonal(square: int) -> int:
+    """Mirrors a square in the a1-h8 diagonal."""
+    return ((square >> 3) | (square << 3)) & 63
+
+
+def _king_pair_indices() -> list:
+    """
+    Numbers the 462 placements of two kings that aren't next to each other, with the first in the a1-d1-d4
+    triangle and, if it's on the diagonal, the second not above it. Placements with both kings on the diagonal
+    are numbered last.
+    """
+    indices = [[-1] * 64 for _ in range(10)]
+    code = 0
+    on_diagonal = []
+    for number, first in enumerate(INVERSE_TRIANGLE):
+        for second in range(64):
+            if max(abs((first >> 3) - (second >> 3)), abs((first & 7) - (second & 7))) <= 1:
+                continue
+            if not _off_diagonal(first) and _off_diagonal(second) > 0:
+                continue
+            if not _off_diagonal(first) and not _off_diagonal(second):
+                on_diagonal.append((number, second))
+            else:
+                indices[number][second] = code
+                code += 1
+    for number, second in on_diagonal:
+        indices[number][second] = code
+        code += 1
+    return indices
+
+
+KING_PAIR_INDICES = _king_pair_indices()
+
+
+def _pawn_indices() -> tuple:
+    """
+    Works out where each leading pawn square's placements start in a table's index, and how many placements each
+    of the four files has, for one to five leading pawns.
+    """
+    indices = [[0] * 24 for _ in range(5)]
+    factors = [[0] * 4 for _ in range(5)]
+    for pawns in range(5):
+        for file in range(4):
+            total = 0
+            for number in range(file * 6, file * 6 + 6):
+                indices[pawns][number] = total
+                total += 1 if pawns == 0 else math.comb(PAWN_TWIST[INVERSE_FLAP[number]], pawns)
+            factors[pawns][file] = total
+    return indices, factors
+
+
+PAWN_INDICES, PAWN_FACTORS = _pawn_indices()
+
+
+def material_key(codes, mirror: bool = False) -> str:
+    """
+    Names the material of a set of pieces the way tables are named, such as "KRPvKR".
+
+    Args:
+        codes: The piece code of each piece.
+        mirror (bool): Swap the colours (default: False).
+
+    Returns:
+        (str): The white pieces, "v", then the black pieces, each side strongest first.
+    """
+    codes = list(codes)
+    white, black = (BLACK_PIECE, 0) if mirror else (0, BLACK_PIECE)
+    return "v".join("".join(char * codes.count((KING - i) | side) for i, char in enumerate(PIECE_ORDER))
+                    for side in (white, black))
+
+
+def normalise_name(name: str, mirror: bool = False) -> str:
+    """Puts a table name in the order its file is named by: the pieces in order, and the stronger side first."""
+    white, black = name.split("v")
+    white = "".join(sorted(white, key=PIECE_ORDER.index))
+    black = "".join(sorted(black, key=PIECE_ORDER.index))
+    weaker = (len(white), [PIECE_ORDER.index(char) for char in black]) < \
+             (len(black), [PIECE_ORDER.index(char) for char in white])
+    return f"{black}v{white}" if mirror != weaker else f"{white}v{black}"
+
+
+def piece_count(board: Board) -> int:
+    """Returns the number of pieces on the board, kings included."""
+    return len(MAILBOX64) - board.mailbox.count(EMPTY)
+
+
+class _Pairs:
+    """
+    Where the compressed values of one part of a table are, and how to decode them. The values are Huffman coded
+    symbols, each standing for a run of values built up from pairs of other symbols.
+    """
+
+    __slots__ = ("index_bits", "block_size", "min_length", "base", "offset", "symbol_lengths", "symbol_patterns",
+                 "index_table", "size_table", "data", "index_bytes", "size_bytes", "data_bytes", "flags")
+
+
+class SyzygyTable:
+    """
+    A WDL or DTZ table file, memory mapped on its first probe.
+
+    Attributes:
+        path (str): The table file.
+        dtz (bool): True for a DTZ table, False for a WDL one.
+        key (str): The material of the table, such as "KRvK"; the other side's material is its mirrored_key.
+        pieces (int): The number of pieces, kings included.
+    """
+
+    def __init__(self, path: str, dtz: bool = False):
+        """
+        Initialises the SyzygyTable class. Only the file name is read until the first probe.
+
+        Args:
+            path (str): The table file.
+            dtz (bool): True for a DTZ table, False for a WDL one (default: False).
+        """
+        self.path = path
+        self.dtz = dtz
+        name = os.path.splitext(os.path.basename(path))[0]
+        self.key = normalise_name(name)
+        self.mirrored_key = normalise_name(name, mirror=True)
+        self.symmetric = self.key == self.mirrored_key
+        self.pieces = len(name) - 1
+        self.has_pawns = "P" in name
+
+        first, second = name.split("v")
+        if self.has_pawns:
+            # The leading pawns are those of the side with fewer pawns, if it has any
+            self.pawns = [second.count("P"), first.count("P")]
+            if self.pawns[1] > 0 and (self.pawns[0] == 0 or self.pawns[1] < self.pawns[0]):
+                self.pawns.reverse()
+        else:
+            # With three or more unique pieces the first three are placed together; otherwise it's the two kings
+            unique = sum((first.count(char) == 1) + (second.count(char) == 1) for char in PIECE_ORDER)
+            self.encoding = 0 if unique >= 3 else 2
+
+        self._map = None
+        # For each file (just one without pawns) and each side to move stored: the piece codes in the order they
+        # are indexed, how many of each are together, the factor of each group in the index and the pairs data
+        self._codes = None
+        self._norms = None
+        self._factors = None
+        self._pairs = None
+        # The DTZ value maps
+        self._value_map = 0
+        self._map_offsets = None
+
+    def _open(self) -> None:
+        """Maps the file and reads its header."""
+        with open(self.path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if data.size() % 64 != 16 or data[:4] != (DTZ_MAGIC if self.dtz else WDL_MAGIC):
+            data.close()
+            raise OSError(f"{self.path} isn't a Syzygy table")
+        if hasattr(data, "madvise"):
+            # Lookups jump all over the file, so reading ahead would only waste memory
+            data.madvise(mmap.MADV_RANDOM)
+        self._map = data
+
+        sides = 1 if self.dtz else 1 + (data[4] & 1)
+        files = 4 if data[4] & 2 else 1
+        self._codes = [[None] * sides for _ in range(4)]
+        self._norms = [[None] * sides for _ in range(4)]
+        self._factors = [[None] * sides for _ in range(4)]
+        self._pairs = [[None] * sides for _ in range(files)]
+        sizes = [[0] * sides for _ in range(4)]
+
+        offset = 5
+        if self.has_pawns:
+            codes_at = 1 + (self.pawns[1] > 0)
+            for file in range(4):
+                for side in range(sides):
+                    sizes[file][side] = self._read_pieces(offset, codes_at, file, side)
+                offset += self.pieces + codes_at
+        else:
+            for side in range(sides):
+                sizes[0][side] = self._read_pieces(offset, 1, 0, side)
+            offset += self.pieces + 1
+        offset += offset & 1
+
+        for file in range(files):
+            for side in range(sides):
+                self._pairs[file][side], offset = self._read_pairs(offset, sizes[file][side])
+
+        if self.dtz:
+            self._value_map = offset
+            self._map_offsets = [None] * files
+            for file in range(files):
+                flags = self._pairs[file][0].flags
+                if flags & 2:
+                    offsets = []
+                    if not flags & 16:
+                        for _ in range(4):
+                            offsets.append(offset + 1 - self._value_map)
+                            offset += 1 + data[offset]
+                    else:
+                        offset += offset & 1
+                        for _ in range(4):
+                            offsets.append((offset + 2 - self._value_map) // 2)
+                            offset += 2 + 2 * UINT16.unpack_from(data, offset)[0]
+                    self._map_offsets[file] = offsets
+            offset += offset & 1
+
+        all_pairs = [pairs for file_pairs in self._pairs for pairs in file_pairs]
+        for pairs in all_pairs:
+            pairs.index_table = offset
+            offset += pairs.index_bytes
+        for pairs in all_pairs:
+            pairs.size_table = offset
+            offset += pairs.size_bytes
+        for pairs in all_pairs:
+            offset = (offset + 63) & ~63
+            pairs.data = offset
+            offset += pairs.data_bytes
+
+        if not self.has_pawns:
+            # Some tables are stored the other way round to their file name
+            self.key = material_key(self._codes[0][0])
+            self.mirrored_key = material_key(self._codes[0][0], mirror=True)
+
+    def _read_pieces(self, offset: int, codes_at: int, file: int, side: int) -> int:
+        """Reads the piece order of one side to move of one file, and returns the number of positions it has."""
+        data = self._map
+        shift = 4 * side
+        codes = [data[offset + codes_at + i] >> shift & 15 for i in range(self.pieces)]
+        # The steps at which the leading group and the other side's pawns are indexed; 15 if there's no such group
+        order = data[offset] >> shift & 15
+        second_order = data[offset + 1] >> shift & 15 if self.has_pawns and self.pawns[1] else 15
+
+        # The size of each group of pieces indexed together, at its first piece: the leading pawns and the other
+        # side's pawns, or the first three unique pieces or the two kings, then each run of pieces of one code
+        norm = [0] * self.pieces
+        if self.has_pawns:
+            norm[0] = self.pawns[0]
+            if self.pawns[1]:
+                norm[self.pawns[0]] = self.pawns[1]
+            start = self.pawns[0] + self.pawns[1]
+        else:
+            norm[0] = 3 if self.encoding == 0 else 2
+            start = norm[0]
+        i = start
+        while i < self.pieces:
+            j = i
+            while j < self.pieces and codes[j] == codes[i]:
+                j += 1
+            norm[i] = j - i
+            i = j
+
+        # The factor of each group in the index, taking the groups in the file's order; each group after the
+        # leading ones is a choice of the squares still free
+        factor = [0] * self.pieces
+        i = start
+        free = 64 - i
+        size = 1
+        step = 0
+        while i < self.pieces or step == order or step == second_order:
+            if step == order:
+                factor[0] = size
+                size *= PAWN_FACTORS[norm[0] - 1][file] if self.has_pawns else PIVOT_FACTORS[self.encoding]
+            elif step == second_order:
+                factor[norm[0]] = size
+                size *= math.comb(48 - norm[0], norm[norm[0]])
+            else:
+                factor[i] = size
+                size *= math.comb(free, norm[i])
+                free -= norm[i]
+                i += norm[i]
+            step += 1
+
+        self._codes[file][side] = codes
+        self._norms[file][side] = norm
+        self._factors[file][side] = factor
+        return size
+
+    def _read_pairs(self, offset: int, size: int) -> tuple:
+        """Reads the decoding data of one part of the table, returning it and the offset after it."""
+        data = self._map
+        pairs = _Pairs()
+        pairs.flags = data[offset]
+        if data[offset] & 0x80:
+            # Every position has the same value
+            pairs.index_bits = 0
+            pairs.min_length = 0 if self.dtz else data[offset + 1]
+            pairs.index_bytes = pairs.size_bytes = pairs.data_bytes = 0
+            return pairs, offset + 2
+
+        pairs.block_size = data[offset + 1]
+        pairs.index_bits = data[offset + 2]
+        real_blocks = UINT32.unpack_from(data, offset + 4)[0]
+        blocks = real_blocks + data[offset + 3]
+        max_length = data[offset + 8]
+        min_length = data[offset + 9]
+        lengths = max_length - min_length + 1
+        symbols = UINT16.unpack_from(data, offset + 10 + 2 * lengths)[0]
+
+        pairs.min_length = min_length
+        pairs.symbol_patterns = offset + 12 + 2 * lengths
+        pairs.index_bytes = 6 * ((size + (1 << pairs.index_bits) - 1) >> pairs.index_bits)
+        pairs.size_bytes = 2 * blocks
+        pairs.data_bytes = (1 << pairs.block_size) * real_blocks
+
+        # The number of values each symbol stands for, less one, worked out from the pairs it's made of
+        pairs.symbol_lengths = [0] * symbols
+        done = [False] * symbols
+        for symbol in range(symbols):
+            stack = [symbol]
+            while stack:
+                current = stack[-1]
+                if done[current]:
+                    stack.pop()
+                    continue
+                left, right = self._symbol_pair(pairs, current)
+                if right == 0xfff:
+                    done[current] = True
+                    stack.pop()
+                elif not done[left]:
+                    stack.append(left)
+                elif not done[right]:
+                    stack.append(right)
+                else:
+                    pairs.symbol_lengths[current] = pairs.symbol_lengths[left] + pairs.symbol_lengths[right] + 1
+                    done[current] = True
+                    stack.pop()
+
+        # The smallest code of each length, left aligned in 64 bits, for canonical Huffman decoding
+        base = [0] * lengths
+        for i in range(lengths - 2, -1, -1):
+            base[i] = (base[i + 1] + UINT16.unpack_from(data, offset + 10 + 2 * i)[0]
+                       - UINT16.unpack_from(data, offset + 12 + 2 * i)[0]) // 2
+        pairs.base = [value << (64 - (min_length + i)) for i, value in enumerate(base)]
+        pairs.offset = offset + 10 - 2 * min_length
+        return pairs, offset + 12 + 2 * lengths + 3 * symbols + (symbols & 1)
+
+    def _symbol_pair(self, pairs: _Pairs, symbol: int) -> tuple:
+        """Returns the two symbols a symbol is made of; the second is 0xfff if it stands for a single value."""
+        data = self._map
+        at = pairs.symbol_patterns + 3 * symbol
+        return ((data[at + 1] & 15) << 8) | data[at], (data[at + 2] << 4) | (data[at + 1] >> 4)
+
+    def _decompress(self, pairs: _Pairs, index: int) -> int:
+        """Decodes the value at an index of one part of the table."""
+        if not pairs.index_bits:
+            return pairs.min_length
+        data = self._map
+
+        # The index table gives a block and a position in it every 2^index_bits values; the size table then
+        # walks block by block from there
+        main = index >> pairs.index_bits
+        literal = (index & ((1 << pairs.index_bits) - 1)) - (1 << (pairs.index_bits - 1))
+        block = UINT32.unpack_from(data, pairs.index_table + 6 * main)[0]
+        literal += UINT16.unpack_from(data, pairs.index_table + 6 * main + 4)[0]
+        if literal < 0:
+            while literal < 0:
+                block -= 1
+                literal += UINT16.unpack_from(data, pairs.size_table + 2 * block)[0] + 1
+        else:
+            while literal > UINT16.unpack_from(data, pairs.size_table + 2 * block)[0]:
+                literal -= UINT16.unpack_from(data, pairs.size_table + 2 * block)[0] + 1
+                block += 1
+
+        # Decodes the block's symbols until the one holding the value
+        at = pairs.data + (block << pairs.block_size)
+        code = UINT64_BE.unpack_from(data, at)[0]
+        at += 8
+        empty_bits = 0
+        base = pairs.base
+        min_length = pairs.min_length
+        lengths = pairs.symbol_lengths
+        while True:
+            length = min_length
+            while code < base[length - min_length]:
+                length += 1
+            symbol = UINT16.unpack_from(data, pairs.offset + 2 * length)[0]
+            symbol += (code - base[length - min_length]) >> (64 - length)
+            if literal < lengths[symbol] + 1:
+                break
+            literal -= lengths[symbol] + 1
+            code = (code << length) & 0xFFFFFFFFFFFFFFFF
+            empty_bits += length
+            if empty_bits >= 32:
+                empty_bits -= 32
+                code |= UINT32_BE.unpack_from(data, at)[0] << empty_bits
+                at += 4
+
+        # Then splits the symbol into its pairs down to the single value
+        while lengths[symbol]:
+            left, right = self._symbol_pair(pairs, symbol)
+            if literal < lengths[left] + 1:
+                symbol = left
+            else:
+                literal -= lengths[left] + 1
+                symbol = right
+        at = pairs.symbol_patterns + 3 * symbol
+        if self.dtz:
+            return ((data[at + 1] & 15) << 8) | data[at]
+        return data[at]
+
+    def _encode_pieces(self, squares: list, norm: list, factor: list) -> int:
+        """Works out the index of a position without pawns from its piece squares, in table order."""
+        count = self.pieces
+        if squares[0] & 4:
+            squares[:] = [square ^ 7 for square in squares]
+        if squares[0] & 32:
+            squares[:] = [square ^ 56 for square in squares]
+        first_off = next((i for i in range(count) if _off_diagonal(squares[i])), count - 1)
+        if first_off < (3 if self.encoding == 0 else 2) and _off_diagonal(squares[first_off]) > 0:
+            squares[:] = [_flip_diagonal(square) for square in squares]
+
+        if self.encoding == 0:
+            first, second, third = squares[:3]
+            i = int(second > first)
+            j = int(third > first) + int(third > second)
+            if _off_diagonal(first):
+                index = TRIANGLE[first] * 63 * 62 + (second - i) * 62 + (third - j)
+            elif _off_diagonal(second):
+                index = 6 * 63 * 62 + DIAGONAL[first] * 28 * 62 + LOWER[second] * 62 + third - j
+            elif _off_diagonal(third):
+                index = (6 * 63 * 62 + 4 * 28 * 62 + DIAGONAL[first] * 7 * 28 + (DIAGONAL[second] - i) * 28
+                         + LOWER[third])
+            else:
+                index = (6 * 63 * 62 + 4 * 28 * 62 + 4 * 7 * 28 + DIAGONAL[first] * 7 * 6
+                         + (DIAGONAL[second] - i) * 6 + (DIAGONAL[third] - j))
+            done = 3
+        else:
+            index = KING_PAIR_INDICES[TRIANGLE[squares[0]]][squares[1]]
+            done = 2
+        return index * factor[0] + self._encode_groups(squares, norm, factor, done)
+
+    def _encode_pawns(self, squares: list, norm: list, factor: list) -> int:
+        """Works out the index of a position with pawns from its piece squares, in table order."""
+        if squares[0] & 4:
+            squares[:] = [square ^ 7 for square in squares]
+        leading, other = self.pawns
+        squares[1:leading] = sorted(squares[1:leading], key=PAWN_TWIST.__getitem__, reverse=True)
+        index = PAWN_INDICES[leading - 1][FLAP[squares[0]]]
+        for i in range(1, leading):
+            index += math.comb(PAWN_TWIST[squares[i]], leading - i)
+        index *= factor[0]
+
+        if other:
+            # The other side's pawns can't be on the first or last rank
+            squares[leading:leading + other] = sorted(squares[leading:leading + other])
+            total = 0
+            for m in range(leading, leading + other):
+                below = sum(squares[m] > squares[k] for k in range(leading))
+                total += math.comb(squares[m] - below - 8, m - leading + 1)
+            index += total * factor[leading]
+        return index + self._encode_groups(squares, norm, factor, leading + other)
+
+    def _encode_groups(self, squares: list, norm: list, factor: list, start: int) -> int:
+        """Indexes the groups of pieces after the leading ones, each as a combination of the squares left."""
+        index = 0
+        i = start
+        while i < self.pieces:
+            size = norm[i]
+            squares[i:i + size] = sorted(squares[i:i + size])
+            total = 0
+            for m in range(i, i + size):
+                below = sum(squares[m] > squares[k] for k in range(i))
+                total += math.comb(squares[m] - below, m - i + 1)
+            index += total * factor[i]
+            i += size
+        return index
+
+    def probe(self, turn: int, key: str, squares: list, wdl: int = 0) -> int:
+        """
+        Looks up a position.
+
+        Args:
+            turn (int): The side to move.
+            key (str): The material of the position, see material_key(); it must be this table's.
+            squares (list): The square numbers of the pieces of each piece code, see Tablebase.squares().
+            wdl (int): For a DTZ table, the position's WDL result (default: 0).
+
+        Returns:
+            (int): The WDL result from -2 to 2, or the DTZ value; for a DTZ table, None if the table doesn't hold
+            this side to move, which then has to be worked out from the moves.
+        """
+        if self._map is None:
+            self._open()
+
+        # The table holds the position with the colours one way round; the other way round is looked up with
+        # the colours swapped and the board mirrored
+        white = turn == WHITE
+        if self.symmetric:
+            swap, mirror, side = (0, 0, 0) if white else (BLACK_PIECE, 56, 0)
+        elif key != self.key:
+            swap, mirror, side = BLACK_PIECE, 56, int(white)
+        else:
+            swap, mirror, side = 0, 0, int(not white)
+
+        if self.has_pawns:
+            found = [square ^ mirror for square in squares[self._codes[0][0][0] ^ swap]]
+            # The file of the leading pawn picks the part of the table, with that pawn first
+            for i in range(1, self.pawns[0]):
+                if FLAP[found[0]] > FLAP[found[i]]:
+                    found[0], found[i] = found[i], found[0]
+            file = FILE_TO_FILE[found[0] & 7]
+        else:
+            found = []
+            file = 0
+        if self.dtz:
+            # A DTZ table only holds one side to move
+            if self._pairs[file][0].flags & 1 != side and (self.has_pawns or not self.symmetric):
+                return None
+            side = 0
+        pairs = self._pairs[file][side]
+
+        codes = self._codes[file][side]
+        while len(found) < self.pieces:
+            found.extend(square ^ mirror for square in squares[codes[len(found)] ^ swap])
+        if self.has_pawns:
+            index = self._encode_pawns(found, self._norms[file][side], self._factors[file][side])
+        else:
+            index = self._encode_pieces(found, self._norms[file][side], self._factors[file][side])
+        value = self._decompress(pairs, index)
+        if not self.dtz:
+            return value - 2
+
+        flags = pairs.flags
+        if flags & 2:
+            at = self._map_offsets[file][WDL_TO_MAP[wdl + 2]] + value
+            if not flags & 16:
+                value = self._map[self._value_map + at]
+            else:
+                value = UINT16.unpack_from(self._map, self._value_map + 2 * at)[0]
+        if not flags & PLY_FLAGS[wdl + 2] or wdl & 1:
+            # Stored in moves rather than plies
+            value *= 2
+        return value
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def _is_en_passant(board: Board, move: Move) -> bool:
+    return move.to_index == board.en_passant_square and board.mailbox[move.from_index] & 7 == PAWN
+
+
+def _is_mate(board: Board) -> bool:
+    return board.in_check() and not any(True for _ in board.iter_moves())
+
+
+class Tablebase:
+    """
+    The Syzygy tables of one or more directories.
+
+    Attributes:
+        max_pieces (int): The most pieces, kings included, of any WDL table found; 0 if there are none.
+        hits (int): The number of probes answered, from the tables or the cache.
+    """
+
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        """
+        Finds the tables of a directory. No table file is opened until a position of its material is probed.
+
+        Args:
+            path (str): The directory, or several separated by os.pathsep, as in the UCI SyzygyPath option.
+            cache_size (int): The number of probe results to keep (default: CACHE_SIZE).
+        """
+        self.max_pieces = 0
+        self.hits = 0
+        self.cache_size = cache_size
+        self._wdl = {}
+        self._dtz = {}
+        self._wdl_cache = OrderedDict()
+        self._dtz_cache = OrderedDict()
+        for directory in path.split(os.pathsep):
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                name, suffix = os.path.splitext(entry.name)
+                if suffix not in (WDL_SUFFIX, DTZ_SUFFIX) or not TABLE_NAME.match(name) or not entry.is_file():
+                    continue
+                table = SyzygyTable(entry.path, suffix == DTZ_SUFFIX)
+                tables = self._dtz if table.dtz else self._wdl
+                tables[table.key] = tables[table.mirrored_key] = table
+                if not table.dtz:
+                    self.max_pieces = max(self.max_pieces, table.pieces)
+
+    @staticmethod
+    def squares(board: Board) -> list:
+        """Returns the square numbers of the pieces of each piece code, in square number order."""
+        mailbox = board.mailbox
+        squares = [[] for _ in range(16)]
+        for index, square in SQUARE_NUMBERS:
+            code = mailbox[index]
+            if code != EMPTY:
+                squares[code].append(square)
+        return squares
+
+    def _table(self, tables: dict, board: Board) -> tuple:
+        """Finds the table of a position's material, returning it with the material key and piece squares."""
+        squares = self.squares(board)
+        key = material_key(code for code in range(16) for _ in squares[code])
+        table = tables.get(key)
+        if table is None:
+            raise KeyError(f"No Syzygy table for {key}")
+        return table, key, squares
+
+    def _probe_wdl_table(self, board: Board) -> int:
+        if board.mailbox.count(KING) + board.mailbox.count(KING | BLACK_PIECE) == piece_count(board):
+            return 0
+        table, key, squares = self._table(self._wdl, board)
+        return table.probe(board.turn, key, squares)
+
+    def _probe_ab(self, board: Board, alpha: int, beta: int) -> int:
+        """
+        Works out the WDL result of a position without en passant rights as an alpha-beta search over its
+        captures: tables give the result assuming the best capture isn't worse than the position's other moves.
+        """
+        for move in list(board.iter_moves()):
+            if board.mailbox[move.to_index] == EMPTY:
+                continue
+            board.push(move)
+            try:
+                score = - self._probe_ab(board, - beta, - alpha)
+            finally:
+                board.pop()
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+        return max(alpha, self._probe_wdl_table(board))
+
+    def _probe_wdl(self, board: Board) -> tuple:
+        """
+        Works out the WDL result of a position from its captures, en passant ones included, and the table.
+
+        Returns:
+            (tuple): The result, and True if the best move is known to be a capture, which zeroes the fifty move
+            counter.
+        """
+        # The best capture, and the best en passant capture if it's better still
+        best_capture = best_en_passant = -3
+        for move in list(board.iter_moves()):
+            en_passant = _is_en_passant(board, move)
+            if board.mailbox[move.to_index] == EMPTY and not en_passant:
+                continue
+            board.push(move)
+            try:
+                score = - self._probe_ab(board, -2, - best_capture)
+            finally:
+                board.pop()
+            if score > best_capture:
+                if score == 2:
+                    return 2, True
+                if not en_passant:
+                    best_capture = score
+                elif score > best_en_passant:
+                    best_en_passant = score
+
+        score = self._probe_wdl_table(board)
+        if best_en_passant > best_capture:
+            if best_en_passant > score:
+                return best_en_passant, True
+            best_capture = best_en_passant
+        if best_capture >= score:
+            return best_capture, best_capture > 0
+        if best_en_passant > -3 and score == 0 and not board.in_check() \
+                and all(_is_en_passant(board, move) for move in board.iter_moves()):
+            # Without en passant rights the position would be stalemate, so the capture has to be played
+            return best_en_passant, True
+        return score, False
+
+    def _probe_dtz(self, board: Board) -> int:
+        wdl, zeroing = self._probe_wdl(board)
+        if wdl == 0:
+            return 0
+        if zeroing:
+            return WDL_TO_DTZ[wdl + 2]
+
+        moves = list(board.iter_moves())
+        mailbox = board.mailbox
+        if wdl > 0:
+            # A pawn move that keeps the win zeroes straight away
+            for move in moves:
+                if mailbox[move.from_index] & 7 != PAWN or mailbox[move.to_index] != EMPTY \
+                        or _is_en_passant(board, move):
+                    continue
+                board.push(move)
+                try:
+                    result = - self._probe_wdl(board)[0]
+                finally:
+                    board.pop()
+                if result == wdl:
+                    return WDL_TO_DTZ[wdl + 2]
+
+        # The best move isn't an en passant capture, so the table's value without en passant rights is the right one
+        table, key, squares = self._table(self._dtz, board)
+        dtz = table.probe(board.turn, key, squares, wdl)
+        if dtz is not None:
+            return WDL_TO_DTZ[wdl + 2] + (dtz if wdl > 0 else - dtz)
+
+        # The table only holds the other side to move, so the DTZ is worked out from the moves that don't zero. A
+        # win has a better one among them; a loss starts from its captures and pawn moves, the quickest loss
+        best = 0xFFFF if wdl > 0 else WDL_TO_DTZ[wdl + 2]
+        for move in moves:
+            if mailbox[move.from_index] & 7 == PAWN or mailbox[move.to_index] != EMPTY:
+                continue
+            board.push(move)
+            try:
+                result = - self._probe_dtz(board)
+                if result == 1 and _is_mate(board):
+                    best = 1
+                elif wdl > 0:
+                    if 0 < result < best - 1:
+                        best = result + 1
+                else:
+                    best = min(best, result - 1)
+            finally:
+                board.pop()
+        return best
+
+    def _cached(self, cache: OrderedDict, board: Board, probe) -> int:
+        """Returns a probe result from the cache, or probes and caches it; None if the tables can't answer."""
+        key = board.key
+        if key in cache:
+            cache.move_to_end(key)
+            result = cache[key]
+        else:
+            result = None
+            if not board.castling and piece_count(board) <= self.max_pieces:
+                try:
+                    result = probe(board)
+                except KeyError:
+                    # A table this position or one of its captures needs is missing
+                    pass
+            cache[key] = result
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        if result is not None:
+            self.hits += 1
+        return result
+
+    def probe_wdl(self, board: Board) -> int:
+        """
+        Probes the WDL tables, assuming the last move was a capture or pawn move.
+
+        Args:
+            board (Board): The position; it's left as it was.
+
+        Returns:
+            (int): 2 if the side to move wins, 0 if it's a draw and -2 if it loses; 1 and -1 for a win or loss
+            that the fifty move rule turns into a draw. None if the position has castling rights or a table it
+            needs is missing.
+        """
+        return self._cached(self._wdl_cache, board, lambda board: self._probe_wdl(board)[0])
+
+    def probe_dtz(self, board: Board) -> int:
+        """
+        Probes the DTZ tables (and WDL tables, which are needed too).
+
+        Args:
+            board (Board): The position; it's left as it was.
+
+        Returns:
+            (int): The plies to a capture or pawn move that keeps the result: positive if the side to move wins,
+            negative if it loses, 0 for a draw. Beyond 100 either way, the fifty move rule draws first. The value
+            can be one ply more than the real distance. None if the tables can't answer, as for probe_wdl().
+        """
+        return self._cached(self._dtz_cache, board, self._probe_dtz)
+
+    def root_move(self, board: Board) -> tuple:
+        """
+        Picks the best move of a position from the DTZ tables: the quickest win, otherwise a draw, otherwise the
+        slowest loss. Wins and losses that the fifty move rule would turn into draws, given the halfmove clock,
+        count as draws.
+
+        Args:
+            board (Board): The position; it's left as it was.
+
+        Returns:
+            (tuple): The move, its WDL result under the fifty move rule from -2 to 2, and its DTZ; or None if
+            the tables can't answer or there are no legal moves.
+        """
+        if board.castling or piece_count(board) > self.max_pieces:
+            return None
+        clock = board.halfmove_clock
+        best = None
+        best_rank = None
+        for move in list(board.iter_moves()):
+            board.push(move)
+            if _is_mate(board):
+                dtz = 1
+            elif board.halfmove_clock == 0:
+                # A capture or pawn move takes its DTZ from the WDL result
+                wdl = self.probe_wdl(board)
+                dtz = None if wdl is None else WDL_TO_DTZ[2 - wdl]
+            else:
+                # Otherwise it's one ply more than the DTZ after the move
+                dtz = self.probe_dtz(board)
+                dtz = None if dtz is None else - dtz + (dtz < 0) - (dtz > 0)
+            board.pop()
+            if dtz is None:
+                return None
+
+            if dtz > 0:
+                wdl = 2 if dtz + clock <= 100 else 1
+            elif dtz < 0:
+                wdl = -2 if - dtz + clock <= 100 else -1
+            else:
+                wdl = 0
+            # Quickest win first, slowest loss last
+            rank = (wdl, - dtz)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (move, wdl, dtz), rank
+        return best
+
+    def close(self) -> None:
+        """Unmaps every table file."""
+        for table in {*self._wdl.values(), *self._dtz.values()}:
+            table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Probe the Syzygy tables for a position.")
+    parser.add_argument("path", help="the directory of the tables, or several separated by " + repr(os.pathsep))
+    parser.add_argument("--fen", required=True, help="the position to probe")
+    args = parser.parse_args(argv)
+
+    board = Board(args.fen)
+    with Tablebase(args.path) as tablebase:
+        print(f"Tables of up to {tablebase.max_pieces} pieces")
+        print("wdl", tablebase.probe_wdl(board))
+        print("dtz", tablebase.probe_dtz(board))
+        found = tablebase.root_move(board)
+        print("bestmove", found[0].uci() if found is not None else "none")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+A fixed size transposition table, storing search results by Zobrist key.
+
+The table is two preallocated arrays of 64-bit integers, so its memory use is set when it is created and
+never grows, however long the engine runs. Entries are grouped in buckets of two: the first slot keeps the
+deepest result (the most search effort) and the second is always replaced, so recent shallow results don't
+push out expensive deep ones, but still have somewhere to go.
+https://www.chessprogramming.org/Transposition_Table
+
+Each slot stores its key XORed with its data, so a probe only matches if the key and the data were written
+together. This lets several processes share one table without locks (SharedTranspositionTable): an entry torn
+by two processes writing it at once just fails to match, like a miss.
+https://www.chessprogramming.org/Shared_Hash_Table#Lockless
+"""
+
+from array import array
+from multiprocessing import shared_memory
+
+from evaluate import MATE_THRESHOLD
+
+# Bound types: whether a stored score is exact, or only a lower or upper bound on the real score.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+ENTRY_BYTES = 16  # An 8 byte key and 8 bytes of data
+BUCKET_SIZE = 2
+
+# Data is packed as: score + SCORE_OFFSET (20 bits) | depth (8 bits) | bound (2 bits) | packed move (16 bits) |
+# generation (8 bits).
+SCORE_OFFSET = 1 << 19
+_DEPTH_SHIFT = 20
+_BOUND_SHIFT = 28
+_MOVE_SHIFT = 30
+_GENERATION_SHIFT = 46
+
+
+class TranspositionTable:
+    """
+    A transposition table of a fixed size.
+
+    Attributes:
+        size_mb (float): The size of the table in megabytes.
+        buckets (int): The number of buckets.
+        keys (array): The Zobrist key of each entry XORed with its data, 0 for an empty entry.
+        data (array): The packed score, depth, bound, move and generation of each entry.
+        generation (int): Counts searches, so entries from earlier searches can be replaced first.
+    """
+
+    def __init__(self, size_mb: float = 16):
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SIZE))
+        self.keys = array("Q", bytes(8 * self.buckets * BUCKET_SIZE))
+        self.data = array("Q", bytes(8 * self.buckets * BUCKET_SIZE))
+        self.generation = 0
+
+    def clear(self) -> None:
+        """Empties the table, keeping its memory."""
+        for table in (self.keys, self.data):
+            table[:] = array("Q", bytes(8 * len(table)))
+        self.generation = 0
+
+    def new_search(self) -> None:
+        """Marks the start of a new search, which makes earlier entries the first to be replaced."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key: int, ply: int) -> tuple:
+        """
+        Looks up a position.
+
+        Args:
+            key (int): The Zobrist key of the position.
+            ply (int): The distance of the position from the root, to adjust mate scores with.
+
+        Returns:
+            (tuple): (depth, score, bound, packed move or 0) if the position is in the table, otherwise None.
+        """
+        slot = (key % self.buckets) * BUCKET_SIZE
+        keys, table = self.keys, self.data
+        data = table[slot]
+        if keys[slot] ^ data != key:
+            slot += 1
+            data = table[slot]
+            if keys[slot] ^ data != key:
+                return None
+        score = (data & 0xFFFFF) - SCORE_OFFSET
+        if score >= MATE_THRESHOLD:
+            score -= ply
+        elif score <= - MATE_THRESHOLD:
+            score += ply
+        return (data >> _DEPTH_SHIFT & 0xFF, score, data >> _BOUND_SHIFT & 3, data >> _MOVE_SHIFT & 0xFFFF)
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int, ply: int) -> None:
+        """
+        Stores the result of searching a position.
+
+        Mate scores count plies from the root, but a position can be reached at different distances from the
+        root, so they are stored counting from the position itself and converted back in probe().
+
+        Args:
+            key (int): The Zobrist key of the position.
+            depth (int): The depth the position was searched to.
+            score (int): The score found.
+            bound (int): EXACT, LOWER or UPPER.
+            move (int): The best move found as a packed move (see core.Board.encode_move()), or 0.
+            ply (int): The distance of the position from the root.
+        """
+        if score >= MATE_THRESHOLD:
+            score += ply
+        elif score <= - MATE_THRESHOLD:
+            score -= ply
+        data = ((score + SCORE_OFFSET) | min(max(depth, 0), 0xFF) << _DEPTH_SHIFT | bound << _BOUND_SHIFT
+                | move << _MOVE_SHIFT | self.generation << _GENERATION_SHIFT)
+
+        keys, table = self.keys, self.data
+        slot = (key % self.buckets) * BUCKET_SIZE
+        old = table[slot]
+        # The depth preferred slot is replaced by the same position, a result at least as deep, or any result
+        # if its entry is from an earlier search. Otherwise its entry is kept and the second slot is replaced.
+        if (keys[slot] ^ old == key or depth >= (old >> _DEPTH_SHIFT & 0xFF)
+                or old >> _GENERATION_SHIFT != self.generation):
+            keys[slot] = key ^ data
+            table[slot] = data
+        else:
+            keys[slot + 1] = key ^ data
+            table[slot + 1] = data
+
+    def hashfull(self) -> int:
+        """Returns how full the table is in permille, sampling the first thousand entries."""
+        sample = min(1000, len(self.keys))
+        generation = self.generation
+        used = sum(1 for i in range(sample) if self.keys[i] and self.data[i] >> _GENERATION_SHIFT == generation)
+        return used * 1000 // sample
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    A transposition table in shared memory, for several processes searching at once. One process creates it,
+    and the others attach to it by name.
+
+    Attributes:
+        memory (SharedMemory): The shared memory block holding the keys, then the data.
+    """
+
+    def __init__(self, size_mb: float = 16, name: str = None):
+        """
+        Initialises the SharedTranspositionTable class.
+
+        Args:
+            size_mb (float): The size of the table in megabytes (default: 16).
+            name (str): The name of an existing table's memory to attach to, or None to create a new one
+                (default: None).
+        """
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SIZE))
+        entries = self.buckets * BUCKET_SIZE
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=ENTRY_BYTES * entries)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        # A new block of shared memory is zero filled, so the table starts empty
+        self.keys = self.memory.buf[:8 * entries].cast("Q")
+        self.data = self.memory.buf[8 * entries:ENTRY_BYTES * entries].cast("Q")
+        self.generation = 0
+
+    @property
+    def name(self) -> str:
+        """The name other processes attach to the table with."""
+        return self.memory.name
+
+    def close(self, unlink: bool = False) -> None:
+        """
+        Detaches this process from the table.
+
+        Args:
+            unlink (bool): Also frees the memory; only the process that created the table should (default: False).
+        """
+        self.keys.release()
+        self.data.release()
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
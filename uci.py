@@ -0,0 +1,312 @@
+"""
+The UCI front end, for playing and analysing headless with tournament managers, GUIs and analysis tools.
+
+Commands are read from standard input and answered on standard output. The search runs on a background thread,
+so the command loop keeps reading while it searches and answers stop (or isready) straight away. Nothing here
+imports tkinter or loads images, so the engine is ready to answer uci as soon as it starts.
+https://backscattering.de/chess/uci/
+
+Supported commands: uci, isready, ucinewgame, setoption (Hash, Threads, OwnBook, BookFile, SyzygyPath, Stats),
+position (startpos or fen, with moves), go (depth, movetime, nodes, wtime, btime, winc, binc, movestogo,
+infinite), stop and quit.
+
+With OwnBook on and a Polyglot book set with BookFile, a position in the book is answered with a book move
+straight away, without searching. With SyzygyPath set to a directory of Syzygy tables, endgames they cover are
+played from the tables. With Stats on, each search is instrumented (see instrument.py) and an info string with
+the counts and times of move generation, make/unmake, evaluation and the transposition table follows each depth.
+
+Usage:
+    python uci.py
+"""
+
+import sys
+import threading
+
+from book import OpeningBook
+from core import FEN, WHITE
+from evaluate import BACKENDS
+from instrument import Instrumentation
+from parallel import ParallelSearcher
+from search import Searcher
+from tablebase import Tablebase
+
+ENGINE_NAME = "python-chessengine"
+ENGINE_AUTHOR = "Dewi Payne"
+
+# Options as (type, default, minimum, maximum); only spin options have a minimum and maximum.
+OPTIONS = {
+    "Hash": ("spin", 16, 1, 4096),
+    "Threads": ("spin", 1, 1, 64),
+    "OwnBook": ("check", False, None, None),
+    "BookFile": ("string", "", None, None),
+    "SyzygyPath": ("string", "", None, None),
+    "Stats": ("check", False, None, None),
+}
+
+# With a clock, each move gets the time left divided by this, plus most of the increment.
+MOVES_TO_GO = 30
+# Time kept back for the overhead of sending the move, in seconds.
+MOVE_OVERHEAD = 0.05
+
+
+def allot_time(time_left: float, increment: float = 0.0, moves_to_go: int = None) -> float:
+    """
+    Works out how long to search for a move when playing with a clock.
+
+    Args:
+        time_left (float): The time left on the clock, in seconds.
+        increment (float): The time added after each move, in seconds (default: 0.0).
+        moves_to_go (int): The moves left until the next time control, if there is one (default: None).
+
+    Returns:
+        (float): The time to search for, in seconds.
+    """
+    moves = MOVES_TO_GO if moves_to_go is None else max(moves_to_go, 1)
+    seconds = time_left / moves + increment * 0.75
+    # Never plan to use more than the time left
+    return max(min(seconds, time_left - MOVE_OVERHEAD), 0.01)
+
+
+class UCI:
+    """
+    A UCI engine session.
+
+    Attributes:
+        board (Board): The position to search, set by the position command.
+        options (dict): The current value of each option.
+        searcher (Searcher): The searcher; a ParallelSearcher when Threads is more than 1.
+        output: The text stream to answer on.
+    """
+
+    def __init__(self, output=sys.stdout):
+        """
+        Initialises the UCI class.
+
+        Args:
+            output: The text stream to answer on (default: sys.stdout).
+        """
+        self.output = output
+        self.board = BACKENDS["mailbox"](FEN)
+        self.options = {name: option[1] for name, option in OPTIONS.items()}
+        self.searcher = None
+        self.book = None
+        self.tablebase = None
+        self._thread = None
+        self._infinite = False
+        self._stop_received = threading.Event()
+        self._lock = threading.Lock()
+
+    def send(self, line: str) -> None:
+        """Writes a line to the GUI. The search thread sends too, so lines are written one at a time."""
+        with self._lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line: str) -> bool:
+        """
+        Handles one command line.
+
+        Args:
+            line (str): The command.
+
+        Returns:
+            (bool): False if the command was quit, otherwise True.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            for name, (kind, default, minimum, maximum) in OPTIONS.items():
+                if kind == "spin":
+                    self.send(f"option name {name} type spin default {default} min {minimum} max {maximum}")
+                elif kind == "check":
+                    self.send(f"option name {name} type check default {str(default).lower()}")
+                else:
+                    self.send(f"option name {name} type {kind} default {default or '<empty>'}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            if self.searcher is not None:
+                self.searcher.table.clear()
+        elif command == "setoption":
+            self.stop()
+            self.set_option(args)
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            self.close()
+            if self.book is not None:
+                self.book.close()
+            if self.tablebase is not None:
+                self.tablebase.close()
+            return False
+        return True
+
+    def set_option(self, args: list) -> None:
+        """Handles setoption name <name> value <value>. The searcher is rebuilt with the new value when needed."""
+        if "name" not in args:
+            return
+        if "value" in args:
+            name = " ".join(args[args.index("name") + 1:args.index("value")])
+            value = " ".join(args[args.index("value") + 1:])
+        else:
+            name, value = " ".join(args[args.index("name") + 1:]), None
+        if name not in OPTIONS or value is None:
+            return
+        kind, _, minimum, maximum = OPTIONS[name]
+        if kind == "check":
+            self.options[name] = value.lower() == "true"
+        elif kind == "string":
+            self.options[name] = "" if value == "<empty>" else value
+        else:
+            try:
+                self.options[name] = min(max(int(value), minimum), maximum)
+            except ValueError:
+                return
+        if name in ("Hash", "Threads"):
+            # These are set when the searcher is made
+            self.close()
+        elif name == "BookFile":
+            self.open_book()
+        elif name == "SyzygyPath":
+            self.close()
+            if self.tablebase is not None:
+                self.tablebase.close()
+            self.tablebase = Tablebase(self.options["SyzygyPath"]) if self.options["SyzygyPath"] else None
+            if self.tablebase is not None:
+                self.send(f"info string found Syzygy tables of up to {self.tablebase.max_pieces} pieces")
+
+    def open_book(self) -> None:
+        """Opens the book named by BookFile, closing any book already open."""
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.options["BookFile"]:
+            try:
+                self.book = OpeningBook(self.options["BookFile"])
+            except OSError as error:
+                self.send(f"info string can't open book: {error}")
+
+    def set_position(self, args: list) -> None:
+        """Handles position startpos|fen <fen> [moves <move> ...]."""
+        moves = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "startpos":
+            self.board.read_fen(FEN)
+        elif args and args[0] == "fen":
+            try:
+                self.board.read_fen(" ".join(args[1:moves]))
+            except ValueError as error:
+                self.send(f"info string {error}")
+                return
+        else:
+            return
+        for text in args[moves + 1:]:
+            for move in self.board.iter_moves():
+                if move.uci() == text:
+                    self.board.push(move)
+                    break
+            else:
+                self.send(f"info string illegal move {text}")
+                return
+
+    def go(self, args: list) -> None:
+        """Handles go with its limits, starting the search on a background thread."""
+        limits = {}
+        for name, value in zip(args, args[1:] + [None]):
+            if name in ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    limits[name] = int(value)
+                except (TypeError, ValueError):
+                    pass
+        infinite = "infinite" in args
+        if self.options["OwnBook"] and self.book is not None and not infinite:
+            move = self.book.choose(self.board)
+            if move is not None:
+                self.send(f"info string book move {move.uci()}")
+                self.send(f"bestmove {move.uci()}")
+                return
+
+        movetime = None
+        if "movetime" in limits:
+            movetime = max(limits["movetime"] - MOVE_OVERHEAD * 1000, 1) / 1000
+        else:
+            clock, increment = ("wtime", "winc") if self.board.turn == WHITE else ("btime", "binc")
+            if clock in limits:
+                movetime = allot_time(limits[clock] / 1000, limits.get(increment, 0) / 1000,
+                                      limits.get("movestogo"))
+        if infinite:
+            movetime = None
+        self._infinite = infinite
+        self._stop_received.clear()
+
+        if self.searcher is None:
+            if self.options["Threads"] > 1:
+                self.searcher = ParallelSearcher(self.options["Threads"], self.options["Hash"],
+                                                 self.options["SyzygyPath"] or None)
+            else:
+                self.searcher = Searcher(self.options["Hash"], tablebase=self.tablebase)
+        depth = None if infinite else limits.get("depth")
+        nodes = None if infinite else limits.get("nodes")
+        self._thread = threading.Thread(target=self._search, args=(depth, movetime, nodes), daemon=True)
+        self._thread.start()
+
+    def _search(self, depth: int, movetime: float, nodes: int) -> None:
+        """Runs on the search thread: searches, then sends the best move."""
+        if self.options["Stats"]:
+            with Instrumentation() as instrumentation:
+                def info(result):
+                    self.send(result.info())
+                    self.send(instrumentation.stats.info())
+
+                result = self.searcher.search(self.board, depth, movetime, nodes, info)
+        else:
+            result = self.searcher.search(self.board, depth, movetime, nodes,
+                                          info=lambda result: self.send(result.info()))
+        # In infinite mode the best move is only sent once stop is received, even if the search ended first
+        if self._infinite:
+            self._stop_received.wait()
+        self.send(f"bestmove {result.move.uci() if result.move is not None else '0000'}")
+
+    def stop(self) -> None:
+        """Stops the search, if there is one, and waits for it to send its best move."""
+        if self._thread is None:
+            return
+        self._stop_received.set()
+        # The search clears its stop flag when it starts, so a stop sent just after go is repeated until the
+        # search thread has finished
+        while self._thread.is_alive():
+            self.searcher.stop()
+            self._thread.join(0.01)
+        self._thread = None
+
+    def close(self) -> None:
+        """Frees the searcher; a ParallelSearcher has helper processes to stop."""
+        if isinstance(self.searcher, ParallelSearcher):
+            self.searcher.close()
+        self.searcher = None
+
+
+def main() -> None:
+    session = UCI()
+    for line in sys.stdin:
+        if not session.handle(line):
+            break
+    else:
+        session.stop()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()